@@ -0,0 +1,380 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy
+
+from main import DQ, FQ, Z, Content, Determination, Part, Reaction, Spec, Statistic
+from table import ReactionTable
+
+# 多个受试者的协议合成一个二进制文件，用mmap打开，按受试者随机读取，无需逐个打开xlsx
+# 文件结构（小端，各段按8字节对齐）：
+#   文件头    MAGIC、版本、受试者数、反应数、代码数、字符串数、各段偏移
+#   反应记录  定长，见record_dtype；代码字段均为字符串表中的编号
+#   代码      uint32，每个反应的det、cont、spec依次连续存放，记录中只存起点与各自个数
+#   受试者表  受试者名的字符串编号、第一个反应的编号、反应数
+#   字符串表  uint64偏移（字符串数+1个），其后为UTF-8内容；Desc、代码、受试者名共用，相同的只存一次
+# 代码以字符串保存而不是位编码：表外代码的位是按出现顺序分配的，不同进程中可能不同
+MAGIC = b'RCHA'
+VERSION = 1
+header = struct.Struct('<4sIQQQQQQQQ')
+NONE = 0xFFFFFFFF
+
+record_dtype = numpy.dtype([
+    ('card', '<u1'),
+    ('p', '<u1'),
+    ('ndet', '<u1'),
+    ('ncont', '<u1'),
+    ('nspec', '<u1'),
+    ('pad', '<u1', (3,)),
+    ('pt', '<u4'),
+    ('dq', '<u4'),
+    ('fq', '<u4'),
+    ('z', '<u4'),
+    ('desc', '<u4'),
+    ('codes', '<u8'),
+])
+subject_dtype = numpy.dtype([
+    ('name', '<u4'),
+    ('start', '<u8'),
+    ('count', '<u4'),
+])
+
+
+def align(f) -> int:
+    position = f.tell()
+    if position % 8:
+        f.write(b'\0' * (8 - position % 8))
+    return f.tell()
+
+
+class ArchiveWriter:
+    # 反应记录边读边写入文件，代码、受试者表与字符串表留在内存中，close时写在最后并回填文件头
+    def __init__(self, path):
+        self.path = path
+        self.tmp = f'{path}.tmp'
+        self.file = open(self.tmp, 'wb')
+        self.file.write(b'\0' * header.size)
+        self.records_offset = align(self.file)
+        self.reactions = 0
+        self.codes = array('I')
+        self.subjects: List[Tuple[int, int, int]] = []
+        self.names = set()
+        self.strings: Dict[str, int] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
+            os.remove(self.tmp)
+
+    def string(self, s: str) -> int:
+        index = self.strings.get(s)
+        if index is None:
+            index = self.strings[s] = len(self.strings)
+        return index
+
+    def add(self, name: str, reactions: List[Reaction]):
+        if name in self.names:
+            raise ValueError(f'duplicate subject: {name}')
+        self.names.add(name)
+
+        records = numpy.zeros(len(reactions), dtype=record_dtype)
+        string = self.string
+        for i, r in enumerate(reactions):
+            if max(len(r.det), len(r.cont), len(r.spec)) > 255:
+                raise ValueError(f'too many codes in one reaction: {r}')
+            records[i] = (r.card, r.p, len(r.det), len(r.cont), len(r.spec), 0, string(str(r.pt)), string(r.dq.dq),
+                          string(r.fq.fq), string(r.z.z) if r.z else NONE, string(str(r.desc)), len(self.codes))
+            self.codes.extend([string(str(d)) for d in r.det])
+            self.codes.extend([string(c.cont) for c in r.cont])
+            self.codes.extend([string(s.spec) for s in r.spec])
+        self.file.write(records.tobytes())
+        self.subjects.append((string(name), self.reactions, len(reactions)))
+        self.reactions += len(reactions)
+
+    def close(self):
+        f = self.file
+        codes_offset = align(f)
+        f.write(self.codes.tobytes() if sys.byteorder == 'little' else numpy.asarray(self.codes, '<u4').tobytes())
+        subjects_offset = align(f)
+        f.write(numpy.array(self.subjects, dtype=subject_dtype).tobytes())
+
+        strings_offset = align(f)
+        data = [s.encode('utf-8') for s in self.strings]
+        offsets = numpy.zeros(len(data) + 1, dtype='<u8')
+        numpy.cumsum([len(d) for d in data], out=offsets[1:])
+        f.write(offsets.tobytes())
+        f.write(b''.join(data))
+
+        f.seek(0)
+        f.write(header.pack(MAGIC, VERSION, len(self.subjects), self.reactions, len(self.codes), len(data),
+                            self.records_offset, codes_offset, subjects_offset, strings_offset))
+        f.close()
+        os.replace(self.tmp, self.path)
+
+
+def pack(path, protocols: Iterable[Tuple[str, List[Reaction]]]) -> int:
+    with ArchiveWriter(path) as writer:
+        for name, reactions in protocols:
+            writer.add(name, reactions)
+        return len(writer.subjects)
+
+
+class ProtocolArchive:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, subjects, reactions, codes, strings,
+         records_offset, codes_offset, subjects_offset, strings_offset) = header.unpack_from(self.mmap)
+        if magic != MAGIC:
+            raise ValueError(f'not a protocol archive: {path}')
+        if version != VERSION:
+            raise ValueError(f'unsupported archive version {version}: {path}')
+
+        # 以下均为mmap上的视图，不复制数据
+        self.records = numpy.frombuffer(self.mmap, record_dtype, reactions, records_offset)
+        self.codes = numpy.frombuffer(self.mmap, '<u4', codes, codes_offset)
+        self.subjects = numpy.frombuffer(self.mmap, subject_dtype, subjects, subjects_offset)
+        self.string_offsets = numpy.frombuffer(self.mmap, '<u8', strings + 1, strings_offset)
+        self.strings_base = strings_offset + self.string_offsets.nbytes
+
+        self.decoded: Dict[int, str] = {}
+        self.tokens: Dict[tuple, object] = {}
+        self.lookup: Optional[Dict[str, int]] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.records = self.codes = self.subjects = self.string_offsets = None
+        try:
+            self.mmap.close()
+        except BufferError:
+            # 调用方仍持有记录的视图，等视图释放后由mmap对象自行解除映射
+            pass
+
+    def __len__(self):
+        return len(self.subjects)
+
+    def string(self, i: int) -> str:
+        s = self.decoded.get(i)
+        if s is None:
+            start = self.strings_base + int(self.string_offsets[i])
+            end = self.strings_base + int(self.string_offsets[i + 1])
+            s = self.decoded[i] = self.mmap[start:end].decode('utf-8')
+        return s
+
+    def token(self, cls, i: int, *extra):
+        key = (cls, i) + extra
+        token = self.tokens.get(key)
+        if token is None:
+            token = self.tokens[key] = cls(self.string(i), *extra)
+        return token
+
+    # ---------------- 受试者 ----------------
+
+    @property
+    def names(self) -> List[str]:
+        return [self.string(i) for i in self.subjects['name'].tolist()]
+
+    def index(self, subject: Union[int, str]) -> int:
+        if isinstance(subject, str):
+            if self.lookup is None:
+                self.lookup = {name: i for i, name in enumerate(self.names)}
+            return self.lookup[subject]
+        return subject
+
+    def __contains__(self, name: str) -> bool:
+        try:
+            self.index(name)
+        except KeyError:
+            return False
+        return True
+
+    def span(self, subject: Union[int, str]) -> Tuple[int, int]:
+        _, start, count = self.subjects[self.index(subject)].tolist()
+        return start, start + count
+
+    def view(self, subject: Union[int, str]) -> numpy.ndarray:
+        # 一个受试者的反应记录，mmap上的视图
+        start, end = self.span(subject)
+        return self.records[start:end]
+
+    def reactions(self, subject: Union[int, str]) -> List[Reaction]:
+        start, end = self.span(subject)
+        if start == end:
+            return []
+        first = int(self.records[start]['codes'])
+        last = self.records[end - 1]
+        codes = self.codes[first:int(last['codes']) + int(last['ndet']) + int(last['ncont']) + int(last['nspec'])]
+        codes = codes.tolist()
+        token = self.token
+
+        reactions = []
+        for card, p, ndet, ncont, nspec, _, pt, dq, fq, z, desc, position in self.records[start:end].tolist():
+            i = position - first
+            reactions.append(Reaction(
+                card=card, desc=self.string(desc), pt=token(Part, pt), dq=token(DQ, dq), fq=token(FQ, fq),
+                det=[token(Determination, c) for c in codes[i:i + ndet]],
+                cont=[token(Content, c) for c in codes[i + ndet:i + ndet + ncont]],
+                p=bool(p), z=token(Z, z, card) if z != NONE else None,
+                spec=[token(Spec, c) for c in codes[i + ndet + ncont:i + ndet + ncont + nspec]], hr=False))
+        return reactions
+
+    def statistic(self, subject: Union[int, str]) -> Statistic:
+        i = self.index(subject)
+        return Statistic(self.string(int(self.subjects[i]['name'])), self.reactions(i))
+
+    def __iter__(self) -> Iterator[Tuple[str, List[Reaction]]]:
+        for i, name in enumerate(self.names):
+            yield name, self.reactions(i)
+
+    # ---------------- 列式 ----------------
+
+    def table(self, start=0, stop: Optional[int] = None) -> ReactionTable:
+        # 第start到stop个受试者的ReactionTable，直接由记录与代码整列换算，不构造Reaction
+        stop = len(self) if stop is None else stop
+        subjects = self.subjects[start:stop]
+        first = int(subjects['start'][0]) if len(subjects) else 0
+        offsets = numpy.zeros(len(subjects) + 1, dtype=numpy.int64)
+        numpy.cumsum(subjects['count'], out=offsets[1:])
+        records = self.records[first:first + offsets[-1]]
+        n = len(records)
+
+        def mapped(ids: numpy.ndarray, func, dtype) -> numpy.ndarray:
+            # 每个不同的字符串只换算一次
+            unique, inverse = numpy.unique(ids, return_inverse=True)
+            return numpy.array([func(self.string(i)) for i in unique.tolist()], dtype=dtype)[inverse]
+
+        columns = {
+            'card': records['card'].astype(numpy.int8),
+            'part': mapped(records['pt'], lambda s: ReactionTable.codeOf(ReactionTable.categories, Part(s).category),
+                           numpy.int16),
+            'number': mapped(records['pt'], lambda s: Part(s).number, numpy.int32),
+            'dq': mapped(records['dq'], lambda s: ReactionTable.codeOf(ReactionTable.dqs, s), numpy.int8),
+            'fq': mapped(records['fq'], lambda s: ReactionTable.codeOf(ReactionTable.fqs, s), numpy.int8),
+            'p': records['p'].astype(numpy.bool_),
+            'ncont': records['ncont'].astype(numpy.int8),
+        }
+
+        # Z分由代码与卡片共同决定
+        z = numpy.full(n, numpy.nan)
+        has_z = records['z'] != NONE
+        if has_z.any():
+            key = records['z'][has_z].astype(numpy.int64) * 16 + records['card'][has_z]
+            unique, inverse = numpy.unique(key, return_inverse=True)
+            z[has_z] = numpy.array([Z.score_table[k % 16][self.string(k // 16)] for k in unique.tolist()])[inverse]
+        columns['z'] = z
+
+        # 每个代码所属的反应与种类（0 det，1 cont，2 spec）
+        sizes = (records['ndet'].astype(numpy.int64) + records['ncont'] + records['nspec'])
+        owner = numpy.repeat(numpy.arange(n), sizes)
+        begin = numpy.zeros(n + 1, dtype=numpy.int64)
+        numpy.cumsum(sizes, out=begin[1:])
+        within = numpy.arange(len(owner)) - begin[:-1][owner]
+        ndet = records['ndet'].astype(numpy.int64)[owner]
+        ncont = records['ncont'].astype(numpy.int64)[owner]
+        kind = (within >= ndet).astype(numpy.int8) + (within >= ndet + ncont)
+        # 各反应的代码在文件中连续存放，所选受试者的代码也是连续的一段
+        base = int(records['codes'][0]) if n else 0
+        codes = self.codes[base:base + len(owner)]
+
+        def perReaction(mask: numpy.ndarray, values: numpy.ndarray, ufunc=numpy.add) -> numpy.ndarray:
+            result = numpy.zeros(n, dtype=values.dtype)
+            ufunc.at(result, owner[mask], values)
+            return result
+
+        def bitOf(cls, s: str) -> int:
+            bit = cls(s).bit
+            if bit.bit_length() > 63:
+                raise ValueError(f'too many distinct codes for an int64 column: {s}')
+            return bit
+
+        det, cont, spec = kind == 0, kind == 1, kind == 2
+        columns['det'] = perReaction(det, mapped(codes[det], lambda s: bitOf(Determination, s), numpy.int64),
+                                     numpy.bitwise_or)
+        columns['cont'] = perReaction(cont, mapped(codes[cont], lambda s: bitOf(Content, s), numpy.int64),
+                                      numpy.bitwise_or)
+        columns['spec'] = perReaction(spec, mapped(codes[spec], lambda s: bitOf(Spec, s), numpy.int64),
+                                      numpy.bitwise_or)
+
+        columns['ndet'] = perReaction(det, mapped(codes[det], lambda s: Determination(s).det != '(2)', numpy.int8))
+
+        motion = {
+            'active': lambda d: d.active(),
+            'passive': lambda d: d.passive(),
+            'Mactive': lambda d: d.active() and d.det == 'M',
+            'Mpassive': lambda d: d.passive() and d.det == 'M',
+        }
+        for name, test in motion.items():
+            values = mapped(codes[det], lambda s: test(Determination(s)), numpy.int8)
+            columns[name] = perReaction(det, values)
+
+        # 与ReactionTable.row一致，spec6_score中没有的代码（CON）照样抛出KeyError
+        columns['Sum6'] = perReaction(spec, mapped(codes[spec], lambda s: s in Reaction.spec6, numpy.int16))
+        columns['WSum6'] = perReaction(spec, mapped(
+            codes[spec], lambda s: Reaction.spec6_score[s] if s in Reaction.spec6 else 0, numpy.int16))
+        columns['Lv2'] = perReaction(spec, mapped(codes[spec], lambda s: s in Reaction.spec2, numpy.int16))
+
+        names = [self.string(i) for i in subjects['name'].tolist()]
+        return ReactionTable(names, offsets, **{name: columns[name].astype(dtype, copy=False)
+                                                for name, dtype in ReactionTable.columns})
+
+
+def convert(paths: List[str], output, workers: Optional[int] = 1, cache=None) -> int:
+    # 受试者名取文件名（不含扩展名），与Statistic一致
+    names = [path.split('/')[-1].split('.')[0] for path in paths]
+    if workers == 1:
+        load = cache.load if cache is not None else Statistic.readReactions
+        return pack(output, zip(names, map(load, paths)))
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return pack(output, zip(names, executor.map(Statistic.readReactions, paths, chunksize=16)))
+
+
+def main(argv=None):
+    from batch import expandPaths
+
+    parser = argparse.ArgumentParser(description='把一批协议文件合成一个可随机读取的归档文件')
+    parser.add_argument('paths', nargs='+', help='目录或通配符，如 data/*.xlsx')
+    parser.add_argument('-o', '--output', default='protocols.rcha', help='归档文件')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='解析协议的进程数，0为CPU核数')
+    parser.add_argument('--cache', default=None, help='解析结果缓存目录（仅单进程时使用）')
+    args = parser.parse_args(argv)
+
+    paths = expandPaths(args.paths)
+    if not paths:
+        print('没有找到协议文件', file=sys.stderr)
+        return 2
+
+    cache = None
+    if args.cache:
+        from cache import ProtocolCache
+
+        cache = ProtocolCache(args.cache)
+    start = time.perf_counter()
+    count = convert(paths, args.output, args.workers or None, cache)
+    print(f'{count} 名受试者已写入 {args.output}（{os.path.getsize(args.output)} 字节，'
+          f'用时 {time.perf_counter() - start:.2f}s）')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
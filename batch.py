@@ -0,0 +1,131 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import export
+from cache import ProtocolCache
+from main import Statistic
+
+formats = ('txt', 'json', 'csv', 'jsonl')
+# 每个进程每个缓存目录一个ProtocolCache，目录总大小只在第一次写入时统计一次
+caches: Dict[str, ProtocolCache] = {}
+
+
+def openCache(directory: str) -> ProtocolCache:
+    cache = caches.get(directory)
+    if cache is None:
+        cache = caches[directory] = ProtocolCache(directory)
+    return cache
+
+
+def expandPaths(patterns: Iterable[str]) -> List[str]:
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.extend(sorted(glob.glob(os.path.join(pattern, '*.xlsx'))))
+        else:
+            paths.extend(sorted(glob.glob(pattern)))
+
+    # 去掉Excel打开文件时留下的锁文件，同一文件只打分一次
+    paths = [p for p in paths if not os.path.basename(p).startswith('~$')]
+    return list(dict.fromkeys(paths))
+
+
+def score(path: str, directory: Optional[str] = 'result', cache: Optional[str] = None,
+          format='txt') -> Tuple[str, Optional[str], float, Optional[dict]]:
+    # 单个文件出错只记录错误信息，不影响其他文件
+    # format为csv/jsonl时不在工作进程中写文件，而是返回一行结果，由主进程汇总写入一个文件
+    start = time.perf_counter()
+    data = None
+    try:
+        statistic = openCache(cache).statistic(path) if cache else Statistic(path)
+        if directory is None:
+            statistic.computeAll()
+        elif format == 'txt':
+            statistic.saveResult(directory)
+        elif format == 'json':
+            export.saveJson(statistic, directory)
+        elif format == 'csv':
+            data = export.row(statistic)
+        else:
+            data = export.record(statistic)
+    except Exception as e:
+        return path, f'{type(e).__name__}: {e}', time.perf_counter() - start, None
+    return path, None, time.perf_counter() - start, data
+
+
+def scoreAll(paths: List[str], workers: Optional[int] = None, chunksize: int = 8,
+             directory: Optional[str] = 'result', cache: Optional[str] = None,
+             format='txt') -> List[Tuple[str, Optional[str], float, Optional[dict]]]:
+    if format not in formats:
+        raise ValueError(f'unknown result format: {format}')
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+
+    if workers == 1:
+        results = [score(path, directory, cache, format) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(score, paths, [directory] * len(paths), [cache] * len(paths),
+                                        [format] * len(paths), chunksize=chunksize))
+
+    if directory is not None and format == 'csv':
+        export.writeCsv((data for *_, data in results if data is not None), os.path.join(directory, 'results.csv'))
+    elif directory is not None and format == 'jsonl':
+        export.writeJsonl((data for *_, data in results if data is not None),
+                          os.path.join(directory, 'results.jsonl'))
+    return results
+
+
+def summary(results: List[Tuple[str, Optional[str], float, Optional[dict]]], elapsed: float) -> str:
+    failed = [(path, error) for path, error, *_ in results if error]
+    busy = sum([t for _, _, t, _ in results])
+    lines = [
+        f'共 {len(results)} 个文件，成功 {len(results) - len(failed)}，失败 {len(failed)}',
+        f'用时 {elapsed:.2f}s，{len(results) / elapsed:.1f} 个/秒，单个文件平均 {busy / len(results) * 1000:.1f}ms',
+    ]
+    lines.extend(f'  {path}: {error}' for path, error in failed)
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量计算目录或通配符下所有协议的结构概要')
+    parser.add_argument('paths', nargs='+', help='目录或通配符，如 data/*.xlsx')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='进程数，默认为CPU核数')
+    parser.add_argument('-c', '--chunksize', type=int, default=8, help='每次分发给进程的文件数')
+    parser.add_argument('-o', '--output', default='result', help='结果目录')
+    parser.add_argument('-f', '--format', choices=formats, default='txt',
+                        help='txt/json为每个文件一个结果，csv/jsonl为整批写入一个results文件')
+    parser.add_argument('--no-save', action='store_true', help='只计算不写结果文件')
+    parser.add_argument('--cache', default=None, help='解析结果缓存目录，文件未改变时跳过Excel解析')
+    parser.add_argument('--profile', nargs='?', const='', default=None,
+                        help='按部分统计用时（串行运行），可指定追加写入的JSON文件')
+    args = parser.parse_args(argv)
+
+    paths = expandPaths(args.paths)
+    if not paths:
+        print('没有找到协议文件', file=sys.stderr)
+        return 2
+
+    if args.profile is not None:
+        import instrument
+
+        recorder = instrument.enable(*([instrument.JsonSink(args.profile)] if args.profile else []))
+        args.workers = 1
+
+    start = time.perf_counter()
+    results = scoreAll(paths, args.workers, args.chunksize, None if args.no_save else args.output, args.cache,
+                       args.format)
+    print(summary(results, time.perf_counter() - start))
+    if args.profile is not None:
+        print(recorder.format())
+        instrument.disable()
+    return 1 if any(error for _, error, *_ in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+# 单个协议一次性打分的冷启动用时：python -m main <文件> 的总用时减去空解释器的启动用时
+# 超出预算或加载了重依赖时返回非零，可以放在CI里防止启动变慢
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+heavy = ('pandas', 'numpy', 'openpyxl', 'zipfile', 'urllib.request', 'email')
+
+
+def best(command: List[str], cwd: str, env: dict, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, env=env, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def loaded(path: str, cwd: str, env: dict) -> List[str]:
+    code = ('import sys, main; main.Statistic(sys.argv[1]).computeAll(); '
+            f'print(",".join(m for m in {heavy!r} if m in sys.modules))')
+    output = subprocess.run([sys.executable, '-c', code, path], cwd=cwd, env=env, capture_output=True, text=True,
+                            check=True).stdout.strip()
+    return output.split(',') if output else []
+
+
+def measure(path: str, repeat=20) -> dict:
+    directory = tempfile.mkdtemp(prefix='rorschach-coldstart-')
+    os.makedirs(os.path.join(directory, 'result'), exist_ok=True)
+    env = dict(os.environ, PYTHONPATH=root)
+    # 部署环境中字节码缓存是可写的，测量时也允许写入
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    path = os.path.abspath(path)
+
+    # 预热一次，生成字节码缓存
+    subprocess.run([sys.executable, '-m', 'main', path], cwd=directory, env=env, stdout=subprocess.DEVNULL, check=True)
+    interpreter = best([sys.executable, '-c', 'pass'], directory, env, repeat)
+    imported = best([sys.executable, '-c', 'import main'], directory, env, repeat)
+    scored = best([sys.executable, '-m', 'main', path], directory, env, repeat)
+    return {
+        'interpreter': interpreter,
+        'import': imported - interpreter,
+        'score': scored - interpreter,
+        'loaded': loaded(path, directory, env),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='测量单个协议打分的冷启动用时并检查预算')
+    parser.add_argument('path', nargs='?', default=os.path.join(root, 'data', 'zl.xlsx'), help='协议文件')
+    parser.add_argument('-b', '--budget', type=float, default=80, help='python -m main的预算（毫秒，不含解释器启动）')
+    parser.add_argument('-r', '--repeat', type=int, default=20, help='重复次数，取最好成绩')
+    parser.add_argument('-o', '--output', default=None, help='结果写入JSON文件')
+    args = parser.parse_args(argv)
+
+    result = measure(args.path, args.repeat)
+    result['budget'] = args.budget / 1000
+    print(f'解释器启动 {result["interpreter"] * 1000:.1f}ms，导入main {result["import"] * 1000:.1f}ms，'
+          f'打分 {result["score"] * 1000:.1f}ms（预算 {args.budget:.0f}ms）')
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+    failed = False
+    if result['score'] > result['budget']:
+        print('超出冷启动预算', file=sys.stderr)
+        failed = True
+    if result['loaded']:
+        print(f'冷启动路径上加载了重依赖：{", ".join(result["loaded"])}', file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
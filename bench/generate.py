@@ -0,0 +1,108 @@
+import random
+from typing import Iterator, List, Optional
+
+from main import Reaction, Statistic, Z
+
+# 合成协议：代码取自Determination、Content、Spec与Z.score_table，出现频率大致按临床样本设定
+columns = ('Card', 'Desc', 'Pt', 'DQ', 'FQ', 'Det', 'Cont', 'P', 'Z', 'Spec')
+
+DETS = {
+    'F': 40, 'M': 12, 'FM': 10, 'm': 4, 'FC': 6, 'CF': 5, 'C': 1, 'Cn': 0.2, "FC'": 2, "C'F": 1, "C'": 0.3,
+    'FT': 2, 'TF': 0.5, 'T': 0.2, 'FV': 1, 'VF': 0.3, 'V': 0.1, 'FY': 3, 'YF': 1, 'Y': 0.3, 'Fr': 0.5, 'rF': 0.2,
+    'FD': 2, '(2)': 8,
+}
+CONTS = {
+    'H': 10, '(H)': 2, 'Hd': 4, '(Hd)': 1, 'Hx': 0.5, 'A': 30, '(A)': 1, 'Ad': 8, '(Ad)': 0.5, 'An': 3, 'Art': 3,
+    'Ay': 1, 'Bl': 0.5, 'Bt': 4, 'Cg': 3, 'Cl': 1, 'Ex': 0.5, 'Fd': 1, 'Fi': 1, 'Ge': 0.5, 'Hh': 2, 'Ls': 2,
+    'Na': 2, 'Sc': 3, 'Sx': 0.5, 'Xy': 0.5, 'Id': 1,
+}
+# 'CON'在WSum6的计分表中没有对应项，生成时只用'CONT'
+SPECS = {
+    'DV': 3, 'DV2': 0.5, 'INC': 3, 'INC2': 0.5, 'DR': 2, 'DR2': 0.5, 'FAB': 2, 'FAB2': 0.5, 'ALOG': 0.5,
+    'CONT': 0.2, 'AB': 1, 'AG': 2, 'COP': 3, 'CP': 0.2, 'MOR': 3, 'PER': 2, 'PSV': 0.5,
+}
+PARTS = {'W': 35, 'WS': 4, 'D': 40, 'DS': 4, 'Dd': 12, 'DdS': 5}
+DQS = {'o': 55, '+': 30, 'v/+': 3, 'v': 12}
+FQS = {'o': 50, 'u': 25, '-': 20, '+': 3}
+# 没有形状成分的决定因子，形态质量记为none
+FORMLESS = {'C', 'Cn', "C'", 'T', 'V', 'Y', 'm'}
+MOTION = ('M', 'FM', 'm')
+
+
+class Generator:
+    def __init__(self, seed: Optional[int] = 0):
+        self.rng = random.Random(seed)
+        self.tables = {name: (list(table), list(table.values()))
+                       for name, table in (('det', DETS), ('cont', CONTS), ('spec', SPECS), ('part', PARTS),
+                                           ('dq', DQS), ('fq', FQS))}
+
+    def pick(self, name: str, k=1) -> list:
+        codes, weights = self.tables[name]
+        result = []
+        while len(result) < k:
+            code = self.rng.choices(codes, weights)[0]
+            if code not in result:
+                result.append(code)
+        return result
+
+    def row(self, card: int) -> dict:
+        rng = self.rng
+        category = self.pick('part')[0]
+        if category in ('W', 'WS'):
+            pt = category
+        else:
+            pt = f'{category}{rng.randint(21, 40) if category.startswith("Dd") else rng.randint(1, 12)}'
+        dq = self.pick('dq')[0]
+
+        dets = self.pick('det', rng.choices((1, 2, 3), (75, 20, 5))[0])
+        if '(2)' in dets and len(dets) == 1:
+            dets.insert(0, 'F')
+        dets = [f'{d}{rng.choice("ap")}' if d in MOTION else d for d in dets]
+        fq = 'none' if all(d.rstrip('ap') in FORMLESS for d in dets) else self.pick('fq')[0]
+
+        z = None
+        if dq in ('+', 'v/+') or category in ('W', 'WS') and dq != 'v':
+            z = 'W' if category in ('W', 'WS') else rng.choice([code for code in Z.score_table[card] if code != 'W'])
+        spec = self.pick('spec', rng.choices((0, 1, 2), (70, 25, 5))[0])
+
+        return {
+            'Card': card,
+            'Desc': f'反应{rng.randint(1, 999)}',
+            'Pt': pt,
+            'DQ': dq,
+            'FQ': fq,
+            'Det': '.'.join(dets),
+            'Cont': '.'.join(self.pick('cont', rng.choices((1, 2, 3), (80, 17, 3))[0])),
+            'P': 'P' if rng.random() < 0.22 else None,
+            'Z': z,
+            'Spec': '.'.join(spec) if spec else None,
+        }
+
+    def rows(self, R: Optional[int] = None) -> List[dict]:
+        # 每张卡片至少一个反应，其余反应随机分到各卡片，按卡片顺序排列
+        if R is None:
+            R = max(14, min(60, round(self.rng.gauss(22, 6))))
+        cards = list(range(1, 11)) + [self.rng.randint(1, 10) for _ in range(max(R, 10) - 10)]
+        cards.sort()
+        return [self.row(card) for card in cards[:R]]
+
+    def reactions(self, R: Optional[int] = None) -> List[Reaction]:
+        return [Statistic.makeReaction(row) for row in self.rows(R)]
+
+    def cohort(self, n: int, R: Optional[int] = None) -> Iterator[List[dict]]:
+        for _ in range(n):
+            yield self.rows(R)
+
+
+def protocol(R: Optional[int] = None, seed: Optional[int] = 0) -> List[Reaction]:
+    return Generator(seed).reactions(R)
+
+
+def cohort(n: int, R: Optional[int] = None, seed: Optional[int] = 0) -> Iterator[List[dict]]:
+    return Generator(seed).cohort(n, R)
+
+
+def writeProtocol(path, rows: List[dict]):
+    import xlsx
+
+    xlsx.writeRows(path, rows, columns)
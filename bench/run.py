@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from bench.generate import Generator, writeProtocol
+from main import Reaction, Statistic
+
+# 各阶段分别计时，结果写成JSON，便于不同版本之间对比
+
+
+def measure(func: Callable, repeat: int, setup: Optional[Callable] = None) -> dict:
+    # func返回本次处理的条目数（反应数、协议数等），统计每次的总用时与每条目用时
+    # setup的结果作为func的参数，不计入用时
+    times = []
+    items = 0
+    for _ in range(repeat):
+        args = (setup(),) if setup is not None else ()
+        start = time.perf_counter()
+        items = func(*args)
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    return {
+        'repeat': repeat,
+        'items': items,
+        'best': best,
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'per_item_us': best / items * 1e6 if items else None,
+    }
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'commit': commit,
+    }
+
+
+class Suite:
+    def __init__(self, subjects=200, R: Optional[int] = None, files=50, repeat=5, seed=0, workers: Optional[int] = None):
+        self.subjects = subjects
+        self.R = R
+        self.files = files
+        self.repeat = repeat
+        self.workers = workers
+        generator = Generator(seed)
+        self.rows = list(generator.cohort(subjects, R))
+        self.protocols = [[Statistic.makeReaction(row) for row in rows] for rows in self.rows]
+        self.directory = tempfile.mkdtemp(prefix='rorschach-bench-')
+        self.paths = []
+        for i, rows in enumerate(self.rows[:files]):
+            path = os.path.join(self.directory, f'subject{i}.xlsx')
+            writeProtocol(path, rows)
+            self.paths.append(path)
+
+    def reactionCount(self, protocols: List[List[Reaction]]) -> int:
+        return sum([len(p) for p in protocols])
+
+    # ---------------- 各阶段 ----------------
+
+    def readReactions(self) -> int:
+        return sum([len(Statistic.readReactions(path)) for path in self.paths])
+
+    def makeReaction(self) -> int:
+        return sum([len([Statistic.makeReaction(row) for row in rows]) for rows in self.rows])
+
+    def unscored(self) -> List[Reaction]:
+        # calcHR会把GHR/PHR追加到spec，每次都从未计算过的反应开始
+        return [Reaction(r.card, r.desc, r.pt, r.dq, r.fq, r.det, r.cont, r.p, r.z,
+                         [s for s in r.spec if s.spec not in ('GHR', 'PHR')], hr=False)
+                for p in self.protocols for r in p]
+
+    def calcHR(self, reactions: List[Reaction]) -> int:
+        for r in reactions:
+            r.calcHR()
+        return len(reactions)
+
+    def statistic(self) -> int:
+        for reactions in self.protocols:
+            Statistic('bench', reactions).computeAll()
+        return len(self.protocols)
+
+    def repr(self) -> int:
+        for s in self.statistics:
+            repr(s)
+        return len(self.statistics)
+
+    def saveResult(self) -> int:
+        for s in self.statistics:
+            s.saveResult(self.result)
+        return len(self.statistics)
+
+    def batch(self, workers: Optional[int]) -> int:
+        from batch import scoreAll
+
+        results = scoreAll(self.paths, workers, directory=None)
+        return len(results)
+
+    def cohort(self) -> int:
+        from screen import Screening
+        from table import ReactionTable
+
+        table = ReactionTable.fromProtocols(zip([str(i) for i in range(len(self.protocols))], self.protocols))
+        Screening.fromTable(table)
+        return len(self.protocols)
+
+    def run(self, only: Optional[List[str]] = None) -> Dict[str, dict]:
+        self.statistics = [Statistic('bench', reactions) for reactions in self.protocols]
+        for s in self.statistics:
+            s.computeAll()
+        self.result = os.path.join(self.directory, 'result')
+        os.makedirs(self.result, exist_ok=True)
+
+        stages = {
+            'readReactions': self.readReactions,
+            'makeReaction': self.makeReaction,
+            'calcHR': self.calcHR,
+            'Statistic': self.statistic,
+            'repr': self.repr,
+            'saveResult': self.saveResult,
+            'batch.serial': lambda: self.batch(1),
+            'batch.parallel': lambda: self.batch(self.workers),
+            'cohort.table': self.cohort,
+        }
+        results = {}
+        for name, stage in stages.items():
+            if only and name not in only:
+                continue
+            # 多进程的启动开销较大，只跑一次
+            repeat = 1 if name == 'batch.parallel' else self.repeat
+            results[name] = measure(stage, repeat, self.unscored if name == 'calcHR' else None)
+        return results
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def compare(old: dict, new: dict) -> str:
+    lines = []
+    for name, result in new['results'].items():
+        before = old['results'].get(name)
+        if before is None:
+            continue
+        ratio = result['best'] / before['best']
+        lines.append(f'{name:16s} {before["best"] * 1000:10.2f}ms -> {result["best"] * 1000:10.2f}ms  x{ratio:.2f}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='用合成协议测量各阶段的性能')
+    parser.add_argument('-n', '--subjects', type=int, default=200, help='合成受试者数')
+    parser.add_argument('-R', type=int, default=None, help='每个协议的反应数，默认随机（14~60）')
+    parser.add_argument('--files', type=int, default=50, help='写成xlsx用于读取与批量计时的协议数')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='每个阶段重复次数，取最好成绩')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='batch.parallel的进程数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='*', default=None, help='只运行指定阶段')
+    parser.add_argument('-o', '--output', default=None, help='结果文件，默认为bench/results/<时间>.json')
+    parser.add_argument('--compare', default=None, help='与之前的结果文件对比')
+    args = parser.parse_args(argv)
+
+    suite = Suite(args.subjects, args.R, args.files, args.repeat, args.seed, args.workers)
+    try:
+        report = {
+            'environment': environment(),
+            'parameters': {'subjects': args.subjects, 'R': args.R, 'files': args.files, 'repeat': args.repeat,
+                           'seed': args.seed, 'workers': args.workers,
+                           'reactions': suite.reactionCount(suite.protocols)},
+            'results': suite.run(args.only),
+        }
+    finally:
+        suite.close()
+
+    output = args.output
+    if output is None:
+        directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+        os.makedirs(directory, exist_ok=True)
+        output = os.path.join(directory, time.strftime('%Y%m%d-%H%M%S.json'))
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    for name, result in report['results'].items():
+        per_item = f'{result["per_item_us"]:.1f}us/item' if result['per_item_us'] is not None else ''
+        print(f'{name:16s} {result["best"] * 1000:10.2f}ms  {per_item}')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print(compare(json.load(f), report))
+    print(f'结果已写入 {output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
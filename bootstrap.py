@@ -0,0 +1,194 @@
+import argparse
+import csv
+import functools
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy
+
+from main import Ratio, Statistic
+from table import ReactionTable
+
+# 单个协议内按反应重抽样（有放回，每次抽R条）得到比率与比例的置信区间
+# 每名受试者只算一次逐反应的计数矩阵（R×K），再生成B×R的重抽样下标矩阵，换成每条反应被抽中的次数，
+# 与计数矩阵相乘即得全部B次重抽样的计数器；变量直接用Statistic中的计算函数对整列求值，公式与点估计完全一致
+# 除零（如全部抽到8~10卡时的Afr）按IEEE得到inf/nan，分位数忽略nan
+default_names = ('XA', 'WDA', 'Xminus', 'Xplus', 'Xu', 'Afr', 'EgoI', 'IsoI', 'Zd', 'L', 'EB', 'eb', 'FCR')
+ZEst = numpy.array([Statistic.ZEst_table.get(zf, numpy.nan) for zf in range(max(Statistic.ZEst_table) + 1)])
+
+
+class Columns:
+    # 代替Statistic实例传给变量的计算函数：计数器为数组，其余变量按需计算并缓存
+    def __init__(self, counters: Dict[str, numpy.ndarray], R: numpy.ndarray):
+        self.__dict__.update(counters)
+        self.R = R
+
+    def __getattr__(self, name: str):
+        if name == 'ZEst':
+            # ZEst表之外的Zf在Statistic中抛出KeyError，这里记为nan
+            zf = self.Zf.astype(numpy.int64)
+            value = numpy.where(zf < len(ZEst), ZEst[numpy.minimum(zf, len(ZEst) - 1)], numpy.nan)
+        elif name in Statistic.variables and Statistic.variables[name].func is not None:
+            value = Statistic.variables[name].func(self)
+        else:
+            raise AttributeError(name)
+        self.__dict__[name] = value
+        return value
+
+
+def counterNames(names: Sequence[str]) -> List[str]:
+    # 计数器本身也要进矩阵：Statistic.dependencies('M')只有reactions
+    return sorted(name for name in set(names) | Statistic.dependencies(*names) if name in Statistic.slot)
+
+
+@functools.lru_cache(maxsize=None)
+def vectorizable() -> frozenset:
+    # 用两组取值试算每个变量，能对整列求值的才支持重抽样；
+    # 含条件判断或min/max的指数（SCON、DEPI、Adjes等）、需要逐条反应的变量（blends、ComR等）都会在这里失败
+    result = set()
+    for name in Statistic.variables:
+        columns = Columns({counter: numpy.array([1.0, 2.0]) for counter in counterNames([name])},
+                          numpy.array([10, 20]))
+        try:
+            values = evaluate(columns, [name])
+        except Exception:
+            continue
+        if all(value.shape == (2,) for value in values.values()):
+            result.add(name)
+    return frozenset(result)
+
+
+def evaluate(columns: Columns, names: Sequence[str]) -> Dict[str, numpy.ndarray]:
+    # Ratio拆成.left与.right两列，与norms、export一致
+    result = {}
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        for name in names:
+            value = getattr(columns, name)
+            if isinstance(value, Ratio):
+                result[f'{name}.left'] = numpy.asarray(value.left, dtype=numpy.float64)
+                result[f'{name}.right'] = numpy.asarray(value.right, dtype=numpy.float64)
+            else:
+                result[name] = numpy.asarray(value, dtype=numpy.float64)
+    return result
+
+
+def counterMatrix(table: ReactionTable, counters: Sequence[str]) -> numpy.ndarray:
+    # 每条反应对各计数器的贡献，N×K
+    masks = table.masks()
+    return numpy.column_stack([masks[name].astype(numpy.float64) for name in counters]) if counters else \
+        numpy.zeros((len(table.card), 0))
+
+
+def resample(matrix: numpy.ndarray, offsets: numpy.ndarray, counters: Sequence[str], names: Sequence[str],
+             resamples=2000, confidence=0.95, seed=0, first=0) -> Dict[str, numpy.ndarray]:
+    # 对offsets划分的每名受试者分别重抽样；first为第一名受试者在整个队列中的序号，
+    # 每名受试者的随机数只由(seed, 序号)决定，分块、并行与否结果都相同
+    n = len(offsets) - 1
+    q = [(1 - confidence) / 2, (1 + confidence) / 2]
+    result: Dict[str, numpy.ndarray] = {}
+    for i in range(n):
+        start, end = int(offsets[i]), int(offsets[i + 1])
+        R = end - start
+        block = matrix[start:end]
+
+        point = evaluate(Columns(dict(zip(counters, block.sum(axis=0)[:, None])), numpy.array([R])), names)
+        if R:
+            rng = numpy.random.default_rng((seed, first + i))
+            index = rng.integers(0, R, size=(resamples, R)) + numpy.arange(resamples)[:, None] * R
+            weights = numpy.bincount(index.ravel(), minlength=resamples * R).reshape(resamples, R)
+            sums = weights.astype(numpy.float64) @ block
+            values = evaluate(Columns(dict(zip(counters, sums.T)), numpy.full(resamples, R)), names)
+        else:
+            values = {key: numpy.full(resamples, numpy.nan) for key in point}
+
+        for key, value in values.items():
+            if key not in result:
+                result[key] = numpy.full(n, numpy.nan)
+                result[f'{key}.low'] = numpy.full(n, numpy.nan)
+                result[f'{key}.high'] = numpy.full(n, numpy.nan)
+                result[f'{key}.se'] = numpy.full(n, numpy.nan)
+            result[key][i] = point[key][0]
+            finite = value[~numpy.isnan(value)]
+            if len(finite):
+                # 不插值：两端可能是inf，插值会得到nan
+                result[f'{key}.low'][i], result[f'{key}.high'][i] = numpy.quantile(finite, q, method='inverted_cdf')
+                if numpy.isfinite(finite).all():
+                    result[f'{key}.se'][i] = finite.std(ddof=1) if len(finite) > 1 else 0.0
+    return result
+
+
+def bootstrap(table: ReactionTable, names: Sequence[str] = default_names, resamples=2000, confidence=0.95, seed=0,
+              workers: Optional[int] = 1, chunk=500) -> Dict[str, numpy.ndarray]:
+    # 返回 变量 -> 逐受试者数组：点估计、.low、.high与.se（标准误，含inf时为nan）
+    unsupported = [name for name in names if name not in vectorizable()]
+    if unsupported:
+        raise ValueError(f'cannot bootstrap {", ".join(unsupported)}')
+    counters = counterNames(names)
+    matrix = counterMatrix(table, counters)
+    offsets = table.offsets
+    n = len(table)
+    starts = list(range(0, n, chunk)) or [0]
+    args = [(matrix[offsets[s]:offsets[min(s + chunk, n)]], offsets[s:min(s + chunk, n) + 1] - offsets[s],
+             counters, names, resamples, confidence, seed, s) for s in starts]
+
+    if workers == 1 or len(args) == 1:
+        parts = [resample(*a) for a in args]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parts = list(executor.map(resample, *zip(*args)))
+    return {key: numpy.concatenate([p[key] for p in parts]) for key in parts[0]}
+
+
+def writeCsv(names: List[str], result: Dict[str, numpy.ndarray], path):
+    keys = [key for key in result if not key.endswith(('.low', '.high', '.se'))]
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name'] + [f'{key}{suffix}' for key in keys for suffix in ('', '.low', '.high', '.se')])
+        for i, name in enumerate(names):
+            writer.writerow([name] + ['' if numpy.isnan(v) else float(v) for key in keys
+                                      for v in (result[key][i], result[f'{key}.low'][i], result[f'{key}.high'][i],
+                                                result[f'{key}.se'][i])])
+
+
+def main(argv=None):
+    from query import load
+
+    parser = argparse.ArgumentParser(description='按反应重抽样，计算每名受试者比率与比例的置信区间')
+    parser.add_argument('paths', nargs='+', help='协议目录、通配符或归档文件（.rcha）')
+    parser.add_argument('-v', '--variables', nargs='*', default=list(default_names), help='变量名')
+    parser.add_argument('-n', '--resamples', type=int, default=2000, help='每名受试者的重抽样次数')
+    parser.add_argument('-c', '--confidence', type=float, default=0.95, help='置信水平')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-j', '--workers', type=int, default=1, help='进程数，0为CPU核数')
+    parser.add_argument('-o', '--output', default='bootstrap.csv', help='结果CSV')
+    parser.add_argument('--cache', default=None, help='解析结果缓存目录')
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.variables if name not in Statistic.variables]
+    if unknown:
+        print(f'未知变量：{", ".join(unknown)}', file=sys.stderr)
+        return 2
+    unsupported = [name for name in args.variables if name not in vectorizable()]
+    if unsupported:
+        print(f'以下变量不能按列重抽样：{", ".join(unsupported)}', file=sys.stderr)
+        return 2
+    cache = None
+    if args.cache:
+        from cache import ProtocolCache
+
+        cache = ProtocolCache(args.cache)
+    table = load(args.paths, cache)
+
+    start = time.perf_counter()
+    result = bootstrap(table, args.variables, args.resamples, args.confidence, args.seed, args.workers or None)
+    writeCsv(table.names, result, args.output)
+    print(f'{len(table)} 名受试者，每人 {args.resamples} 次重抽样，用时 {time.perf_counter() - start:.2f}s，'
+          f'结果已写入 {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+from main import DQ, FQ, Z, Content, Determination, Part, Reaction, Spec, Statistic
+
+# 反应的编码方式或GHR/PHR规则改变时需要修改，使旧缓存失效
+VERSION = b'1'
+MAGIC = b'RCH' + VERSION
+
+
+def encode(reactions: List[Reaction]) -> bytes:
+    return MAGIC + marshal.dumps([
+        (int(r.card), r.desc, str(r.pt), r.dq.dq, r.fq.fq, '.'.join([str(d) for d in r.det]),
+         '.'.join([c.cont for c in r.cont]), r.p, r.z.z if r.z else '', '.'.join([s.spec for s in r.spec]))
+        for r in reactions
+    ])
+
+
+def decode(data: bytes) -> List[Reaction]:
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError('not a protocol cache entry')
+
+    return [
+        Reaction(card=card, desc=desc, pt=Part(pt), dq=DQ(dq), fq=FQ(fq),
+                 det=[Determination(d) for d in det.split('.')],
+                 cont=[Content(c) for c in cont.split('.')], p=p,
+                 z=Z(z, card) if z else None,
+                 spec=[Spec(s) for s in spec.split('.')] if spec else [], hr=False)
+        for card, desc, pt, dq, fq, det, cont, p, z, spec in marshal.loads(data[len(MAGIC):])
+    ]
+
+
+class ProtocolCache:
+    def __init__(self, directory='.cache', max_bytes=256 * 1024 * 1024, key='hash'):
+        # key='hash'按文件内容寻址，key='stat'按路径+修改时间+大小寻址，省去读文件算摘要
+        if key not in ('hash', 'stat'):
+            raise ValueError(f'unknown cache key: {key}')
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.key_mode = key
+        self.size: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        # 本实例读写过的路径 -> 当时的键；hash模式下文件改变后键随之改变，invalidate靠它找到旧条目
+        self.keys: Dict[str, str] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, path) -> str:
+        digest = hashlib.blake2b(VERSION + bytes(sys.version_info[:2]), digest_size=20)
+        if self.key_mode == 'stat':
+            st = os.stat(path)
+            digest.update(f'{os.path.abspath(path)}\0{st.st_mtime_ns}\0{st.st_size}'.encode())
+        else:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    def entry(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.rch')
+
+    # key为self.key(path)，调用方已算过时传入，省去再读一遍文件
+    def get(self, path, key: Optional[str] = None) -> Optional[List[Reaction]]:
+        key = key or self.key(path)
+        self.keys[os.path.abspath(path)] = key
+        entry = self.entry(key)
+        try:
+            with open(entry, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        # 记录最近使用时间，淘汰时按此排序
+        os.utime(entry)
+        self.hits += 1
+        return decode(data)
+
+    def put(self, path, reactions: List[Reaction], key: Optional[str] = None):
+        key = key or self.key(path)
+        self.keys[os.path.abspath(path)] = key
+        entry = self.entry(key)
+        data = encode(reactions)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # 覆盖已有条目时减去旧条目的大小
+        try:
+            replaced = os.stat(entry).st_size
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp, entry)
+
+        if self.size is None:
+            self.size = self.usage()
+        else:
+            self.size += len(data) - replaced
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def load(self, path) -> List[Reaction]:
+        key = self.key(path)
+        reactions = self.get(path, key)
+        if reactions is None:
+            reactions = Statistic.readReactions(path)
+            self.put(path, reactions, key)
+        return reactions
+
+    def statistic(self, path) -> Statistic:
+        return Statistic(path, self.load(path))
+
+    def entries(self) -> List[os.DirEntry]:
+        with os.scandir(self.directory) as it:
+            return [e for e in it if e.name.endswith('.rch')]
+
+    def usage(self) -> int:
+        return sum([e.stat().st_size for e in self.entries()])
+
+    def evict(self):
+        # 按最近使用时间从旧到新删除，直到总大小回到上限的90%以内
+        entries = sorted(self.entries(), key=lambda e: e.stat().st_mtime_ns)
+        size = sum([e.stat().st_size for e in entries])
+        for e in entries:
+            if size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(e.path)
+            except FileNotFoundError:
+                pass
+            size -= e.stat().st_size
+        self.size = size
+
+    def invalidate(self, path) -> bool:
+        # 删除文件当前内容的条目，以及本实例上次读写该路径时的条目（hash模式下文件改变后两者不同）；
+        # 其他进程写入、之后文件又改变了的旧条目不会再被命中，留给淘汰
+        keys = set()
+        remembered = self.keys.pop(os.path.abspath(path), None)
+        if remembered:
+            keys.add(remembered)
+        try:
+            keys.add(self.key(path))
+        except FileNotFoundError:
+            pass
+
+        removed = False
+        for key in keys:
+            try:
+                os.remove(self.entry(key))
+                removed = True
+            except FileNotFoundError:
+                pass
+        if removed:
+            self.size = None
+        return removed
+
+    def clear(self):
+        for e in self.entries():
+            os.remove(e.path)
+        self.size = 0
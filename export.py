@@ -0,0 +1,120 @@
+import csv
+import json
+import math
+from typing import Dict, Iterable, List
+
+from main import Ratio, Statistic, TriRatio
+
+# 机器可读的结果：每个受试者一个JSON，或整批一张宽表（每个受试者一行、每个变量一列）
+# 比率导出为数值对，指数导出阳性条目编号；无法计算（除零等）的变量为null/空
+indices = ('SCON', 'PTI', 'DEPI', 'CDI')
+ratios = ('EB', 'eb', 'APR', 'MAPR', 'FCR', 'CpCR', 'ComR', 'AspR', 'GHR_PHR', 'H_hd')
+names = tuple(Statistic.variables)
+
+
+def jsonValue(value):
+    if isinstance(value, Ratio):
+        return [jsonValue(value.left), jsonValue(value.right)]
+    if isinstance(value, TriRatio):
+        return [value.left, value.middle, value.right]
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def value(statistic: Statistic, name: str):
+    try:
+        return getattr(statistic, name)
+    except (ZeroDivisionError, KeyError):
+        return None
+
+
+def record(statistic: Statistic) -> dict:
+    result = {'name': statistic.name}
+    for name in names:
+        v = value(statistic, name)
+        if name in indices:
+            result[name] = [i + 1 for i, positive in enumerate(v) if positive] if v is not None else None
+        elif name == 'blends':
+            result[name] = ['.'.join([str(d) for d in blend]) for blend in v]
+        elif name == 'part_seq':
+            result[name] = {str(card): seq for card, seq in v.items()}
+        else:
+            result[name] = jsonValue(v)
+    return result
+
+
+def row(statistic: Statistic) -> Dict[str, object]:
+    # 宽表的一行：比率拆成name.left/name.right，指数为阳性条目数，混合反应与部位序列用分隔符连接
+    result = {'name': statistic.name}
+    for name, v in record(statistic).items():
+        if name == 'name':
+            continue
+        if name in indices:
+            result[name] = len(v) if v is not None else None
+        elif name == 'blends':
+            result[name] = ';'.join(v)
+        elif name == 'part_seq':
+            for card, seq in v.items():
+                result[f'part_seq.{card}'] = ','.join(seq)
+        elif name == 'EcoI':
+            for part, x in zip(('left', 'middle', 'right'), v or (None, None, None)):
+                result[f'{name}.{part}'] = x
+        elif name in ratios:
+            result[f'{name}.left'], result[f'{name}.right'] = v or (None, None)
+        else:
+            result[name] = int(v) if isinstance(v, bool) else v
+    return result
+
+
+def saveJson(statistic: Statistic, directory='result'):
+    with open(f'{directory}/{statistic.name}.json', 'w', encoding='utf-8') as f:
+        json.dump(record(statistic), f, ensure_ascii=False)
+
+
+def header() -> List[str]:
+    # 列名不依赖具体数据，宽表可以边算边写
+    columns = ['name']
+    for name in names:
+        if name == 'part_seq':
+            columns.extend(f'part_seq.{card}' for card in range(1, 11))
+        elif name == 'EcoI':
+            columns.extend(f'{name}.{part}' for part in ('left', 'middle', 'right'))
+        elif name in ratios:
+            columns.extend((f'{name}.left', f'{name}.right'))
+        else:
+            columns.append(name)
+    return columns
+
+
+def writeCsv(rows: Iterable[dict], path, buffering=1 << 20) -> int:
+    # rows为row()的结果，一次顺序写出，不为每个受试者单独打开文件
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8-sig', buffering=buffering) as f:
+        writer = csv.DictWriter(f, header(), restval='')
+        writer.writeheader()
+        for r in rows:
+            writer.writerow({k: '' if v is None else v for k, v in r.items()})
+            count += 1
+    return count
+
+
+def saveCsv(statistics: Iterable[Statistic], path) -> int:
+    return writeCsv((row(s) for s in statistics), path)
+
+
+def writeJsonl(records: Iterable[dict], path, buffering=1 << 20) -> int:
+    count = 0
+    with open(path, 'w', encoding='utf-8', buffering=buffering) as f:
+        for r in records:
+            f.write(json.dumps(r, ensure_ascii=False))
+            f.write('\n')
+            count += 1
+    return count
+
+
+def saveParquet(statistics: Iterable[Statistic], path):
+    # 列式存储需要pandas与pyarrow，未安装时只能使用CSV
+    import pandas
+
+    pandas.DataFrame([row(s) for s in statistics], columns=header()).to_parquet(path, index=False)
@@ -0,0 +1,205 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from main import Reaction, Statistic
+
+# 按逻辑部分统计用时与调用次数。默认关闭，此时不替换任何函数，没有额外开销；
+# enable()时把readReactions、calcHR、tally、各变量的计算函数与报告输出换成计时的包装，disable()时换回
+# 用时分为self（不含被调用的其他部分）与total（含），各部分的self之和即为总用时
+
+# 结构概要变量 -> 所属部分，与main.py中的分节注释一致；部位、决定因子、形态质量、内容、特殊分数的计数器
+# 由Statistic.tally一次遍历同时算出，无法再细分，统一记为“计数”
+variable_sections = {
+    '部位特征': ('ZEst', 'W_D'),
+    '核心部分': ('SumCp', 'SumT', 'SumV', 'SumY', 'R', 'L', 'WSumC', 'EB', 'EA', 'eb', 'es', 'Dscore', 'Adjes',
+             'AdjD'),
+    '思维部分': ('APR', 'MAPR', 'Intel'),
+    '情绪部分': ('FCR', 'CpCR', 'Afr', 'ComR'),
+    '调节部分': ('XA', 'WDA', 'Xminus', 'Xplus', 'Xu'),
+    '加工部分': ('EcoI', 'AspR', 'Zd'),
+    '人际交往部分': ('GHR_PHR', 'HCont', 'IsoI'),
+    '自我知觉部分': ('Fr_rF', 'An_Xy', 'H_hd', 'EgoI'),
+}
+index_prefixes = ('SCON', 'PTI', 'DEPI', 'CDI', 'HVI', 'OBS')
+
+
+def sectionOf(name: str) -> str:
+    for section, names in variable_sections.items():
+        if name in names:
+            return section
+    if name.startswith(index_prefixes):
+        return '特殊指数'
+    return '其他'
+
+
+class Recorder:
+    def __init__(self):
+        self.calls: Dict[str, int] = {}
+        self.self_time: Dict[str, float] = {}
+        self.total_time: Dict[str, float] = {}
+        # 正在计时的各层已用去的子部分时间
+        self.stack: List[float] = []
+
+    def begin(self) -> float:
+        self.stack.append(0.0)
+        return time.perf_counter()
+
+    def end(self, section: str, start: float):
+        elapsed = time.perf_counter() - start
+        child = self.stack.pop()
+        if self.stack:
+            self.stack[-1] += elapsed
+        self.calls[section] = self.calls.get(section, 0) + 1
+        self.self_time[section] = self.self_time.get(section, 0.0) + elapsed - child
+        self.total_time[section] = self.total_time.get(section, 0.0) + elapsed
+
+    def timed(self, section: str, func: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            start = self.begin()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.end(section, start)
+
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    def report(self) -> Dict[str, dict]:
+        return {section: {'calls': self.calls[section], 'self': self.self_time[section],
+                          'total': self.total_time[section]}
+                for section in sorted(self.calls, key=lambda s: -self.self_time[s])}
+
+    def reset(self):
+        self.calls.clear()
+        self.self_time.clear()
+        self.total_time.clear()
+
+    def format(self) -> str:
+        lines = [f'{"部分":10s} {"调用":>8s} {"self/ms":>10s} {"total/ms":>10s}']
+        for section, r in self.report().items():
+            lines.append(f'{section:10s} {r["calls"]:8d} {r["self"] * 1000:10.2f} {r["total"] * 1000:10.2f}')
+        return '\n'.join(lines)
+
+
+# ---------------- 输出 ----------------
+
+class MemorySink:
+    def __init__(self):
+        self.reports: List[dict] = []
+
+    def emit(self, report: dict):
+        self.reports.append(report)
+
+
+class LogSink:
+    def __init__(self, logger: Optional[logging.Logger] = None, level=logging.INFO):
+        self.logger = logger or logging.getLogger('rorschach.instrument')
+        self.level = level
+
+    def emit(self, report: dict):
+        for section, r in report.items():
+            self.logger.log(self.level, '%s: %d calls, self %.3fms, total %.3fms',
+                            section, r['calls'], r['self'] * 1000, r['total'] * 1000)
+
+
+class JsonSink:
+    # 每次flush追加一行JSON
+    def __init__(self, path):
+        self.path = path
+
+    def emit(self, report: dict):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'time': time.time(), 'sections': report}, ensure_ascii=False))
+            f.write('\n')
+
+
+# ---------------- 开关 ----------------
+
+recorder: Optional[Recorder] = None
+sinks: list = []
+originals: dict = {}
+
+
+def enabled() -> bool:
+    return recorder is not None
+
+
+def enable(*outputs) -> Recorder:
+    global recorder
+    if recorder is not None:
+        sinks.extend(outputs)
+        return recorder
+
+    recorder = Recorder()
+    sinks.extend(outputs)
+    targets = (
+        (Statistic, 'readReactions', 'Excel解析', True),
+        (Statistic, 'makeReaction', '构造反应', True),
+        (Reaction, 'calcHR', 'calcHR', False),
+        (Statistic, 'tally', '计数', False),
+        (Statistic, '__repr__', '报告输出', False),
+        (Statistic, 'saveResult', '写结果文件', False),
+    )
+    for cls, name, section, static in targets:
+        func = cls.__dict__[name]
+        originals[cls, name] = func
+        wrapped = recorder.timed(section, func.__func__ if static else func)
+        setattr(cls, name, staticmethod(wrapped) if static else wrapped)
+    for name, var in Statistic.variables.items():
+        if var.func is not None:
+            originals[var] = var.func
+            var.func = recorder.timed(sectionOf(name), var.func)
+    return recorder
+
+
+def flush() -> Dict[str, dict]:
+    # 把当前累计的结果交给各输出，然后清零
+    if recorder is None:
+        return {}
+    report = recorder.report()
+    for sink in sinks:
+        sink.emit(report)
+    recorder.reset()
+    return report
+
+
+def disable() -> Dict[str, dict]:
+    global recorder
+    if recorder is None:
+        return {}
+    report = flush()
+    for target, func in originals.items():
+        if isinstance(target, tuple):
+            setattr(*target, func)
+        else:
+            target.func = func
+    originals.clear()
+    sinks.clear()
+    recorder = None
+    return report
+
+
+@contextmanager
+def recording(*outputs):
+    r = enable(*outputs)
+    try:
+        yield r
+    finally:
+        disable()
+
+
+@contextmanager
+def section(name: str):
+    # 调用方自己的代码段；未开启时什么都不做
+    if recorder is None:
+        yield
+        return
+    r = recorder
+    start = r.begin()
+    try:
+        yield
+    finally:
+        r.end(name, start)
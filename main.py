@@ -1,7 +1,9 @@
 import time
 from typing import List, Optional
 
-import pandas
+
+def isna(value) -> bool:
+    return value is None or value != value
 
 
 class Ratio:
@@ -38,16 +40,69 @@ class TriRatio:
         return f"{self.left}:{self.middle}:{self.right}"
 
 
-class Part:
-    def __init__(self, part: str):
+class Token:
+    # 不可变的享元：相同代码只创建一个实例，由各子类的registry保存
+    __slots__ = ('key',)
+    registry: dict
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.registry = {}
+
+    def __new__(cls, *key):
+        token = cls.registry.get(key)
+        if token is None:
+            token = object.__new__(cls)
+            object.__setattr__(token, 'key', key)
+            token.build(*key)
+            cls.registry[key] = token
+        return token
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __reduce__(self):
+        return type(self), self.key
+
+    def build(self, *key):
+        raise NotImplementedError
+
+
+class Code(Token):
+    # 带位编码的代码：表中的代码有固定的位，表外的代码按出现顺序依次分配新位
+    __slots__ = ('bit',)
+    bits: dict
+
+    @classmethod
+    def bitOf(cls, code: str) -> int:
+        bit = cls.bits.get(code)
+        if bit is None:
+            bit = cls.bits[code] = 1 << len(cls.bits)
+        return bit
+
+    @classmethod
+    def maskOf(cls, *codes: str) -> int:
+        mask = 0
+        for code in codes:
+            mask |= cls.bitOf(code)
+        return mask
+
+
+class Part(Token):
+    __slots__ = ('category', 'number')
+
+    def build(self, part: str):
         # get all the alphabet part
-        self.category = ''.join([c for c in part if c.isalpha()])
+        object.__setattr__(self, 'category', ''.join([c for c in part if c.isalpha()]))
 
         # get all the numeric part
         if not any(c.isnumeric() for c in part):
-            self.number = 0
+            object.__setattr__(self, 'number', 0)
         else:
-            self.number = int(''.join([c for c in part if c.isnumeric()]))
+            object.__setattr__(self, 'number', int(''.join([c for c in part if c.isnumeric()])))
 
     def __str__(self):
         return f'{self.category}{self.number if self.number else ''}'
@@ -56,9 +111,11 @@ class Part:
         return f'{self.category}{self.number if self.number else ''}'
 
 
-class DQ:
-    def __init__(self, dq: str):
-        self.dq = dq
+class DQ(Token):
+    __slots__ = ('dq',)
+
+    def build(self, dq: str):
+        object.__setattr__(self, 'dq', dq)
 
     def __str__(self):
         return self.dq
@@ -67,9 +124,11 @@ class DQ:
         return self.dq
 
 
-class FQ:
-    def __init__(self, fq: str):
-        self.fq = fq
+class FQ(Token):
+    __slots__ = ('fq',)
+
+    def build(self, fq: str):
+        object.__setattr__(self, 'fq', fq)
 
     def __str__(self):
         return self.fq
@@ -78,14 +137,34 @@ class FQ:
         return self.fq
 
 
-class Determination:
-    def __init__(self, det: str):
+class Determination(Code):
+    __slots__ = ('det', 'motion')
+    bits = {code: 1 << i for i, code in enumerate((
+        'M', 'FM', 'm', 'FC', 'CF', 'C', 'Cn', "FC'", "C'F", "C'", 'FT', 'TF', 'T', 'FV', 'VF', 'V',
+        'FY', 'YF', 'Y', 'Fr', 'rF', 'FD', 'F', '(2)',
+    ))}
+    # 色彩-浓淡混合：代码中含C的，与代码中含C'、Y、T、V的同时出现
+    color = sum([bit for code, bit in bits.items() if 'C' in code])
+    shade = sum([bit for code, bit in bits.items() if "C'" in code or 'Y' in code or 'T' in code or 'V' in code])
+
+    @classmethod
+    def bitOf(cls, code: str) -> int:
+        new = code not in cls.bits
+        bit = super().bitOf(code)
+        if new and 'C' in code:
+            cls.color |= bit
+        if new and ("C'" in code or 'Y' in code or 'T' in code or 'V' in code):
+            cls.shade |= bit
+        return bit
+
+    def build(self, det: str):
         if det[-1] in ('a', 'p'):
-            self.det = det[:-1]
-            self.motion = det[-1]
+            object.__setattr__(self, 'det', det[:-1])
+            object.__setattr__(self, 'motion', det[-1])
         else:
-            self.det = det
-            self.motion = ''
+            object.__setattr__(self, 'det', det)
+            object.__setattr__(self, 'motion', '')
+        object.__setattr__(self, 'bit', Determination.bitOf(self.det))
 
     def __str__(self):
         return f"{self.det}{self.motion}"
@@ -100,9 +179,16 @@ class Determination:
         return self.motion == 'p'
 
 
-class Content:
-    def __init__(self, cont: str):
-        self.cont = cont
+class Content(Code):
+    __slots__ = ('cont',)
+    bits = {code: 1 << i for i, code in enumerate((
+        'H', '(H)', 'Hd', '(Hd)', 'Hx', 'A', '(A)', 'Ad', '(Ad)', 'An', 'Art', 'Ay', 'Bl', 'Bt', 'Cg', 'Cl', 'Ex',
+        'Fd', 'Fi', 'Ge', 'Hh', 'Ls', 'Na', 'Sc', 'Sx', 'Xy', 'Id',
+    ))}
+
+    def build(self, cont: str):
+        object.__setattr__(self, 'cont', cont)
+        object.__setattr__(self, 'bit', Content.bitOf(cont))
 
     def __str__(self):
         return self.cont
@@ -111,7 +197,9 @@ class Content:
         return self.cont
 
 
-class Z:
+class Z(Token):
+    __slots__ = ('z', 'card', 'score')
+
     score_table = {
         1: {"W": 1.0, "A": 4.0, "D": 6.0, "S": 3.5},
         2: {"W": 4.5, "A": 3.0, "D": 5.5, "S": 4.5},
@@ -125,10 +213,10 @@ class Z:
         10: {"W": 5.5, "A": 4.0, "D": 4.5, "S": 6.0},
     }
 
-    def __init__(self, z: str, card: int):
-        self.z = z
-        self.card = card
-        self.score = Z.score_table[card][z]
+    def build(self, z: str, card: int):
+        object.__setattr__(self, 'score', Z.score_table[card][z])
+        object.__setattr__(self, 'z', z)
+        object.__setattr__(self, 'card', card)
 
     def __str__(self):
         return f'Z{self.z}({self.score})'
@@ -137,9 +225,16 @@ class Z:
         return f'Z{self.z}({self.score})'
 
 
-class Spec:
-    def __init__(self, spec: str):
-        self.spec = spec
+class Spec(Code):
+    __slots__ = ('spec',)
+    bits = {code: 1 << i for i, code in enumerate((
+        'DV', 'DV2', 'INC', 'INC2', 'DR', 'DR2', 'FAB', 'FAB2', 'ALOG', 'CON', 'CONT', 'AB', 'AG', 'COP', 'CP',
+        'GHR', 'PHR', 'MOR', 'PER', 'PSV',
+    ))}
+
+    def build(self, spec: str):
+        object.__setattr__(self, 'spec', spec)
+        object.__setattr__(self, 'bit', Spec.bitOf(spec))
 
     def __str__(self):
         return self.spec
@@ -149,6 +244,56 @@ class Spec:
 
 
 class Reaction:
+    spec6 = ('DV', 'DV2', 'INC', 'INC2', 'DR', 'DR2', 'FAB', 'FAB2', 'ALOG', 'CON')
+    spec2 = ('DV2', 'INC2', 'DR2', 'FAB2')
+    spec6_score = {
+        'DV': 1,
+        'DV2': 2,
+        'INC': 2,
+        'INC2': 4,
+        'DR': 3,
+        'DR2': 6,
+        'FAB': 4,
+        'FAB2': 7,
+        'ALOG': 5,
+        'CONT': 7
+    }
+    spec6_mask = Spec.maskOf(*spec6)
+    # calcHR中用到的代码组合
+    human_mask = Content.maskOf('H', 'Hd', '(H)', '(Hd)', 'Hx', 'M')
+    phr_mask = Spec.maskOf('DV2', 'INC2', 'DR2', 'FAB2', 'ALOG', 'CON')
+
+    # GHR/PHR判定表：按顺序取第一条所有条件都满足的规则，结果为None的不是人类表征反应
+    #   cont_any/spec_any    含其中任一代码        cont_none/spec_none  不含其中任何代码
+    #   pure_cont            只有一个内容且为该代码  spec6                spec6部分的代码组合为其中之一
+    #   fq、card             取值为其中之一          p                    是否为P反应
+    # table.ReactionTable.classifyHR按同一张表对整列求值
+    hr_rules = (
+        (None, {'cont_none': human_mask | Content.maskOf('FM')}),
+        (None, {'cont_none': human_mask, 'spec_none': Spec.maskOf('COP', 'AG')}),
+        ('GHR', {'pure_cont': Content.maskOf('H'), 'fq': ('+', 'o', 'u'), 'spec6': (0, Spec.maskOf('DV')),
+                 'spec_none': Spec.maskOf('COP', 'AG')}),
+        ('PHR', {'fq': ('-', 'none')}),
+        ('PHR', {'spec_any': phr_mask}),
+        ('GHR', {'spec_any': Spec.maskOf('COP'), 'spec_none': Spec.maskOf('AG')}),
+        ('PHR', {'spec_any': Spec.maskOf('FAB', 'MOR')}),
+        ('PHR', {'cont_any': Content.maskOf('An')}),
+        ('GHR', {'card': (3, 4, 7, 9), 'p': True}),
+        ('PHR', {'spec_any': Spec.maskOf('AG', 'INC', 'DR')}),
+        ('PHR', {'cont_any': Content.maskOf('Hd')}),
+        ('GHR', {}),
+    )
+    # 第一条规则：大多数反应不含这些内容，直接判定，不必查表
+    hr_skip_mask = hr_rules[0][1]['cont_none']
+    # 判定只取决于以下几位与FQ、卡片、P、内容数是否为1，按此缓存每种组合的结果
+    hr_cont_mask = human_mask | Content.maskOf('FM', 'H', 'An', 'Hd')
+    hr_spec_mask = spec6_mask | Spec.maskOf('COP', 'AG', 'FAB', 'MOR', 'INC', 'DR')
+    hr_cache = {}
+    hr_cache_size = 1 << 16
+
+    __slots__ = ('card', 'desc', 'pt', 'dq', 'fq', 'det', 'cont', 'p', 'z', 'spec', 'det_mask', 'cont_mask',
+                 'spec_mask', 'ndet')
+
     def __init__(
             self,
             card: int,
@@ -160,7 +305,8 @@ class Reaction:
             cont: List[Content],
             p: bool,
             z: Optional[Z],
-            spec: List[Spec]
+            spec: List[Spec],
+            hr: bool = True
     ):
         self.card = card
         self.desc = desc
@@ -173,7 +319,23 @@ class Reaction:
         self.z = z
         self.spec = spec
 
-        self.calcHR()
+        # ndet为(2)以外的决定因子个数，重复的代码（如F.F）也分别计数
+        self.det_mask = 0
+        self.ndet = 0
+        for d in det:
+            self.det_mask |= d.bit
+            if d.det != '(2)':
+                self.ndet += 1
+        self.cont_mask = 0
+        for c in cont:
+            self.cont_mask |= c.bit
+        self.spec_mask = 0
+        for s in spec:
+            self.spec_mask |= s.bit
+
+        # 从缓存等处还原时spec已包含GHR/PHR，不再重复计算
+        if hr:
+            self.calcHR()
 
     def __repr__(self):
         return \
@@ -188,37 +350,60 @@ class Reaction:
 """
 
     def calcHR(self):
-        if not (self.contContains('H') or
-                self.contContains('Hd') or
-                self.contContains('(H)') or
-                self.contContains('(Hd)') or
-                self.contContains('Hx') or
-                self.contContains('M') or
-                self.contContains('FM') and
-                (self.specContains('COP') or self.specContains('AG'))):
+        if not self.cont_mask & Reaction.hr_skip_mask:
             return
-
-        if self.contIs('H') and self.fq.fq in ('+', 'o', 'u') and (self.simpSpec6() in ([], ['DV'])) \
-                and not (self.specContains('COP') or self.specContains('AG')):
-            return self.spec.append(Spec('GHR'))
-
-        if self.fq.fq in ('-', 'none') or \
-                [s.spec for s in self.spec if s.spec in ['DV2', 'INC2', 'DR2', 'FAB2', 'ALOG', 'CON']]:
-            return self.spec.append(Spec('PHR'))
-
-        if self.specContains('COP') and not self.specContains('AG'):
-            return self.spec.append(Spec('GHR'))
-
-        if self.specContains('FAB') or self.specContains('MOR') or self.contContains('An'):
-            return self.spec.append(Spec('PHR'))
-
-        if self.card in (3, 4, 7, 9) and self.p:
-            return self.spec.append(Spec('GHR'))
-
-        if self.specContains('AG') or self.specContains('INC') or self.specContains('DR') or self.contContains('Hd'):
-            return self.spec.append(Spec('PHR'))
-
-        self.spec.append(Spec('GHR'))
+        hr = Reaction.classifyHR(self.card, self.fq.fq, self.p, len(self.cont), self.cont_mask, self.spec_mask)
+        if hr is not None:
+            self.addSpec(hr)
+
+    @staticmethod
+    def classifyHR(card: int, fq: str, p: bool, ncont: int, cont_mask: int, spec_mask: int) -> Optional[str]:
+        if not cont_mask & Reaction.hr_skip_mask:
+            return None
+        key = (card, fq, p, ncont == 1, cont_mask & Reaction.hr_cont_mask, spec_mask & Reaction.hr_spec_mask)
+        try:
+            return Reaction.hr_cache[key]
+        except KeyError:
+            pass
+
+        for hr, rule in Reaction.hr_rules:
+            if Reaction.matchesHR(rule, card, fq, p, ncont, cont_mask, spec_mask):
+                break
+        if len(Reaction.hr_cache) < Reaction.hr_cache_size:
+            Reaction.hr_cache[key] = hr
+        return hr
+
+    @staticmethod
+    def matchesHR(rule: dict, card: int, fq: str, p: bool, ncont: int, cont_mask: int, spec_mask: int) -> bool:
+        for condition, value in rule.items():
+            if condition == 'cont_any':
+                ok = cont_mask & value != 0
+            elif condition == 'cont_none':
+                ok = cont_mask & value == 0
+            elif condition == 'spec_any':
+                ok = spec_mask & value != 0
+            elif condition == 'spec_none':
+                ok = spec_mask & value == 0
+            elif condition == 'pure_cont':
+                ok = ncont == 1 and cont_mask & value != 0
+            elif condition == 'spec6':
+                ok = spec_mask & Reaction.spec6_mask in value
+            elif condition == 'fq':
+                ok = fq in value
+            elif condition == 'card':
+                ok = card in value
+            elif condition == 'p':
+                ok = bool(p) == value
+            else:
+                raise ValueError(f'unknown GHR/PHR condition: {condition}')
+            if not ok:
+                return False
+        return True
+
+    def addSpec(self, spec: str):
+        s = Spec(spec)
+        self.spec.append(s)
+        self.spec_mask |= s.bit
 
     def partIs(self, part: str):
         return self.pt.category == part
@@ -233,59 +418,43 @@ class Reaction:
         return self.fq.fq == fq
 
     def isBlend(self):
-        return len([d for d in self.det if d.det != "(2)"]) >= 2
+        return self.ndet >= 2
 
     def isColorShadeBlend(self):
-        s = ''.join(self.simpDet())
-        return 'C' in s and ("C'" in s or 'Y' in s or 'T' in s or 'V' in s)
+        return bool(self.det_mask & Determination.color and self.det_mask & Determination.shade)
 
     def simpDet(self) -> list:
         return [d.det for d in self.det]
 
     def detIs(self, det: str):
-        return det in self.simpDet() and not self.isBlend()
+        return self.detContains(det) and not self.isBlend()
 
     def detContains(self, det: str):
-        return det in self.simpDet()
+        return bool(self.det_mask & Determination.bits.get(det, 0))
 
     def simpCont(self) -> list:
         return [c.cont for c in self.cont]
 
     def contIs(self, cont: str):
-        return cont in self.simpCont() and len(self.cont) == 1
+        return self.contContains(cont) and len(self.cont) == 1
 
     def contContains(self, cont: str):
-        return cont in self.simpCont()
+        return bool(self.cont_mask & Content.bits.get(cont, 0))
 
     def simpSpec(self) -> list:
         return [s.spec for s in self.spec]
 
     def specContains(self, spec: str):
-        return spec in self.simpSpec()
+        return bool(self.spec_mask & Spec.bits.get(spec, 0))
 
     def simpSpec6(self) -> list:
-        return [s.spec for s in self.spec if s.spec in
-                ['DV', 'DV2', 'INC', 'INC2', 'DR', 'DR2', 'FAB', 'FAB2', 'ALOG', 'CON']
-                ]
+        return [s.spec for s in self.spec if s.spec in Reaction.spec6]
 
     def WSum6(self) -> int:
-        score = {
-            'DV': 1,
-            'DV2': 2,
-            'INC': 2,
-            'INC2': 4,
-            'DR': 3,
-            'DR2': 6,
-            'FAB': 4,
-            'FAB2': 7,
-            'ALOG': 5,
-            'CONT': 7
-        }
-
-        return sum([score[s] for s in self.simpSpec6()])
+        return sum([Reaction.spec6_score[s] for s in self.simpSpec6()])
 
     def spec2Count(self):
-        return sum([1 for s in self.spec if s.spec in ['DV2', 'INC2', 'DR2', 'FAB2']])
+        return sum([1 for s in self.spec if s.spec in Reaction.spec2])
 
     def activeCount(self):
         return sum([1 for d in self.det if d.active()])
@@ -300,6 +469,44 @@ class Reaction:
         return sum([1 for d in self.det if d.passive() and d.det == 'M'])
 
 
+class Variable:
+    # 结构概要变量：声明依赖，首次访问时计算并缓存在实例上
+    def __init__(self, func, deps: tuple):
+        self.func = func
+        self.deps = deps
+        self.name = func.__name__ if func else None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        owner.variables[name] = self
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = instance.__dict__[self.name] = self.func(instance)
+        return value
+
+
+class Tallied(Variable):
+    # 由Statistic.tally一次遍历同时算出的计数器
+    def __init__(self, name: str):
+        super().__init__(None, ('reactions',))
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        instance.tally()
+        return instance.__dict__[self.name]
+
+
+def variable(*deps: str):
+    def decorator(func):
+        return Variable(func, deps)
+
+    return decorator
+
+
 class Statistic:
     ZEst_table = {
         0: 0.0,
@@ -355,301 +562,612 @@ class Statistic:
         50: 173.0,
     }
 
-    def __init__(self, path):
-        self.path = path
-        self.name = path.split('/')[-1].split('.')[0]
-        self.reactions = self.readReactions(path)
-
+    # 一次遍历中累加的计数器，每个名称对应counts中的一个槽位，遍历结束后写回同名属性
+    counters = (
         # 部位特征
-        self.Zf = sum([1 for r in self.reactions if r.z])
-        self.ZSum = sum([r.z.score for r in self.reactions if r.z])
-        self.ZEst = Statistic.ZEst_table[self.Zf]
-
-        self.W = sum([1 for r in self.reactions if r.partIs('W') or r.partIs('WS')])
-        self.D = sum([1 for r in self.reactions if r.partIs('D') or r.partIs('DS')])
-        self.W_D = self.W + self.D
-        self.Dd = sum([1 for r in self.reactions if r.partIs('Dd') or r.partIs('DdS')])
-        self.S = sum([1 for r in self.reactions if r.partContains('S')])
-
-        self.DQplus = sum([1 for r in self.reactions if r.DQis('+')])
-        self.DQo = sum([1 for r in self.reactions if r.DQis('o')])
-        self.DQvplus = sum([1 for r in self.reactions if r.DQis('v+')])
-        self.DQv = sum([1 for r in self.reactions if r.DQis('v')])
-
+        'Zf', 'ZSum', 'W', 'D', 'Dd', 'S',
+        'DQplus', 'DQo', 'DQvplus', 'DQv',
         # 决定因子
-        self.blends = [r.det for r in self.reactions if r.isBlend()]
-
-        self.M = sum([1 for r in self.reactions if r.detContains('M')])
-        self.FM = sum([1 for r in self.reactions if r.detContains('FM')])
-        self.m = sum([1 for r in self.reactions if r.detContains('m')])
-        self.FC = sum([1 for r in self.reactions if r.detContains('FC')])
-        self.CF = sum([1 for r in self.reactions if r.detContains('CF')])
-        self.C = sum([1 for r in self.reactions if r.detContains('C')])
-        self.Cn = sum([1 for r in self.reactions if r.detContains('Cn')])
-        self.FCp = sum([1 for r in self.reactions if r.detContains("FC'")])
-        self.CpF = sum([1 for r in self.reactions if r.detContains("C'F")])
-        self.Cp = sum([1 for r in self.reactions if r.detContains("C'")])
-        self.FT = sum([1 for r in self.reactions if r.detContains('FT')])
-        self.TF = sum([1 for r in self.reactions if r.detContains('TF')])
-        self.T = sum([1 for r in self.reactions if r.detContains('T')])
-        self.FV = sum([1 for r in self.reactions if r.detContains('FV')])
-        self.VF = sum([1 for r in self.reactions if r.detContains('VF')])
-        self.V = sum([1 for r in self.reactions if r.detContains('V')])
-        self.FY = sum([1 for r in self.reactions if r.detContains('FY')])
-        self.YF = sum([1 for r in self.reactions if r.detContains('YF')])
-        self.Y = sum([1 for r in self.reactions if r.detContains('Y')])
-        self.Fr = sum([1 for r in self.reactions if r.detContains('Fr')])
-        self.rF = sum([1 for r in self.reactions if r.detContains('rF')])
-        self.FD = sum([1 for r in self.reactions if r.detContains('FD')])
-        self.F = sum([1 for r in self.reactions if r.detContains('F')])
-        self.pair = sum([1 for r in self.reactions if r.detContains('(2)')])
-
-        self.PureM = sum([1 for r in self.reactions if r.detIs('M')])
-        self.PureFM = sum([1 for r in self.reactions if r.detIs('FM')])
-        self.Purem = sum([1 for r in self.reactions if r.detIs('m')])
-        self.PureFC = sum([1 for r in self.reactions if r.detIs('FC')])
-        self.PureCF = sum([1 for r in self.reactions if r.detIs('CF')])
-        self.PureC = sum([1 for r in self.reactions if r.detIs('C')])
-        self.PureCn = sum([1 for r in self.reactions if r.detIs('Cn')])
-        self.PureFCp = sum([1 for r in self.reactions if r.detIs("FC'")])
-        self.PureCpF = sum([1 for r in self.reactions if r.detIs("C'F")])
-        self.PureCp = sum([1 for r in self.reactions if r.detIs("C'")])
-        self.PureFT = sum([1 for r in self.reactions if r.detIs('FT')])
-        self.PureTF = sum([1 for r in self.reactions if r.detIs('TF')])
-        self.PureT = sum([1 for r in self.reactions if r.detIs('T')])
-        self.PureFV = sum([1 for r in self.reactions if r.detIs('FV')])
-        self.PureVF = sum([1 for r in self.reactions if r.detIs('VF')])
-        self.PureV = sum([1 for r in self.reactions if r.detIs('V')])
-        self.PureFY = sum([1 for r in self.reactions if r.detIs('FY')])
-        self.PureYF = sum([1 for r in self.reactions if r.detIs('YF')])
-        self.PureY = sum([1 for r in self.reactions if r.detIs('Y')])
-        self.PureFr = sum([1 for r in self.reactions if r.detIs('Fr')])
-        self.PurerF = sum([1 for r in self.reactions if r.detIs('rF')])
-        self.PureFD = sum([1 for r in self.reactions if r.detIs('FD')])
-        self.PureF = sum([1 for r in self.reactions if r.detIs('F')])
-
+        'M', 'FM', 'm', 'FC', 'CF', 'C', 'Cn', 'FCp', 'CpF', 'Cp', 'FT', 'TF', 'T', 'FV', 'VF', 'V',
+        'FY', 'YF', 'Y', 'Fr', 'rF', 'FD', 'F', 'pair',
+        'PureM', 'PureFM', 'Purem', 'PureFC', 'PureCF', 'PureC', 'PureCn', 'PureFCp', 'PureCpF', 'PureCp',
+        'PureFT', 'PureTF', 'PureT', 'PureFV', 'PureVF', 'PureV', 'PureFY', 'PureYF', 'PureY', 'PureFr',
+        'PurerF', 'PureFD', 'PureF',
+        'active', 'passive', 'Mactive', 'Mpassive', 'ColorShade',
         # 形状质量
-        self.FQplus = sum([1 for r in self.reactions if r.FQis('+')])
-        self.FQo = sum([1 for r in self.reactions if r.FQis('o')])
-        self.FQu = sum([1 for r in self.reactions if r.FQis('u')])
-        self.FQminus = sum([1 for r in self.reactions if r.FQis('-')])
-        self.FQnone = sum([1 for r in self.reactions if r.FQis('none')])
-
-        self.MQualplus = sum([1 for r in self.reactions if r.detContains('M') and r.FQis('+')])
-        self.MQualo = sum([1 for r in self.reactions if r.detContains('M') and r.FQis('o')])
-        self.MQualu = sum([1 for r in self.reactions if r.detContains('M') and r.FQis('u')])
-        self.MQualminus = sum([1 for r in self.reactions if r.detContains('M') and r.FQis('-')])
-        self.MQualnone = sum([1 for r in self.reactions if r.detContains('M') and r.FQis('none')])
-
-        self.W_Dplus = sum([1 for r in self.reactions if (r.partIs('W') or r.partIs('D')) and r.FQis('+')])
-        self.W_Do = sum([1 for r in self.reactions if (r.partIs('W') or r.partIs('D')) and r.FQis('o')])
-        self.W_Du = sum([1 for r in self.reactions if (r.partIs('W') or r.partIs('D')) and r.FQis('u')])
-        self.W_Dminus = sum([1 for r in self.reactions if (r.partIs('W') or r.partIs('D')) and r.FQis('-')])
-        self.W_Dnone = sum([1 for r in self.reactions if (r.partIs('W') or r.partIs('D')) and r.FQis('none')])
-
+        'FQplus', 'FQo', 'FQu', 'FQminus', 'FQnone',
+        'MQualplus', 'MQualo', 'MQualu', 'MQualminus', 'MQualnone',
+        'W_Dplus', 'W_Do', 'W_Du', 'W_Dminus', 'W_Dnone',
+        'Sminus',
         # 内容
-
-        self.H = sum([1 for r in self.reactions if r.contContains('H')])
-        self.h = sum([1 for r in self.reactions if r.contContains('(H)')])
-        self.Hd = sum([1 for r in self.reactions if r.contContains('Hd')])
-        self.hd = sum([1 for r in self.reactions if r.contContains('(Hd)')])
-        self.Hx = sum([1 for r in self.reactions if r.contContains('Hx')])
-        self.A = sum([1 for r in self.reactions if r.contContains('A')])
-        self.a = sum([1 for r in self.reactions if r.contContains('(A)')])
-        self.Ad = sum([1 for r in self.reactions if r.contContains('Ad')])
-        self.ad = sum([1 for r in self.reactions if r.contContains('(Ad)')])
-        self.An = sum([1 for r in self.reactions if r.contContains('An')])
-        self.Art = sum([1 for r in self.reactions if r.contContains('Art')])
-        self.Ay = sum([1 for r in self.reactions if r.contContains('Ay')])
-        self.Bl = sum([1 for r in self.reactions if r.contContains('Bl')])
-        self.Bt = sum([1 for r in self.reactions if r.contContains('Bt')])
-        self.Cg = sum([1 for r in self.reactions if r.contContains('Cg')])
-        self.Cl = sum([1 for r in self.reactions if r.contContains('Cl')])
-        self.Ex = sum([1 for r in self.reactions if r.contContains('Ex')])
-        self.Fd = sum([1 for r in self.reactions if r.contContains('Fd')])
-        self.Fi = sum([1 for r in self.reactions if r.contContains('Fi')])
-        self.Ge = sum([1 for r in self.reactions if r.contContains('Ge')])
-        self.Hh = sum([1 for r in self.reactions if r.contContains('Hh')])
-        self.Ls = sum([1 for r in self.reactions if r.contContains('Ls')])
-        self.Na = sum([1 for r in self.reactions if r.contContains('Na')])
-        self.Sc = sum([1 for r in self.reactions if r.contContains('Sc')])
-        self.Sx = sum([1 for r in self.reactions if r.contContains('Sx')])
-        self.Xy = sum([1 for r in self.reactions if r.contContains('Xy')])
-        self.Id = sum([1 for r in self.reactions if r.contContains('Id')])
-
-        #  部位序列
-
-        self.part_seq = {
-            1: [r.pt.category for r in self.reactions if r.card == 1],
-            2: [r.pt.category for r in self.reactions if r.card == 2],
-            3: [r.pt.category for r in self.reactions if r.card == 3],
-            4: [r.pt.category for r in self.reactions if r.card == 4],
-            5: [r.pt.category for r in self.reactions if r.card == 5],
-            6: [r.pt.category for r in self.reactions if r.card == 6],
-            7: [r.pt.category for r in self.reactions if r.card == 7],
-            8: [r.pt.category for r in self.reactions if r.card == 8],
-            9: [r.pt.category for r in self.reactions if r.card == 9],
-            10: [r.pt.category for r in self.reactions if r.card == 10],
-        }
-
+        'H', 'h', 'Hd', 'hd', 'Hx', 'A', 'a', 'Ad', 'ad', 'An', 'Art', 'Ay', 'Bl', 'Bt', 'Cg', 'Cl', 'Ex',
+        'Fd', 'Fi', 'Ge', 'Hh', 'Ls', 'Na', 'Sc', 'Sx', 'Xy', 'Id',
+        'PureH', 'R8_10', 'P',
         # 特殊分数
-        self.DV = sum([1 for r in self.reactions if r.specContains('DV')])
-        self.DV2 = sum([1 for r in self.reactions if r.specContains('DV2')])
-        self.INC = sum([1 for r in self.reactions if r.specContains('INC')])
-        self.INC2 = sum([1 for r in self.reactions if r.specContains('INC2')])
-        self.DR = sum([1 for r in self.reactions if r.specContains('DR')])
-        self.DR2 = sum([1 for r in self.reactions if r.specContains('DR2')])
-        self.FAB = sum([1 for r in self.reactions if r.specContains('FAB')])
-        self.FAB2 = sum([1 for r in self.reactions if r.specContains('FAB2')])
-        self.ALOG = sum([1 for r in self.reactions if r.specContains('ALOG')])
-        self.CON = sum([1 for r in self.reactions if r.specContains('CONT')])
-        self.AB = sum([1 for r in self.reactions if r.specContains('AB')])
-        self.AG = sum([1 for r in self.reactions if r.specContains('AG')])
-        self.COP = sum([1 for r in self.reactions if r.specContains('COP')])
-        self.CP = sum([1 for r in self.reactions if r.specContains('CP')])
-        self.GHR = sum([1 for r in self.reactions if r.specContains('GHR')])
-        self.PHR = sum([1 for r in self.reactions if r.specContains('PHR')])
-        self.MOR = sum([1 for r in self.reactions if r.specContains('MOR')])
-        self.PER = sum([1 for r in self.reactions if r.specContains('PER')])
-        self.PSV = sum([1 for r in self.reactions if r.specContains('PSV')])
-
-        self.Sum6 = sum([len(r.simpSpec6()) for r in self.reactions])
-        self.WSum6 = sum([r.WSum6() for r in self.reactions])
-
-        # ----------------下半部分-----------------
-
-        # 核心部分
-        self.SumCp = self.Cp + self.CpF + self.FCp
-        self.SumT = self.T + self.TF + self.FT
-        self.SumV = self.V + self.VF + self.FV
-        self.SumY = self.Y + self.YF + self.FY
-
-        self.R = len(self.reactions)
-        self.L = self.PureF / (self.R - self.PureF)
-
-        self.WSumC = 0.5 * self.FC + 1.0 * self.CF + 1.5 * self.C
-        self.EB = Ratio(self.M, self.WSumC)
-        self.EA = self.M + self.WSumC
-        # self.RBPer = self.EB.abs_value()  # TODO: check this
-        self.eb = Ratio(self.FM + self.m, self.SumCp + self.SumT + self.SumV + self.SumY)
-        self.es = self.FM + self.m + self.SumCp + self.SumT + self.SumV + self.SumY
-        self.Dscore = self.DConvert(self.EA - self.es)
-        self.Adjes = self.FM + min(self.m, 1) + self.SumCp + self.SumT + self.SumV + min(self.SumY, 1)
-        self.AdjD = self.DConvert(self.EA - self.Adjes)
-
-        # 思维部分
-        self.P = sum([1 for r in self.reactions if r.p])
-        self.Lv2 = sum([r.spec2Count() for r in self.reactions])
-        self.APR = Ratio(
-            sum([r.activeCount() for r in self.reactions]), sum([r.passiveCount() for r in self.reactions]))
-        self.MAPR = Ratio(
-            sum([r.MActiveCount() for r in self.reactions]), sum([r.MPassiveCount() for r in self.reactions]))
-        self.Intel = 2 * self.AB + self.Art + self.Ay
-
-        # 情绪部分
-        self.FCR = Ratio(self.FC, self.CF + self.C)
-        self.CpCR = Ratio(self.SumCp, self.WSumC)
-        self.Afr = (sum([1 for r in self.reactions if r.card in (8, 9, 10)]) /
-                    (self.R - sum([1 for r in self.reactions if r.card in (8, 9, 10)])))
-        self.ComR = Ratio(len(self.blends), self.R)
-
-        # 调节部分
-        self.Sminus = sum([1 for r in self.reactions if r.FQis('-') and r.partContains('S')])
-        self.XA = sum([1 for r in self.reactions if r.fq.fq in ('+', 'o', 'u')]) / self.R
-        self.WDA = sum(
-            [1 for r in self.reactions if r.pt.category in ('W', 'D') and r.fq.fq in ('+', 'o', 'u')]) / self.R
-        self.Xminus = sum([1 for r in self.reactions if r.fq.fq == '-']) / self.R
-        self.Xplus = sum([1 for r in self.reactions if r.fq.fq in ('+', 'o')]) / self.R
-        self.Xu = sum([1 for r in self.reactions if r.fq.fq == 'u']) / self.R
-
-        # 加工部分
-        self.EcoI = TriRatio(self.W, self.D, self.Dd)
-        self.AspR = Ratio(self.W, self.M)
-        self.Zd = self.ZSum - self.ZEst
-
-        # 人际交往部分
-        self.GHR_PHR = Ratio(self.GHR, self.PHR)
-        self.HCont = self.H + self.h + self.Hd + self.hd
-        self.PureH = sum([1 for r in self.reactions if r.contIs('H')])
-        self.IsoI = (self.Bt + 2 * self.Cl + self.Ge + self.Ls + 2 * self.Na) / self.R
-
-        # 自我知觉部分
-        self.Fr_rF = self.Fr + self.rF
-        self.An_Xy = self.An + self.Xy
-        self.H_hd = Ratio(self.H, self.h + self.Hd + self.hd)
-        self.EgoI = (3 * self.Fr_rF + self.pair) / self.R
-
-        # 特殊指数
-        # 自杀指数
-        self.SCON1 = self.FV + self.VF + self.V + self.FD > 2
-        self.SCON2 = sum([1 for r in self.reactions if r.isColorShadeBlend()]) > 0
-        self.SCON3 = self.EgoI < 0.31 or self.EgoI > 0.44
-        self.SCON4 = self.MOR > 3
-        self.SCON5 = self.Zd > 3.5 or self.Zd < -3.5
-        self.SCON6 = self.es > self.EA
-        self.SCON7 = self.CF + self.C > self.FC
-        self.SCON8 = self.Xplus < 0.7
-        self.SCON9 = self.S > 3
-        self.SCON10 = self.P < 3 or self.P > 8
-        self.SCON11 = self.H < 2
-        self.SCON12 = self.R < 17
-
-        self.SCON = [self.SCON1, self.SCON2, self.SCON3, self.SCON4, self.SCON5, self.SCON6, self.SCON7, self.SCON8,
-                     self.SCON9,
-                     self.SCON10, self.SCON11, self.SCON12]
-
-        # 知觉思维指数
-        self.PTI1 = self.XA < 0.7 and self.WDA < 0.75
-        self.PTI2 = self.Xminus > 0.29
-        self.PTI3 = self.Lv2 > 2 and self.FAB2 > 0
-        self.PTI4 = self.R < 17 and self.WSum6 > 12 or self.R > 16 and self.WSum6 > 17
-        self.PTI5 = self.MQualminus > 1 or self.Xminus > 0.4
-
-        self.PTI = [self.PTI1, self.PTI2, self.PTI3, self.PTI4, self.PTI5]
-
-        # 抑郁指数
-        self.DEPI1 = self.SumV > 0 or self.FD > 2
-        self.DEPI2 = sum([1 for r in self.reactions if r.isColorShadeBlend()]) > 0 or self.S > 2
-        self.DEPI3 = self.EgoI > 0.44 and self.Fr_rF == 0 or self.EgoI < 0.33
-        self.DEPI4 = self.Afr < 0.46 or len(self.blends) < 4
-        self.DEPI5 = self.SumCp + self.SumT + self.SumV + self.SumY > self.FM + self.m or self.SumCp > 2
-        self.DEPI6 = self.MOR > 2 or self.Intel > 3
-        self.DEPI7 = self.COP < 2 or self.IsoI > 0.24
-
-        self.DEPI = [self.DEPI1, self.DEPI2, self.DEPI3, self.DEPI4, self.DEPI5, self.DEPI6, self.DEPI7]
-
-        # 应对缺陷指数
-        self.CDI1 = self.EA < 6 or self.AdjD < 0
-        self.CDI2 = self.COP < 2 or self.AG < 2
-        self.CDI3 = self.WSumC < 2.5 or self.Afr < 0.46
-        self.CDI4 = self.P > sum([r.activeCount() for r in self.reactions]) + 1 or self.H < 2
-        self.CDI5 = self.SumT > 1 or self.IsoI > 0.24 or self.Fd > 0
-
-        self.CDI = [self.CDI1, self.CDI2, self.CDI3, self.CDI4, self.CDI5]
-
-        # 高警觉指数
-        self.HVI1 = self.SumT == 0
-        self.HVI2 = self.Zf > 12
-        self.HVI3 = self.Zd > 3.5
-        self.HVI4 = self.S > 3
-        self.HVI5 = self.HCont > 6
-        self.HVI6 = self.h + self.a + self.hd + self.ad > 3
-        self.HVI7 = (self.H + self.A) < 4 * (self.Hd + self.Ad)
-        self.HVI8 = self.Cg > 3
-
-        self.HVI = self.HVI1 and sum([self.HVI2, self.HVI3, self.HVI4, self.HVI5, self.HVI6, self.HVI7, self.HVI8]) >= 4
-
-        # 强迫指数
-        self.OBS1 = self.Dd > 3
-        self.OBS2 = self.Zf > 12
-        self.OBS3 = self.Zd > 3
-        self.OBS4 = self.P > 7
-        self.OBS5 = self.FQplus > 1
-
-        self.OBS = sum([self.OBS1, self.OBS2, self.OBS3, self.OBS4, self.OBS5]) == 5 or \
-                   sum([self.OBS1, self.OBS2, self.OBS3, self.OBS4, self.OBS5]) >= 2 and self.FQplus > 3 or \
-                   sum([self.OBS1, self.OBS2, self.OBS3, self.OBS4, self.OBS5]) >= 3 and self.Xplus > 0.89 or \
-                   self.FQplus > 3 and self.Xplus > 0.89
+        'DV', 'DV2', 'INC', 'INC2', 'DR', 'DR2', 'FAB', 'FAB2', 'ALOG', 'CON', 'AB', 'AG', 'COP', 'CP',
+        'GHR', 'PHR', 'MOR', 'PER', 'PSV',
+        'Sum6', 'WSum6', 'Lv2',
+    )
+    slot = {name: i for i, name in enumerate(counters)}
+
+    # 代码 -> 槽位
+    dq_slot = {'+': slot['DQplus'], 'o': slot['DQo'], 'v+': slot['DQvplus'], 'v': slot['DQv']}
+    fq_slot = {'+': slot['FQplus'], 'o': slot['FQo'], 'u': slot['FQu'], '-': slot['FQminus'],
+               'none': slot['FQnone']}
+    mqual_slot = {'+': slot['MQualplus'], 'o': slot['MQualo'], 'u': slot['MQualu'], '-': slot['MQualminus'],
+                  'none': slot['MQualnone']}
+    wd_slot = {'+': slot['W_Dplus'], 'o': slot['W_Do'], 'u': slot['W_Du'], '-': slot['W_Dminus'],
+               'none': slot['W_Dnone']}
+    det_slot = {
+        'M': slot['M'], 'FM': slot['FM'], 'm': slot['m'], 'FC': slot['FC'], 'CF': slot['CF'], 'C': slot['C'],
+        'Cn': slot['Cn'], "FC'": slot['FCp'], "C'F": slot['CpF'], "C'": slot['Cp'], 'FT': slot['FT'],
+        'TF': slot['TF'], 'T': slot['T'], 'FV': slot['FV'], 'VF': slot['VF'], 'V': slot['V'], 'FY': slot['FY'],
+        'YF': slot['YF'], 'Y': slot['Y'], 'Fr': slot['Fr'], 'rF': slot['rF'], 'FD': slot['FD'], 'F': slot['F'],
+        '(2)': slot['pair'],
+    }
+    pure_slot = {
+        'M': slot['PureM'], 'FM': slot['PureFM'], 'm': slot['Purem'], 'FC': slot['PureFC'], 'CF': slot['PureCF'],
+        'C': slot['PureC'], 'Cn': slot['PureCn'], "FC'": slot['PureFCp'], "C'F": slot['PureCpF'],
+        "C'": slot['PureCp'], 'FT': slot['PureFT'], 'TF': slot['PureTF'], 'T': slot['PureT'],
+        'FV': slot['PureFV'], 'VF': slot['PureVF'], 'V': slot['PureV'], 'FY': slot['PureFY'],
+        'YF': slot['PureYF'], 'Y': slot['PureY'], 'Fr': slot['PureFr'], 'rF': slot['PurerF'],
+        'FD': slot['PureFD'], 'F': slot['PureF'],
+    }
+    cont_slot = {
+        'H': slot['H'], '(H)': slot['h'], 'Hd': slot['Hd'], '(Hd)': slot['hd'], 'Hx': slot['Hx'], 'A': slot['A'],
+        '(A)': slot['a'], 'Ad': slot['Ad'], '(Ad)': slot['ad'], 'An': slot['An'], 'Art': slot['Art'],
+        'Ay': slot['Ay'], 'Bl': slot['Bl'], 'Bt': slot['Bt'], 'Cg': slot['Cg'], 'Cl': slot['Cl'],
+        'Ex': slot['Ex'], 'Fd': slot['Fd'], 'Fi': slot['Fi'], 'Ge': slot['Ge'], 'Hh': slot['Hh'],
+        'Ls': slot['Ls'], 'Na': slot['Na'], 'Sc': slot['Sc'], 'Sx': slot['Sx'], 'Xy': slot['Xy'],
+        'Id': slot['Id'],
+    }
+    spec_slot = {
+        'DV': slot['DV'], 'DV2': slot['DV2'], 'INC': slot['INC'], 'INC2': slot['INC2'], 'DR': slot['DR'],
+        'DR2': slot['DR2'], 'FAB': slot['FAB'], 'FAB2': slot['FAB2'], 'ALOG': slot['ALOG'],
+        'CONT': slot['CON'], 'AB': slot['AB'], 'AG': slot['AG'], 'COP': slot['COP'], 'CP': slot['CP'],
+        'GHR': slot['GHR'], 'PHR': slot['PHR'], 'MOR': slot['MOR'], 'PER': slot['PER'], 'PSV': slot['PSV'],
+    }
+    part_slot = {
+        'W': (slot['W'],), 'WS': (slot['W'], slot['S']), 'D': (slot['D'],), 'DS': (slot['D'], slot['S']),
+        'Dd': (slot['Dd'],), 'DdS': (slot['Dd'], slot['S']),
+    }
+
+    @staticmethod
+    def partSlots(category: str) -> tuple:
+        slots = []
+        if category in ('W', 'WS'):
+            slots.append(Statistic.slot['W'])
+        if category in ('D', 'DS'):
+            slots.append(Statistic.slot['D'])
+        if category in ('Dd', 'DdS'):
+            slots.append(Statistic.slot['Dd'])
+        if 'S' in category:
+            slots.append(Statistic.slot['S'])
+        return tuple(slots)
+
+    # 位掩码 -> 槽位，按出现过的掩码组合缓存；混合反应不计Pure*，另用blend_cache
+    det_cache = {}
+    blend_cache = {}
+    cont_cache = {}
+    spec_cache = {}
+
+    @staticmethod
+    def maskSlots(mask: int, bits: dict, slots: dict) -> tuple:
+        return tuple([slot for code, slot in slots.items() if mask & bits.get(code, 0)])
+
+    @staticmethod
+    def detSlots(mask: int, blend: bool) -> tuple:
+        slots = Statistic.maskSlots(mask, Determination.bits, Statistic.det_slot)
+        if blend:
+            return slots
+        return slots + Statistic.maskSlots(mask, Determination.bits, Statistic.pure_slot)
+
+    # 结构概要变量，由variable声明依赖后注册在这里
+    variables = {}
+
+    def __init__(self, path, reactions: Optional[List[Reaction]] = None):
+        self.path = path
+        self.name = path.split('/')[-1].split('.')[0]
+        self.reactions = reactions if reactions is not None else self.readReactions(path)
+
+    def compute(self, *names: str) -> dict:
+        # 只计算需要的变量及其依赖，其余变量保持未计算
+        return {name: getattr(self, name) for name in names}
+
+    def computeAll(self):
+        return self.compute(*Statistic.variables)
+
+    @staticmethod
+    def dependencies(*names: str) -> set:
+        # 变量依赖的全部变量（传递闭包），不含自身
+        result = set()
+        stack = [dep for name in names for dep in Statistic.variables[name].deps]
+        while stack:
+            name = stack.pop()
+            if name not in result:
+                result.add(name)
+                if name in Statistic.variables:
+                    stack.extend(Statistic.variables[name].deps)
+        return result
+
+    # 部位特征
+    @variable('Zf')
+    def ZEst(self):
+        return Statistic.ZEst_table[self.Zf]
+
+    @variable('W', 'D')
+    def W_D(self):
+        return self.W + self.D
+
+    # ----------------下半部分-----------------
+
+    # 核心部分
+    @variable('Cp', 'CpF', 'FCp')
+    def SumCp(self):
+        return self.Cp + self.CpF + self.FCp
+
+    @variable('T', 'TF', 'FT')
+    def SumT(self):
+        return self.T + self.TF + self.FT
+
+    @variable('V', 'VF', 'FV')
+    def SumV(self):
+        return self.V + self.VF + self.FV
+
+    @variable('Y', 'YF', 'FY')
+    def SumY(self):
+        return self.Y + self.YF + self.FY
+
+    @variable('reactions')
+    def R(self):
+        return len(self.reactions)
+
+    @variable('PureF', 'R')
+    def L(self):
+        return self.PureF / (self.R - self.PureF)
+
+    @variable('FC', 'CF', 'C')
+    def WSumC(self):
+        return 0.5 * self.FC + 1.0 * self.CF + 1.5 * self.C
+
+    @variable('M', 'WSumC')
+    def EB(self):
+        return Ratio(self.M, self.WSumC)
+
+    @variable('M', 'WSumC')
+    def EA(self):
+        return self.M + self.WSumC
+
+    # self.RBPer = self.EB.abs_value()  # TODO: check this
+
+    @variable('FM', 'm', 'SumCp', 'SumT', 'SumV', 'SumY')
+    def eb(self):
+        return Ratio(self.FM + self.m, self.SumCp + self.SumT + self.SumV + self.SumY)
+
+    @variable('FM', 'm', 'SumCp', 'SumT', 'SumV', 'SumY')
+    def es(self):
+        return self.FM + self.m + self.SumCp + self.SumT + self.SumV + self.SumY
+
+    @variable('EA', 'es')
+    def Dscore(self):
+        return self.DConvert(self.EA - self.es)
+
+    @variable('FM', 'm', 'SumCp', 'SumT', 'SumV', 'SumY')
+    def Adjes(self):
+        return self.FM + min(self.m, 1) + self.SumCp + self.SumT + self.SumV + min(self.SumY, 1)
+
+    @variable('EA', 'Adjes')
+    def AdjD(self):
+        return self.DConvert(self.EA - self.Adjes)
+
+    # 思维部分
+    @variable('active', 'passive')
+    def APR(self):
+        return Ratio(self.active, self.passive)
+
+    @variable('Mactive', 'Mpassive')
+    def MAPR(self):
+        return Ratio(self.Mactive, self.Mpassive)
+
+    @variable('AB', 'Art', 'Ay')
+    def Intel(self):
+        return 2 * self.AB + self.Art + self.Ay
+
+    # 情绪部分
+    @variable('FC', 'CF', 'C')
+    def FCR(self):
+        return Ratio(self.FC, self.CF + self.C)
+
+    @variable('SumCp', 'WSumC')
+    def CpCR(self):
+        return Ratio(self.SumCp, self.WSumC)
+
+    @variable('R8_10', 'R')
+    def Afr(self):
+        return self.R8_10 / (self.R - self.R8_10)
+
+    @variable('blends', 'R')
+    def ComR(self):
+        return Ratio(len(self.blends), self.R)
+
+    # 调节部分
+    @variable('FQplus', 'FQo', 'FQu', 'R')
+    def XA(self):
+        return (self.FQplus + self.FQo + self.FQu) / self.R
+
+    @variable('W_Dplus', 'W_Do', 'W_Du', 'R')
+    def WDA(self):
+        return (self.W_Dplus + self.W_Do + self.W_Du) / self.R
+
+    @variable('FQminus', 'R')
+    def Xminus(self):
+        return self.FQminus / self.R
+
+    @variable('FQplus', 'FQo', 'R')
+    def Xplus(self):
+        return (self.FQplus + self.FQo) / self.R
+
+    @variable('FQu', 'R')
+    def Xu(self):
+        return self.FQu / self.R
+
+    # 加工部分
+    @variable('W', 'D', 'Dd')
+    def EcoI(self):
+        return TriRatio(self.W, self.D, self.Dd)
+
+    @variable('W', 'M')
+    def AspR(self):
+        return Ratio(self.W, self.M)
+
+    @variable('ZSum', 'ZEst')
+    def Zd(self):
+        return self.ZSum - self.ZEst
+
+    # 人际交往部分
+    @variable('GHR', 'PHR')
+    def GHR_PHR(self):
+        return Ratio(self.GHR, self.PHR)
+
+    @variable('H', 'h', 'Hd', 'hd')
+    def HCont(self):
+        return self.H + self.h + self.Hd + self.hd
+
+    @variable('Bt', 'Cl', 'Ge', 'Ls', 'Na', 'R')
+    def IsoI(self):
+        return (self.Bt + 2 * self.Cl + self.Ge + self.Ls + 2 * self.Na) / self.R
+
+    # 自我知觉部分
+    @variable('Fr', 'rF')
+    def Fr_rF(self):
+        return self.Fr + self.rF
+
+    @variable('An', 'Xy')
+    def An_Xy(self):
+        return self.An + self.Xy
+
+    @variable('H', 'h', 'Hd', 'hd')
+    def H_hd(self):
+        return Ratio(self.H, self.h + self.Hd + self.hd)
+
+    @variable('Fr_rF', 'pair', 'R')
+    def EgoI(self):
+        return (3 * self.Fr_rF + self.pair) / self.R
+
+    # 特殊指数
+    # 自杀指数
+    @variable('FV', 'VF', 'V', 'FD')
+    def SCON1(self):
+        return self.FV + self.VF + self.V + self.FD > 2
+
+    @variable('ColorShade')
+    def SCON2(self):
+        return self.ColorShade > 0
+
+    @variable('EgoI')
+    def SCON3(self):
+        return self.EgoI < 0.31 or self.EgoI > 0.44
+
+    @variable('MOR')
+    def SCON4(self):
+        return self.MOR > 3
+
+    @variable('Zd')
+    def SCON5(self):
+        return self.Zd > 3.5 or self.Zd < -3.5
+
+    @variable('es', 'EA')
+    def SCON6(self):
+        return self.es > self.EA
+
+    @variable('CF', 'C', 'FC')
+    def SCON7(self):
+        return self.CF + self.C > self.FC
+
+    @variable('Xplus')
+    def SCON8(self):
+        return self.Xplus < 0.7
+
+    @variable('S')
+    def SCON9(self):
+        return self.S > 3
+
+    @variable('P')
+    def SCON10(self):
+        return self.P < 3 or self.P > 8
+
+    @variable('H')
+    def SCON11(self):
+        return self.H < 2
+
+    @variable('R')
+    def SCON12(self):
+        return self.R < 17
+
+    @variable(*[f'SCON{i}' for i in range(1, 13)])
+    def SCON(self):
+        return [self.SCON1, self.SCON2, self.SCON3, self.SCON4, self.SCON5, self.SCON6, self.SCON7, self.SCON8,
+                self.SCON9,
+                self.SCON10, self.SCON11, self.SCON12]
+
+    # 知觉思维指数
+    @variable('XA', 'WDA')
+    def PTI1(self):
+        return self.XA < 0.7 and self.WDA < 0.75
+
+    @variable('Xminus')
+    def PTI2(self):
+        return self.Xminus > 0.29
+
+    @variable('Lv2', 'FAB2')
+    def PTI3(self):
+        return self.Lv2 > 2 and self.FAB2 > 0
+
+    @variable('R', 'WSum6')
+    def PTI4(self):
+        return self.R < 17 and self.WSum6 > 12 or self.R > 16 and self.WSum6 > 17
+
+    @variable('MQualminus', 'Xminus')
+    def PTI5(self):
+        return self.MQualminus > 1 or self.Xminus > 0.4
+
+    @variable(*[f'PTI{i}' for i in range(1, 6)])
+    def PTI(self):
+        return [self.PTI1, self.PTI2, self.PTI3, self.PTI4, self.PTI5]
+
+    # 抑郁指数
+    @variable('SumV', 'FD')
+    def DEPI1(self):
+        return self.SumV > 0 or self.FD > 2
+
+    @variable('ColorShade', 'S')
+    def DEPI2(self):
+        return self.ColorShade > 0 or self.S > 2
+
+    @variable('EgoI', 'Fr_rF')
+    def DEPI3(self):
+        return self.EgoI > 0.44 and self.Fr_rF == 0 or self.EgoI < 0.33
+
+    @variable('Afr', 'blends')
+    def DEPI4(self):
+        return self.Afr < 0.46 or len(self.blends) < 4
+
+    @variable('SumCp', 'SumT', 'SumV', 'SumY', 'FM', 'm')
+    def DEPI5(self):
+        return self.SumCp + self.SumT + self.SumV + self.SumY > self.FM + self.m or self.SumCp > 2
+
+    @variable('MOR', 'Intel')
+    def DEPI6(self):
+        return self.MOR > 2 or self.Intel > 3
+
+    @variable('COP', 'IsoI')
+    def DEPI7(self):
+        return self.COP < 2 or self.IsoI > 0.24
+
+    @variable(*[f'DEPI{i}' for i in range(1, 8)])
+    def DEPI(self):
+        return [self.DEPI1, self.DEPI2, self.DEPI3, self.DEPI4, self.DEPI5, self.DEPI6, self.DEPI7]
+
+    # 应对缺陷指数
+    @variable('EA', 'AdjD')
+    def CDI1(self):
+        return self.EA < 6 or self.AdjD < 0
+
+    @variable('COP', 'AG')
+    def CDI2(self):
+        return self.COP < 2 or self.AG < 2
+
+    @variable('WSumC', 'Afr')
+    def CDI3(self):
+        return self.WSumC < 2.5 or self.Afr < 0.46
+
+    @variable('P', 'active', 'H')
+    def CDI4(self):
+        return self.P > self.active + 1 or self.H < 2
+
+    @variable('SumT', 'IsoI', 'Fd')
+    def CDI5(self):
+        return self.SumT > 1 or self.IsoI > 0.24 or self.Fd > 0
+
+    @variable(*[f'CDI{i}' for i in range(1, 6)])
+    def CDI(self):
+        return [self.CDI1, self.CDI2, self.CDI3, self.CDI4, self.CDI5]
+
+    # 高警觉指数
+    @variable('SumT')
+    def HVI1(self):
+        return self.SumT == 0
+
+    @variable('Zf')
+    def HVI2(self):
+        return self.Zf > 12
+
+    @variable('Zd')
+    def HVI3(self):
+        return self.Zd > 3.5
+
+    @variable('S')
+    def HVI4(self):
+        return self.S > 3
+
+    @variable('HCont')
+    def HVI5(self):
+        return self.HCont > 6
+
+    @variable('h', 'a', 'hd', 'ad')
+    def HVI6(self):
+        return self.h + self.a + self.hd + self.ad > 3
+
+    @variable('H', 'A', 'Hd', 'Ad')
+    def HVI7(self):
+        return (self.H + self.A) < 4 * (self.Hd + self.Ad)
+
+    @variable('Cg')
+    def HVI8(self):
+        return self.Cg > 3
+
+    @variable(*[f'HVI{i}' for i in range(1, 9)])
+    def HVI(self):
+        return self.HVI1 and sum([self.HVI2, self.HVI3, self.HVI4, self.HVI5, self.HVI6, self.HVI7, self.HVI8]) >= 4
+
+    # 强迫指数
+    @variable('Dd')
+    def OBS1(self):
+        return self.Dd > 3
+
+    @variable('Zf')
+    def OBS2(self):
+        return self.Zf > 12
+
+    @variable('Zd')
+    def OBS3(self):
+        return self.Zd > 3
+
+    @variable('P')
+    def OBS4(self):
+        return self.P > 7
+
+    @variable('FQplus')
+    def OBS5(self):
+        return self.FQplus > 1
+
+    @variable(*[f'OBS{i}' for i in range(1, 6)], 'FQplus', 'Xplus')
+    def OBS(self):
+        return sum([self.OBS1, self.OBS2, self.OBS3, self.OBS4, self.OBS5]) == 5 or \
+            sum([self.OBS1, self.OBS2, self.OBS3, self.OBS4, self.OBS5]) >= 2 and self.FQplus > 3 or \
+            sum([self.OBS1, self.OBS2, self.OBS3, self.OBS4, self.OBS5]) >= 3 and self.Xplus > 0.89 or \
+            self.FQplus > 3 and self.Xplus > 0.89
+
+    def tally(self):
+        counts = [0] * len(Statistic.counters)
+        self.blends = []
+        self.part_seq = {card: [] for card in range(1, 11)}
+        Statistic.countReactions(counts, self.reactions, 1, self.blends, self.part_seq)
+
+        self.counts = counts
+        for name, value in zip(Statistic.counters, counts):
+            setattr(self, name, value)
+
+    @staticmethod
+    def countReactions(counts: list, reactions: List[Reaction], sign=1, blends: Optional[list] = None,
+                       part_seq: Optional[dict] = None):
+        # sign为-1时从counts中减去这些反应，用于增量更新
+        part_slot = Statistic.part_slot
+        dq_slot = Statistic.dq_slot
+        fq_slot = Statistic.fq_slot
+        mqual_slot = Statistic.mqual_slot
+        wd_slot = Statistic.wd_slot
+        det_cache = Statistic.det_cache
+        blend_cache = Statistic.blend_cache
+        cont_cache = Statistic.cont_cache
+        spec_cache = Statistic.spec_cache
+        spec6_score = Reaction.spec6_score
+        spec6_mask = Reaction.spec6_mask
+        M_bit = Determination.bits['M']
+        H_bit = Content.bits['H']
+        Zf, ZSum, Sminus, PureH, R8_10, P, Sum6, WSum6, Lv2 = (
+            Statistic.slot[name] for name in ('Zf', 'ZSum', 'Sminus', 'PureH', 'R8_10', 'P', 'Sum6', 'WSum6', 'Lv2'))
+        active, passive, Mactive, Mpassive, ColorShade = (
+            Statistic.slot[name] for name in ('active', 'passive', 'Mactive', 'Mpassive', 'ColorShade'))
+
+        for r in reactions:
+            category = r.pt.category
+            fq = r.fq.fq
+
+            # 部位特征
+            if r.z:
+                counts[Zf] += sign
+                counts[ZSum] += sign * r.z.score
+            slots = part_slot.get(category)
+            if slots is None:
+                slots = part_slot[category] = Statistic.partSlots(category)
+            for slot in slots:
+                counts[slot] += sign
+            if r.dq.dq in dq_slot:
+                counts[dq_slot[r.dq.dq]] += sign
+
+            # 决定因子
+            for d in r.det:
+                if d.motion == 'a':
+                    counts[active] += sign
+                    if d.det == 'M':
+                        counts[Mactive] += sign
+                elif d.motion == 'p':
+                    counts[passive] += sign
+                    if d.det == 'M':
+                        counts[Mpassive] += sign
+            blend = r.ndet >= 2
+            cache = blend_cache if blend else det_cache
+            slots = cache.get(r.det_mask)
+            if slots is None:
+                slots = cache[r.det_mask] = Statistic.detSlots(r.det_mask, blend)
+            for slot in slots:
+                counts[slot] += sign
+            if blends is not None and blend:
+                blends.append(r.det)
+            if r.isColorShadeBlend():
+                counts[ColorShade] += sign
+
+            # 形状质量
+            if fq in fq_slot:
+                counts[fq_slot[fq]] += sign
+                if r.det_mask & M_bit:
+                    counts[mqual_slot[fq]] += sign
+                if category in ('W', 'D'):
+                    counts[wd_slot[fq]] += sign
+            if fq == '-' and 'S' in category:
+                counts[Sminus] += sign
+
+            # 内容
+            slots = cont_cache.get(r.cont_mask)
+            if slots is None:
+                slots = cont_cache[r.cont_mask] = Statistic.maskSlots(r.cont_mask, Content.bits, Statistic.cont_slot)
+            for slot in slots:
+                counts[slot] += sign
+            if len(r.cont) == 1 and r.cont_mask & H_bit:
+                counts[PureH] += sign
+
+            # 部位序列
+            if part_seq is not None and r.card in part_seq:
+                part_seq[r.card].append(category)
+            if r.card in (8, 9, 10):
+                counts[R8_10] += sign
+            if r.p:
+                counts[P] += sign
+
+            # 特殊分数
+            slots = spec_cache.get(r.spec_mask)
+            if slots is None:
+                slots = spec_cache[r.spec_mask] = Statistic.maskSlots(r.spec_mask, Spec.bits, Statistic.spec_slot)
+            for slot in slots:
+                counts[slot] += sign
+            if r.spec_mask & spec6_mask:
+                for s in r.spec:
+                    if s.spec in Reaction.spec6:
+                        counts[Sum6] += sign
+                        counts[WSum6] += sign * spec6_score[s.spec]
+                        if s.spec in Reaction.spec2:
+                            counts[Lv2] += sign
 
     def DConvert(self, EA_es):
         if EA_es < 0:
@@ -660,24 +1178,36 @@ class Statistic:
         else:
             return (EA_es - 0.1) // 2.5
 
-    def readReactions(self, path) -> List[Reaction]:
-        dataframe = pandas.read_excel(path)
-
-        reactions: List[Reaction] = []
-        for index, row in dataframe.iterrows():
-            reactions.append(
-                Reaction(card=row['Card'], desc=row['Desc'], pt=Part(row['Pt']), dq=DQ(row['DQ']), fq=FQ(row['FQ']),
-                         det=[Determination(det) for det in row['Det'].split('.')],
-                         cont=[Content(cont) for cont in row['Cont'].split('.')], p=not pandas.isna(row['P']),
-                         z=Z(row['Z'], row['Card']) if not pandas.isna(row['Z']) else None,
-                         # GHR, PHR不再读取。而是根据数据计算
-                         spec=[Spec(spec) for spec in row['Spec'].split('.') if
-                               spec not in ('GHR', 'PHR')] if not pandas.isna(row['Spec']) else [])
-            )
-        return reactions
-
-    def saveResult(self):
-        with open(f'result/{self.name}.txt', 'w', encoding='utf-8') as f:
+    @staticmethod
+    def makeReaction(row) -> Reaction:
+        return Reaction(card=row['Card'], desc=row['Desc'] if not isna(row['Desc']) else '', pt=Part(row['Pt']),
+                        dq=DQ(row['DQ']), fq=FQ(row['FQ']),
+                        det=[Determination(det) for det in row['Det'].split('.')],
+                        cont=[Content(cont) for cont in row['Cont'].split('.')], p=not isna(row['P']),
+                        z=Z(row['Z'], row['Card']) if not isna(row['Z']) else None,
+                        # GHR, PHR不再读取。而是根据数据计算
+                        spec=[Spec(spec) for spec in row['Spec'].split('.') if
+                              spec not in ('GHR', 'PHR')] if not isna(row['Spec']) else [])
+
+    @staticmethod
+    def readReactions(path) -> List[Reaction]:
+        # 各读取方式按需导入，只打分一个文件时不必加载用不到的模块
+        if path.endswith(('.xlsx', '.xlsm')):
+            import xlsx
+            rows = xlsx.readRows(path)
+        elif path.endswith(('.txt', '.csv')):
+            # 其他工具导出的计分文本
+            import scoring
+            return scoring.readCsv(path) if path.endswith('.csv') else scoring.readText(path)
+        else:
+            # .xls/.ods等其他格式仍交给pandas
+            import pandas
+            rows = (row for _, row in pandas.read_excel(path).iterrows())
+
+        return [Statistic.makeReaction(row) for row in rows]
+
+    def saveResult(self, directory='result'):
+        with open(f'{directory}/{self.name}.txt', 'w', encoding='utf-8') as f:
             f.write(repr(self))
 
     def __repr__(self):
@@ -900,8 +1430,16 @@ OBS = {self.OBS}
         """
 
 
+# 部位特征、决定因子、形状质量、内容、特殊分数：一次遍历完成计数
+for counter in Statistic.counters + ('blends', 'part_seq'):
+    setattr(Statistic, counter, Tallied(counter))
+    Statistic.variables[counter] = getattr(Statistic, counter)
+
 if __name__ == '__main__':
-    statistic = Statistic('data/zl.xlsx')
+    # 单个协议打分时用python -m main <文件>启动，可以使用已编译的缓存，省去每次编译本文件
+    import sys
+
+    statistic = Statistic(sys.argv[1] if len(sys.argv) > 1 else 'data/zl.xlsx')
     statistic.saveResult()
     for r in statistic.reactions:
         print(r)
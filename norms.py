@@ -0,0 +1,360 @@
+import argparse
+import csv
+import json
+import math
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence
+
+from main import Ratio, Statistic, TriRatio
+
+# 常模：每个结构概要变量在样本中的均值、标准差、中位数与百分位数
+# 所有统计量都可以逐个协议累加、也可以合并，多进程各算一部分后merge即可，内存不随样本量增长
+
+
+class Moments:
+    # Welford在线算法，合并用Chan等人的并行公式
+    __slots__ = ('n', 'mean', 'm2', 'min', 'max')
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x: float):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    def merge(self, other: 'Moments'):
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def sd(self) -> float:
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else math.nan
+
+    def toDict(self) -> dict:
+        return {'n': self.n, 'mean': self.mean, 'm2': self.m2, 'min': self.min, 'max': self.max}
+
+    @staticmethod
+    def fromDict(d: dict) -> 'Moments':
+        m = Moments()
+        m.n, m.mean, m.m2, m.min, m.max = d['n'], d['mean'], d['m2'], d['min'], d['max']
+        return m
+
+
+class QuantileSketch:
+    # 对数分桶的分位数草图（DDSketch），任一分位数的相对误差不超过alpha
+    # 桶号只取决于取值本身，两个草图合并即桶计数相加，结果与一次性累加完全相同
+    __slots__ = ('alpha', 'gamma', 'log_gamma', 'positive', 'negative', 'zero', 'count')
+
+    def __init__(self, alpha=0.01):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero = 0
+        self.count = 0
+
+    def bucket(self, x: float) -> int:
+        return math.ceil(math.log(x) / self.log_gamma)
+
+    def value(self, index: int) -> float:
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, x: float, count=1):
+        if x > 0:
+            index = self.bucket(x)
+            self.positive[index] = self.positive.get(index, 0) + count
+        elif x < 0:
+            index = self.bucket(-x)
+            self.negative[index] = self.negative.get(index, 0) + count
+        else:
+            self.zero += count
+        self.count += count
+
+    def merge(self, other: 'QuantileSketch'):
+        if other.alpha != self.alpha:
+            raise ValueError(f'cannot merge sketches with alpha {self.alpha} and {other.alpha}')
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for index, count in theirs.items():
+                mine[index] = mine.get(index, 0) + count
+        self.zero += other.zero
+        self.count += other.count
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return -self.value(index)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return self.value(index)
+        return self.value(max(self.positive))
+
+    def toDict(self) -> dict:
+        # JSON的键只能是字符串
+        return {'alpha': self.alpha, 'zero': self.zero, 'count': self.count,
+                'positive': {str(k): v for k, v in self.positive.items()},
+                'negative': {str(k): v for k, v in self.negative.items()}}
+
+    @staticmethod
+    def fromDict(d: dict) -> 'QuantileSketch':
+        s = QuantileSketch(d['alpha'])
+        s.zero = d['zero']
+        s.count = d['count']
+        s.positive = {int(k): v for k, v in d['positive'].items()}
+        s.negative = {int(k): v for k, v in d['negative'].items()}
+        return s
+
+
+class Norms:
+    # 比率按左右两项分别统计（EB.left、EB.right），指数的阳性条目列表按阳性条目数统计
+    percentiles = (0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95)
+
+    def __init__(self, names: Optional[Sequence[str]] = None, alpha=0.01):
+        self.names = tuple(names) if names is not None else \
+            tuple(name for name in Statistic.variables if name not in ('blends', 'part_seq'))
+        self.alpha = alpha
+        self.subjects = 0
+        self.moments: Dict[str, Moments] = {}
+        self.sketches: Dict[str, QuantileSketch] = {}
+        # 取值全为整数的变量，分位数取整后报告；绝对值小于1/(2·alpha)时取整恢复实际值，更大的值只是就近取整
+        self.integral: Dict[str, bool] = {}
+        # 无法计算（除零、代码表外的取值）或非有限值的次数
+        self.missing: Dict[str, int] = {}
+        # 读取失败、未计入的协议数
+        self.failed = 0
+
+    @staticmethod
+    def flatten(name: str, value) -> Iterable[tuple]:
+        if isinstance(value, Ratio):
+            return (f'{name}.left', value.left), (f'{name}.right', value.right)
+        if isinstance(value, TriRatio):
+            return (f'{name}.left', value.left), (f'{name}.middle', value.middle), (f'{name}.right', value.right)
+        if isinstance(value, list):
+            return (name, sum(value)),
+        return (name, value),
+
+    def values(self, statistic: Statistic) -> Iterable[tuple]:
+        for name in self.names:
+            try:
+                value = getattr(statistic, name)
+            except (ZeroDivisionError, KeyError):
+                # 除零；WSum6遇到CON、Zf超出ZEst表时抛出KeyError，只记该变量缺失
+                yield name, None
+                continue
+            yield from Norms.flatten(name, value)
+
+    def addValue(self, name: str, value):
+        if value is None or isinstance(value, str) or not math.isfinite(value):
+            self.missing[name] = self.missing.get(name, 0) + 1
+            return
+
+        moments = self.moments.get(name)
+        if moments is None:
+            moments = self.moments[name] = Moments()
+            self.sketches[name] = QuantileSketch(self.alpha)
+            self.integral[name] = True
+        moments.add(value)
+        self.sketches[name].add(value)
+        if self.integral[name] and not float(value).is_integer():
+            self.integral[name] = False
+
+    def add(self, statistic: Statistic):
+        self.subjects += 1
+        for name, value in self.values(statistic):
+            self.addValue(name, value)
+
+    def addAll(self, statistics: Iterable[Statistic]) -> 'Norms':
+        for statistic in statistics:
+            self.add(statistic)
+        return self
+
+    def addColumns(self, columns: Mapping[str, Sequence[float]]):
+        # 列式结果（如ReactionTable.tally()），每列一个受试者一个值，整列一次处理
+        import numpy
+
+        subjects = None
+        for name, column in columns.items():
+            values = numpy.asarray(column, dtype=numpy.float64)
+            if subjects is None:
+                subjects = len(values)
+            finite = values[numpy.isfinite(values)]
+            if len(finite) < len(values):
+                self.missing[name] = self.missing.get(name, 0) + len(values) - len(finite)
+            if len(finite) == 0:
+                continue
+
+            batch = Moments()
+            batch.n = len(finite)
+            batch.mean = float(finite.mean())
+            batch.m2 = float(((finite - batch.mean) ** 2).sum())
+            batch.min = float(finite.min())
+            batch.max = float(finite.max())
+
+            sketch = QuantileSketch(self.alpha)
+            sketch.zero = int((finite == 0).sum())
+            sketch.count = len(finite)
+            for target, sign in ((sketch.positive, 1), (sketch.negative, -1)):
+                part = finite[finite * sign > 0] * sign
+                if len(part):
+                    index, count = numpy.unique(numpy.ceil(numpy.log(part) / sketch.log_gamma), return_counts=True)
+                    target.update(zip(index.astype(int).tolist(), count.tolist()))
+
+            self.mergeVariable(name, batch, sketch, bool((finite == numpy.round(finite)).all()))
+        self.subjects += subjects or 0
+
+    def mergeVariable(self, name: str, moments: Moments, sketch: QuantileSketch, integral: bool):
+        if name not in self.moments:
+            self.moments[name] = Moments()
+            self.sketches[name] = QuantileSketch(self.alpha)
+            self.integral[name] = True
+        self.moments[name].merge(moments)
+        self.sketches[name].merge(sketch)
+        self.integral[name] = self.integral[name] and integral
+
+    def merge(self, other: 'Norms') -> 'Norms':
+        self.subjects += other.subjects
+        self.failed += other.failed
+        for name, moments in other.moments.items():
+            self.mergeVariable(name, moments, other.sketches[name], other.integral[name])
+        for name, count in other.missing.items():
+            self.missing[name] = self.missing.get(name, 0) + count
+        return self
+
+    def quantile(self, name: str, q: float) -> float:
+        value = self.sketches[name].quantile(q)
+        # 草图的估计值夹在实际最小、最大值之间
+        # 整数变量的估计误差不超过alpha·|x|，|x| < 1/(2·alpha)（alpha=0.01时小于50）时误差不足0.5，取整即为精确值；
+        # 更大的值误差可能超过0.5，取整后仍只保证相对误差alpha
+        value = min(max(value, self.moments[name].min), self.moments[name].max)
+        return float(round(value)) if self.integral[name] else value
+
+    def summary(self) -> Dict[str, dict]:
+        result = {}
+        for name, moments in self.moments.items():
+            row = {'n': moments.n, 'missing': self.missing.get(name, 0), 'mean': moments.mean, 'sd': moments.sd(),
+                   'min': moments.min, 'max': moments.max}
+            for q in Norms.percentiles:
+                row[f'p{round(q * 100)}'] = self.quantile(name, q)
+            result[name] = row
+        return result
+
+    # ---------------- 导出与合并用的中间状态 ----------------
+
+    def toDict(self) -> dict:
+        return {
+            'alpha': self.alpha,
+            'subjects': self.subjects,
+            'failed': self.failed,
+            'names': list(self.names),
+            'missing': self.missing,
+            'variables': {name: {'moments': self.moments[name].toDict(), 'sketch': self.sketches[name].toDict(),
+                                 'integral': self.integral[name]} for name in self.moments},
+        }
+
+    @staticmethod
+    def fromDict(d: dict) -> 'Norms':
+        norms = Norms(d['names'], d['alpha'])
+        norms.subjects = d['subjects']
+        norms.failed = d.get('failed', 0)
+        norms.missing = dict(d['missing'])
+        for name, v in d['variables'].items():
+            norms.moments[name] = Moments.fromDict(v['moments'])
+            norms.sketches[name] = QuantileSketch.fromDict(v['sketch'])
+            norms.integral[name] = v['integral']
+        return norms
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.toDict(), f)
+
+    @staticmethod
+    def load(path) -> 'Norms':
+        with open(path, encoding='utf-8') as f:
+            return Norms.fromDict(json.load(f))
+
+    def saveCsv(self, path):
+        summary = self.summary()
+        header = ['variable', 'n', 'missing', 'mean', 'sd', 'min', 'max'] + \
+                 [f'p{round(q * 100)}' for q in Norms.percentiles]
+        with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for name, row in summary.items():
+                writer.writerow([name] + [row[column] for column in header[1:]])
+
+
+def normsOf(paths: List[str], cache: Optional[str] = None) -> Norms:
+    # 在工作进程中计算一部分协议的常模，返回后在主进程合并
+    from cache import ProtocolCache
+
+    # 与batch一样，单个文件读取失败只计数，不影响同一批的其他协议
+    load = ProtocolCache(cache).statistic if cache else Statistic
+    norms = Norms()
+    for path in paths:
+        try:
+            statistic = load(path)
+        except Exception:
+            norms.failed += 1
+            continue
+        norms.add(statistic)
+    return norms
+
+
+def main(argv=None):
+    from batch import expandPaths
+
+    parser = argparse.ArgumentParser(description='计算一批协议各结构概要变量的常模')
+    parser.add_argument('paths', nargs='+', help='目录或通配符，如 data/*.xlsx')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='进程数，默认为CPU核数')
+    parser.add_argument('-c', '--chunksize', type=int, default=64, help='每个进程一次处理的文件数')
+    parser.add_argument('-o', '--output', default='norms.json', help='可继续合并的中间状态')
+    parser.add_argument('--csv', default=None, help='导出均值、标准差与百分位数')
+    parser.add_argument('--merge', nargs='*', default=[], help='与已有的中间状态合并')
+    parser.add_argument('--cache', default=None, help='解析结果缓存目录')
+    args = parser.parse_args(argv)
+
+    paths = expandPaths(args.paths)
+    chunks = [paths[i:i + args.chunksize] for i in range(0, len(paths), args.chunksize)]
+    norms = Norms()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for partial in executor.map(normsOf, chunks, [args.cache] * len(chunks)):
+            norms.merge(partial)
+    for path in args.merge:
+        norms.merge(Norms.load(path))
+
+    norms.save(args.output)
+    if args.csv:
+        norms.saveCsv(args.csv)
+    print(f'共 {norms.subjects} 名受试者，{len(norms.moments)} 个变量' +
+          (f'，{norms.failed} 个文件读取失败' if norms.failed else ''))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
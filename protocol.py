@@ -0,0 +1,111 @@
+from typing import Dict, List, Optional, Set
+
+from main import DQ, FQ, Z, Content, Determination, Part, Reaction, Spec, Statistic
+
+
+class Protocol(Statistic):
+    # 可编辑的协议：增删改反应时按差量更新计数器，只让依赖于变化部分的变量失效，访问时再重新计算
+    reverse: Optional[Dict[str, Set[str]]] = None
+
+    def __init__(self, path, reactions: Optional[List[Reaction]] = None):
+        super().__init__(path, list(reactions) if reactions is not None else None)
+        self.tally()
+
+    @staticmethod
+    def dependents(*names: str) -> set:
+        # 依赖于names的全部变量（传递闭包），不含names本身
+        if Protocol.reverse is None:
+            Protocol.reverse = {}
+            for name, var in Statistic.variables.items():
+                for dep in var.deps:
+                    Protocol.reverse.setdefault(dep, set()).add(name)
+
+        result = set()
+        stack = list(names)
+        while stack:
+            for dependent in Protocol.reverse.get(stack.pop(), ()):
+                if dependent not in result:
+                    result.add(dependent)
+                    stack.append(dependent)
+        return result
+
+    @staticmethod
+    def edited(r: Reaction, **fields) -> Reaction:
+        # 以r为底修改部分字段得到新的反应，字段可以是对象也可以是计分代码字符串，GHR/PHR重新计算
+        card = fields.get('card', r.card)
+        pt = fields.get('pt', r.pt)
+        dq = fields.get('dq', r.dq)
+        fq = fields.get('fq', r.fq)
+        det = fields.get('det', r.det)
+        cont = fields.get('cont', r.cont)
+        spec = fields.get('spec', r.spec)
+        z = fields.get('z', r.z)
+        if isinstance(z, str):
+            z = Z(z, card) if z else None
+        elif z is not None:
+            z = Z(z.z, card)
+
+        return Reaction(
+            card=card,
+            desc=fields.get('desc', r.desc),
+            pt=Part(pt) if isinstance(pt, str) else pt,
+            dq=DQ(dq) if isinstance(dq, str) else dq,
+            fq=FQ(fq) if isinstance(fq, str) else fq,
+            det=[Determination(d) for d in det.split('.')] if isinstance(det, str) else list(det),
+            cont=[Content(c) for c in cont.split('.')] if isinstance(cont, str) else list(cont),
+            p=fields.get('p', r.p),
+            z=z,
+            spec=[s for s in ([Spec(s) for s in spec.split('.') if s] if isinstance(spec, str) else spec)
+                  if s.spec not in ('GHR', 'PHR')],
+        )
+
+    def add(self, reaction: Reaction, index: Optional[int] = None):
+        if index is None:
+            self.reactions.append(reaction)
+        else:
+            self.reactions.insert(index, reaction)
+        self.update([], [reaction])
+
+    def remove(self, index: int) -> Reaction:
+        reaction = self.reactions.pop(index)
+        self.update([reaction], [])
+        return reaction
+
+    def replace(self, index: int, reaction: Reaction) -> Reaction:
+        old = self.reactions[index]
+        self.reactions[index] = reaction
+        self.update([old], [reaction])
+        return old
+
+    def edit(self, index: int, **fields) -> Reaction:
+        reaction = Protocol.edited(self.reactions[index], **fields)
+        self.replace(index, reaction)
+        return reaction
+
+    def update(self, removed: List[Reaction], added: List[Reaction]):
+        before = list(self.counts)
+        Statistic.countReactions(self.counts, removed, -1)
+        Statistic.countReactions(self.counts, added, 1)
+        if self.counts[Statistic.slot['Zf']] == 0:
+            self.counts[Statistic.slot['ZSum']] = 0
+
+        changed = set()
+        for name, old, new in zip(Statistic.counters, before, self.counts):
+            if old != new:
+                self.__dict__[name] = new
+                changed.add(name)
+
+        if len(removed) != len(added):
+            self.__dict__.pop('R', None)
+            changed.add('R')
+
+        if any(r.isBlend() for r in removed) or any(r.isBlend() for r in added):
+            self.blends = [r.det for r in self.reactions if r.isBlend()]
+            changed.add('blends')
+
+        for card in {r.card for r in removed} | {r.card for r in added}:
+            if card in self.part_seq:
+                self.part_seq[card] = [r.pt.category for r in self.reactions if r.card == card]
+
+        for name in Protocol.dependents(*changed):
+            self.__dict__.pop(name, None)
@@ -0,0 +1,338 @@
+import argparse
+import re
+import sys
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy
+
+from main import Content, Determination, Spec
+from table import ReactionTable
+
+# 反应筛选表达式，如 card in (8, 9, 10) and FQ == '-' and det has 'M'
+# 解析一次，编译成对ReactionTable整列运算的函数，对整个队列一次算出逐反应的真假
+#   比较    == != < <= > >=，数值字段可比大小，代码字段只能比相等
+#   集合    字段 in (值, ...)，字段 not in (...)
+#   包含    det/cont/spec has '代码'；part has 'S' 为部位类别中含S（WS、DS、DdS）
+#   逻辑    and or not，括号；布尔字段可单独作为条件，如 P and not blend
+# 代码值可加引号也可不加，含括号、-等符号的代码（如'(H)'、'-'）须加引号；字段名不区分大小写
+TOKEN = re.compile(r'''\s*(?:
+    (?P<number>\d+(?:\.\d+)?)|
+    (?P<string>'[^']*'|"[^"]*")|
+    (?P<op>==|!=|<=|>=|<|>|\(|\)|,)|
+    (?P<name>[A-Za-z_][\w'/+]*)
+)''', re.VERBOSE)
+KEYWORDS = ('and', 'or', 'not', 'in', 'has')
+
+
+def masks(column: str, bits: dict) -> Callable:
+    def get(t: ReactionTable, code: str) -> numpy.ndarray:
+        bit = bits.get(code)
+        return getattr(t, column) & bit != 0 if bit else numpy.zeros(len(t.card), dtype=numpy.bool_)
+
+    return get
+
+
+# 字段名 -> (种类, 取列的函数)
+#   number  数值列；code  编码后的代码列，附带代码表；set  位编码的代码集合；bool  逐反应真假
+fields = {
+    'card': ('number', lambda t: t.card),
+    'number': ('number', lambda t: t.number),
+    'z': ('number', lambda t: t.z),
+    'ncont': ('number', lambda t: t.ncont),
+    'active': ('number', lambda t: t.active),
+    'passive': ('number', lambda t: t.passive),
+    'mactive': ('number', lambda t: t.Mactive),
+    'mpassive': ('number', lambda t: t.Mpassive),
+    'sum6': ('number', lambda t: t.Sum6),
+    'wsum6': ('number', lambda t: t.WSum6),
+    'lv2': ('number', lambda t: t.Lv2),
+    'part': ('code', lambda t: t.part, ReactionTable.categories),
+    'dq': ('code', lambda t: t.dq, ReactionTable.dqs),
+    'fq': ('code', lambda t: t.fq, ReactionTable.fqs),
+    'det': ('set', masks('det', Determination.bits), Determination.bits),
+    'cont': ('set', masks('cont', Content.bits), Content.bits),
+    'spec': ('set', masks('spec', Spec.bits), Spec.bits),
+    'p': ('bool', lambda t: t.p),
+    'blend': ('bool', lambda t: t.isBlend()),
+    'colorshade': ('bool', lambda t: t.isColorShadeBlend()),
+}
+
+
+class Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens: List[Tuple[str, object, int]] = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            m = TOKEN.match(text, position)
+            if m is None or m.end() == position:
+                raise ValueError(f'unexpected character at {position}: {text[position:]!r}')
+            kind = m.lastgroup
+            value = m.group(kind)
+            start = m.start(kind)
+            if kind == 'number':
+                value = float(value) if '.' in value else int(value)
+            elif kind == 'string':
+                value = value[1:-1]
+            elif kind == 'name' and value.lower() in KEYWORDS:
+                kind, value = 'keyword', value.lower()
+            self.tokens.append((kind, value, start))
+            position = m.end()
+        self.i = 0
+
+    def peek(self, kind: str, value=None) -> bool:
+        if self.i >= len(self.tokens):
+            return False
+        k, v, _ = self.tokens[self.i]
+        return k == kind and (value is None or v == value)
+
+    def take(self, kind: str, value=None):
+        if not self.peek(kind, value):
+            where = self.tokens[self.i][2] if self.i < len(self.tokens) else len(self.text)
+            raise ValueError(f'expected {value or kind} at {where}: {self.text[where:]!r}')
+        self.i += 1
+        return self.tokens[self.i - 1][1]
+
+    def parse(self) -> tuple:
+        tree = self.orExpr()
+        if self.i < len(self.tokens):
+            raise ValueError(f'unexpected {self.tokens[self.i][1]!r} at {self.tokens[self.i][2]}')
+        return tree
+
+    # 语法树为元组：('or', a, b) ('and', a, b) ('not', a) ('cmp', op, 字段, 值) ('in', 字段, 值列表)
+    # ('has', 字段, 值) ('bool', 字段)
+
+    def orExpr(self) -> tuple:
+        tree = self.andExpr()
+        while self.peek('keyword', 'or'):
+            self.i += 1
+            tree = ('or', tree, self.andExpr())
+        return tree
+
+    def andExpr(self) -> tuple:
+        tree = self.notExpr()
+        while self.peek('keyword', 'and'):
+            self.i += 1
+            tree = ('and', tree, self.notExpr())
+        return tree
+
+    def notExpr(self) -> tuple:
+        if self.peek('keyword', 'not'):
+            self.i += 1
+            return ('not', self.notExpr())
+        return self.atom()
+
+    def field(self) -> str:
+        name = self.take('name')
+        if name.lower() not in fields:
+            raise ValueError(f'unknown field: {name}')
+        return name.lower()
+
+    def value(self):
+        for kind in ('number', 'string', 'name'):
+            if self.peek(kind):
+                return self.take(kind)
+        return self.take('value')
+
+    def atom(self) -> tuple:
+        if self.peek('op', '('):
+            self.i += 1
+            tree = self.orExpr()
+            self.take('op', ')')
+            return tree
+
+        field = self.field()
+        kind = fields[field][0]
+        if self.peek('keyword', 'has'):
+            self.i += 1
+            if kind not in ('set', 'code') or kind == 'code' and field != 'part':
+                raise ValueError(f'{field} does not support has')
+            return ('has', field, str(self.value()))
+        negate = self.peek('keyword', 'not')
+        if negate or self.peek('keyword', 'in'):
+            self.i += negate
+            self.take('keyword', 'in')
+            if kind == 'bool':
+                raise ValueError(f'{field} does not support in')
+            self.take('op', '(')
+            values = [self.value()]
+            while self.peek('op', ','):
+                self.i += 1
+                values.append(self.value())
+            self.take('op', ')')
+            tree = ('in', field, values)
+            return ('not', tree) if negate else tree
+        for op in ('==', '!=', '<=', '>=', '<', '>'):
+            if self.peek('op', op):
+                self.i += 1
+                if kind in ('set', 'bool') or kind == 'code' and op not in ('==', '!='):
+                    raise ValueError(f'{field} does not support {op}')
+                return ('cmp', op, field, self.value())
+        if kind != 'bool':
+            raise ValueError(f'{field} is not a condition by itself')
+        return ('bool', field)
+
+
+operators = {
+    '==': numpy.equal, '!=': numpy.not_equal, '<': numpy.less, '<=': numpy.less_equal,
+    '>': numpy.greater, '>=': numpy.greater_equal,
+}
+
+
+def codeValue(field: str, value) -> str:
+    # 代码字段中的数字按字符串处理，如 part == 'W' 与 FQ == 'o'
+    return str(value) if fields[field][0] in ('code', 'set') else value
+
+
+def compileTree(tree: tuple) -> Callable[[ReactionTable], numpy.ndarray]:
+    # 代码在运行时才查编码表：表外代码的编号在读入数据时才分配
+    node = tree[0]
+    if node in ('and', 'or'):
+        left, right = compileTree(tree[1]), compileTree(tree[2])
+        op = numpy.logical_and if node == 'and' else numpy.logical_or
+        return lambda t: op(left(t), right(t))
+    if node == 'not':
+        inner = compileTree(tree[1])
+        return lambda t: ~inner(t)
+    if node == 'bool':
+        get = fields[tree[1]][1]
+        return lambda t: get(t).astype(numpy.bool_, copy=False)
+
+    if node == 'has':
+        _, field, value = tree
+        if field == 'part':
+            return lambda t: t.categoryContains(value)
+        get = fields[field][1]
+        return lambda t: get(t, value)
+
+    if node == 'in':
+        _, field, values = tree
+        kind, get, *codes = fields[field]
+        if kind == 'number':
+            values = numpy.array(values, dtype=numpy.float64)
+            return lambda t: numpy.isin(get(t), values)
+        values = [codeValue(field, v) for v in values]
+        if kind == 'set':
+            return lambda t: numpy.logical_or.reduce([get(t, v) for v in values])
+        table = codes[0]
+        return lambda t: numpy.isin(get(t), [table[v] for v in values if v in table])
+
+    _, op, field, value = tree
+    kind, get, *codes = fields[field]
+    func = operators[op]
+    if kind == 'number':
+        if not isinstance(value, (int, float)):
+            raise ValueError(f'{field} compares with numbers, not {value!r}')
+        return lambda t: func(get(t), value)
+    value = codeValue(field, value)
+    table = codes[0]
+    # 数据中从未出现过的代码：== 全为假，!= 全为真
+    return lambda t: func(get(t), table.get(value, -1))
+
+
+class Query:
+    def __init__(self, text: str):
+        self.text = text
+        self.tree = Parser(text).parse()
+        self.func = compileTree(self.tree)
+
+    def __repr__(self):
+        return f'Query({self.text!r})'
+
+    def mask(self, table: ReactionTable) -> numpy.ndarray:
+        return self.func(table)
+
+    def count(self, table: ReactionTable) -> numpy.ndarray:
+        # 每个受试者满足条件的反应数
+        return table.perSubject(self.mask(table).astype(numpy.int64))
+
+    def total(self, table: ReactionTable) -> int:
+        return int(numpy.count_nonzero(self.mask(table)))
+
+    def groups(self, table: ReactionTable, field: str) -> Dict[object, numpy.ndarray]:
+        # 满足条件的反应按字段取值分组，每组一个逐反应的真假数组，空组不列出；
+        # det/cont/spec中一个反应含几个代码就计入几组；数值字段中的nan（如没有Z分）归入None组
+        field = field.lower()
+        if field not in fields:
+            raise ValueError(f'unknown field: {field}')
+        mask = self.mask(table)
+        kind, get, *codes = fields[field]
+        if kind == 'set':
+            groups = {code: mask & get(table, code) for code in codes[0]}
+            return {code: group for code, group in groups.items() if group.any()}
+        values = get(table)
+        names = {i: code for code, i in codes[0].items()} if kind == 'code' else None
+        groups = {}
+        for v in numpy.unique(values[mask]).tolist():
+            if v != v:
+                groups[None] = mask & numpy.isnan(values)
+            else:
+                groups[names[v] if names else v] = mask & (values == v)
+        return groups
+
+    def groupBy(self, table: ReactionTable, field: str) -> Dict[object, int]:
+        return {value: int(numpy.count_nonzero(group)) for value, group in self.groups(table, field).items()}
+
+    def countBy(self, table: ReactionTable, field: str) -> Dict[object, numpy.ndarray]:
+        # 逐受试者的分组计数
+        return {value: table.perSubject(group.astype(numpy.int64))
+                for value, group in self.groups(table, field).items()}
+
+
+def define(table: ReactionTable, **variables: str) -> Dict[str, numpy.ndarray]:
+    # 自定义的计数变量，如 define(table, CBl='cont has Bl and FQ == "-"')
+    return {name: Query(text).count(table) for name, text in variables.items()}
+
+
+def load(paths: List[str], cache=None) -> ReactionTable:
+    from batch import expandPaths
+
+    tables = []
+    files = []
+    for path in paths:
+        if path.endswith('.rcha'):
+            import archive
+
+            tables.append(archive.ProtocolArchive(path).table())
+        else:
+            files.append(path)
+    if files:
+        tables.append(ReactionTable.fromFiles(expandPaths(files), cache))
+    return tables[0] if len(tables) == 1 else ReactionTable.concat(tables)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='按表达式筛选反应并计数，如 "card in (8, 9, 10) and FQ == \'-\'"')
+    parser.add_argument('expression', help='筛选表达式')
+    parser.add_argument('paths', nargs='+', help='协议目录、通配符或归档文件（.rcha）')
+    parser.add_argument('-g', '--group', default=None, help='按字段分组计数，如 card、FQ、cont')
+    parser.add_argument('--total', action='store_true', help='只输出所有受试者的合计')
+    parser.add_argument('--cache', default=None, help='解析结果缓存目录')
+    args = parser.parse_args(argv)
+
+    try:
+        query = Query(args.expression)
+    except ValueError as e:
+        print(f'表达式有误：{e}', file=sys.stderr)
+        return 2
+    cache = None
+    if args.cache:
+        from cache import ProtocolCache
+
+        cache = ProtocolCache(args.cache)
+    table = load(args.paths, cache)
+
+    if args.group:
+        for value, n in query.groupBy(table, args.group).items():
+            print(f'{value}\t{n}')
+    elif args.total:
+        print(query.total(table))
+    else:
+        for name, n in zip(table.names, query.count(table).tolist()):
+            print(f'{name}\t{n}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import csv
+import re
+from typing import Iterator, List, Optional, Tuple
+
+from main import DQ, FQ, Z, Content, Determination, Part, Reaction, Spec, isna
+
+# 计分行格式与Reaction.__str__一致：
+#   Card 1: 蝙蝠
+#   Wo Ma.FC'o H P ZW(1.0) COP
+TOKEN = re.compile(r'\S+')
+CARD = re.compile(r'Card\s+(\d+)\s*:\s?(.*)')
+PART = re.compile(r'([A-Za-z]+)(\d*)')
+ZCODE = re.compile(r'Z([A-Za-z]+)(?:\(([-+\d.]+)\))?$')
+CODE = re.compile(r"[A-Za-z0-9()']+")
+
+DQS = ('v/+', 'v+', '+', 'o', 'v')
+FQS = ('none', '+', 'o', 'u', '-')
+
+
+class ScoringError(ValueError):
+    def __init__(self, message: str, line: int = 1, column: int = 1):
+        super().__init__(f'{line}:{column}: {message}')
+        self.message = message
+        self.line = line
+        self.column = column
+
+
+class Parser:
+    # 同样的代码在一批协议中反复出现，按token缓存解析结果
+    def __init__(self):
+        self.locations = {}
+        self.determinants = {}
+        self.contents = {}
+        self.specs = {}
+
+    def location(self, token: str, line: int, column: int) -> Tuple[Part, DQ]:
+        result = self.locations.get(token)
+        if result is None:
+            for dq in DQS:
+                if token.endswith(dq) and PART.fullmatch(token[:-len(dq)]):
+                    result = self.locations[token] = (Part(token[:-len(dq)]), DQ(dq))
+                    break
+            else:
+                raise ScoringError(f'expected location and DQ, got {token!r}', line, column)
+        return result
+
+    def determinant(self, token: str, line: int, column: int) -> Tuple[List[Determination], FQ]:
+        result = self.determinants.get(token)
+        if result is None:
+            for fq in FQS:
+                if token.endswith(fq) and len(token) > len(fq):
+                    break
+            else:
+                raise ScoringError(f'expected form quality at the end of {token!r}', line, column + len(token) - 1)
+
+            dets = []
+            offset = 0
+            for code in token[:-len(fq)].split('.'):
+                if not CODE.fullmatch(code):
+                    raise ScoringError(f'invalid determinant code {code!r}', line, column + offset)
+                dets.append(Determination(code))
+                offset += len(code) + 1
+            result = self.determinants[token] = (dets, FQ(fq))
+        return list(result[0]), result[1]
+
+    def codes(self, cache: dict, cls, token: str, line: int, column: int) -> list:
+        result = cache.get(token)
+        if result is None:
+            result = []
+            offset = 0
+            for code in token.split('.'):
+                if not CODE.fullmatch(code):
+                    raise ScoringError(f'invalid {cls.__name__.lower()} code {code!r}', line, column + offset)
+                result.append(cls(code))
+                offset += len(code) + 1
+            cache[token] = result
+        return list(result)
+
+    def parseScoring(self, text: str, card: int, desc: str = '', line: int = 1) -> Reaction:
+        tokens = [(m.group(), m.start() + 1) for m in TOKEN.finditer(text)]
+        if len(tokens) < 3:
+            column = len(text.rstrip()) + 1
+            raise ScoringError('expected location, determinants and contents', line, column)
+        if card not in Z.score_table:
+            raise ScoringError(f'invalid card {card}', line)
+
+        token, column = tokens[0]
+        pt, dq = self.location(token, line, column)
+        token, column = tokens[1]
+        det, fq = self.determinant(token, line, column)
+        token, column = tokens[2]
+        cont = self.codes(self.contents, Content, token, line, column)
+
+        p = False
+        z = None
+        spec = []
+        rest = tokens[3:]
+        if rest and rest[0][0] == 'P':
+            p = True
+            rest = rest[1:]
+        if rest and rest[0][0] == 'P':
+            raise ScoringError("repeated 'P'", line, rest[0][1])
+        if rest and rest[0][0].startswith('Z'):
+            token, column = rest[0]
+            m = ZCODE.match(token)
+            if m is None or m.group(1) not in Z.score_table[card]:
+                raise ScoringError(f'invalid Z score {token!r}', line, column)
+            z = Z(m.group(1), card)
+            try:
+                score = float(m.group(2)) if m.group(2) is not None else None
+            except ValueError:
+                raise ScoringError(f'invalid Z score {token!r}', line, column)
+            if score is not None and score != z.score:
+                raise ScoringError(f'Z{z.z} on card {card} scores {z.score}, not {m.group(2)}', line, column + 2)
+            rest = rest[1:]
+        if rest:
+            # GHR, PHR不再读取。而是根据数据计算
+            token, column = rest[0]
+            spec = [s for s in self.codes(self.specs, Spec, token, line, column) if s.spec not in ('GHR', 'PHR')]
+            rest = rest[1:]
+        if rest:
+            raise ScoringError(f'unexpected {rest[0][0]!r}', line, rest[0][1])
+
+        return Reaction(card=card, desc=desc, pt=pt, dq=dq, fq=fq, det=det, cont=cont, p=p, z=z, spec=spec)
+
+    def parseText(self, lines) -> Iterator[Reaction]:
+        # 逐行读入Reaction.__str__格式的文本：Card行之后跟一行计分，空行忽略
+        header: Optional[Tuple[int, str]] = None
+        for number, text in enumerate(lines, 1):
+            text = text.rstrip('\r\n')
+            if not text.strip():
+                continue
+
+            m = CARD.fullmatch(text.strip())
+            if m is not None:
+                if header is not None:
+                    raise ScoringError('expected a scoring line after the Card line', number)
+                header = (int(m.group(1)), m.group(2).strip())
+                continue
+
+            if header is None:
+                raise ScoringError("expected 'Card <n>: <description>'", number)
+            yield self.parseScoring(text, header[0], header[1], number)
+            header = None
+
+        if header is not None:
+            raise ScoringError('missing scoring line after the last Card line', number + 1)
+
+    def parseCsv(self, rows) -> Iterator[Reaction]:
+        # CSV列：Card, Desc, Scoring（Scoring为一整行计分）
+        reader = csv.DictReader(rows)
+        for row in reader:
+            line = reader.line_num
+            try:
+                card = int(row['Card'])
+            except (KeyError, TypeError, ValueError):
+                raise ScoringError(f"invalid Card {row.get('Card')!r}", line)
+            desc = row.get('Desc')
+            yield self.parseScoring(row.get('Scoring') or '', card, '' if isna(desc) else desc, line)
+
+
+def parseScoring(text: str, card: int, desc: str = '') -> Reaction:
+    return Parser().parseScoring(text, card, desc)
+
+
+def parseText(text: str) -> List[Reaction]:
+    return list(Parser().parseText(text.splitlines()))
+
+
+def readText(path) -> List[Reaction]:
+    with open(path, encoding='utf-8') as f:
+        return list(Parser().parseText(f))
+
+
+def readCsv(path) -> List[Reaction]:
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return list(Parser().parseCsv(f))
+
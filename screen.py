@@ -0,0 +1,168 @@
+from typing import Dict, Iterable, Mapping, Optional, Sequence
+
+import numpy
+
+from main import Statistic
+
+# 特殊指数的整批筛查：输入为每个受试者一行的计数矩阵（按列存放），所有条目对全部受试者一次算出
+# 条目与Statistic中的SCON1..OBS5逐条对应；除零时Statistic抛出ZeroDivisionError，这里按IEEE得到inf/nan，比较结果为False
+
+
+class Screening:
+    # 指数 -> 条目数，条目i对应位图的第i - 1位
+    indices = {'SCON': 12, 'PTI': 5, 'DEPI': 7, 'CDI': 5, 'HVI': 8, 'OBS': 5}
+    # 综合系统的阳性界限；HVI、OBS有各自的组合规则
+    thresholds = {'SCON': 8, 'DEPI': 5, 'CDI': 4}
+
+    # 计算全部条目所需的计数器，另加R与混合反应数blends
+    inputs = tuple(sorted(
+        name for name in Statistic.dependencies(*[f'{index}{i}' for index, n in indices.items()
+                                                  for i in range(1, n + 1)], 'OBS')
+        if name in Statistic.slot)) + ('R', 'blends')
+
+    ZEst = numpy.array([Statistic.ZEst_table.get(zf, numpy.nan) for zf in range(max(Statistic.ZEst_table) + 1)])
+
+    def __init__(self, columns: Mapping[str, Sequence[float]], names: Optional[Sequence[str]] = None):
+        missing = [name for name in Screening.inputs if name not in columns]
+        if missing:
+            raise KeyError(f'missing columns: {", ".join(missing)}')
+        self.names = list(names) if names is not None else None
+        c = {name: numpy.asarray(columns[name]) for name in Screening.inputs}
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            self.derived = Screening.derive(c)
+            self.criteria = Screening.evaluate(c, self.derived)
+
+        self.bitmaps: Dict[str, numpy.ndarray] = {}
+        self.totals: Dict[str, numpy.ndarray] = {}
+        for index, n in Screening.indices.items():
+            bitmap = numpy.zeros(len(c['R']), dtype=numpy.uint16)
+            for i in range(n):
+                bitmap |= self.criteria[f'{index}{i + 1}'].astype(numpy.uint16) << i
+            self.bitmaps[index] = bitmap
+            self.totals[index] = sum([self.criteria[f'{index}{i}'].astype(numpy.int64) for i in range(1, n + 1)])
+
+        hvi = self.totals['HVI'] - self.criteria['HVI1']
+        self.HVI = self.criteria['HVI1'] & (hvi >= 4)
+        obs = self.totals['OBS']
+        FQplus = c['FQplus']
+        Xplus = self.derived['Xplus']
+        self.OBS = (obs == 5) | (obs >= 2) & (FQplus > 3) | (obs >= 3) & (Xplus > 0.89) | (FQplus > 3) & (Xplus > 0.89)
+
+    @staticmethod
+    def dconvert(x: numpy.ndarray) -> numpy.ndarray:
+        # 与Statistic.DConvert相同：按绝对值换算后恢复符号
+        a = numpy.abs(x)
+        return numpy.sign(x) * numpy.where(a < 1, 0, (a - 0.1) // 2.5)
+
+    @staticmethod
+    def derive(c: dict) -> dict:
+        d = {}
+        d['SumCp'] = c['Cp'] + c['CpF'] + c['FCp']
+        d['SumT'] = c['T'] + c['TF'] + c['FT']
+        d['SumV'] = c['V'] + c['VF'] + c['FV']
+        d['SumY'] = c['Y'] + c['YF'] + c['FY']
+        d['WSumC'] = 0.5 * c['FC'] + 1.0 * c['CF'] + 1.5 * c['C']
+        d['EA'] = c['M'] + d['WSumC']
+        d['es'] = c['FM'] + c['m'] + d['SumCp'] + d['SumT'] + d['SumV'] + d['SumY']
+        d['Adjes'] = c['FM'] + numpy.minimum(c['m'], 1) + d['SumCp'] + d['SumT'] + d['SumV'] + \
+            numpy.minimum(d['SumY'], 1)
+        d['AdjD'] = Screening.dconvert(d['EA'] - d['Adjes'])
+        d['Intel'] = 2 * c['AB'] + c['Art'] + c['Ay']
+        d['Afr'] = c['R8_10'] / (c['R'] - c['R8_10'])
+        d['XA'] = (c['FQplus'] + c['FQo'] + c['FQu']) / c['R']
+        d['WDA'] = (c['W_Dplus'] + c['W_Do'] + c['W_Du']) / c['R']
+        d['Xminus'] = c['FQminus'] / c['R']
+        d['Xplus'] = (c['FQplus'] + c['FQo']) / c['R']
+        zf = c['Zf'].astype(numpy.int64)
+        # Zf超出ZEst表时Statistic抛出KeyError，这里记为nan
+        zest = Screening.ZEst[numpy.minimum(zf, len(Screening.ZEst) - 1)]
+        d['Zd'] = c['ZSum'] - numpy.where(zf < len(Screening.ZEst), zest, numpy.nan)
+        d['HCont'] = c['H'] + c['h'] + c['Hd'] + c['hd']
+        d['IsoI'] = (c['Bt'] + 2 * c['Cl'] + c['Ge'] + c['Ls'] + 2 * c['Na']) / c['R']
+        d['Fr_rF'] = c['Fr'] + c['rF']
+        d['EgoI'] = (3 * d['Fr_rF'] + c['pair']) / c['R']
+        return d
+
+    @staticmethod
+    def evaluate(c: dict, d: dict) -> Dict[str, numpy.ndarray]:
+        return {
+            # 自杀指数
+            'SCON1': c['FV'] + c['VF'] + c['V'] + c['FD'] > 2,
+            'SCON2': c['ColorShade'] > 0,
+            'SCON3': (d['EgoI'] < 0.31) | (d['EgoI'] > 0.44),
+            'SCON4': c['MOR'] > 3,
+            'SCON5': (d['Zd'] > 3.5) | (d['Zd'] < -3.5),
+            'SCON6': d['es'] > d['EA'],
+            'SCON7': c['CF'] + c['C'] > c['FC'],
+            'SCON8': d['Xplus'] < 0.7,
+            'SCON9': c['S'] > 3,
+            'SCON10': (c['P'] < 3) | (c['P'] > 8),
+            'SCON11': c['H'] < 2,
+            'SCON12': c['R'] < 17,
+            # 知觉思维指数
+            'PTI1': (d['XA'] < 0.7) & (d['WDA'] < 0.75),
+            'PTI2': d['Xminus'] > 0.29,
+            'PTI3': (c['Lv2'] > 2) & (c['FAB2'] > 0),
+            'PTI4': (c['R'] < 17) & (c['WSum6'] > 12) | (c['R'] > 16) & (c['WSum6'] > 17),
+            'PTI5': (c['MQualminus'] > 1) | (d['Xminus'] > 0.4),
+            # 抑郁指数
+            'DEPI1': (d['SumV'] > 0) | (c['FD'] > 2),
+            'DEPI2': (c['ColorShade'] > 0) | (c['S'] > 2),
+            'DEPI3': (d['EgoI'] > 0.44) & (d['Fr_rF'] == 0) | (d['EgoI'] < 0.33),
+            'DEPI4': (d['Afr'] < 0.46) | (c['blends'] < 4),
+            'DEPI5': (d['SumCp'] + d['SumT'] + d['SumV'] + d['SumY'] > c['FM'] + c['m']) | (d['SumCp'] > 2),
+            'DEPI6': (c['MOR'] > 2) | (d['Intel'] > 3),
+            'DEPI7': (c['COP'] < 2) | (d['IsoI'] > 0.24),
+            # 应对缺陷指数
+            'CDI1': (d['EA'] < 6) | (d['AdjD'] < 0),
+            'CDI2': (c['COP'] < 2) | (c['AG'] < 2),
+            'CDI3': (d['WSumC'] < 2.5) | (d['Afr'] < 0.46),
+            'CDI4': (c['P'] > c['active'] + 1) | (c['H'] < 2),
+            'CDI5': (d['SumT'] > 1) | (d['IsoI'] > 0.24) | (c['Fd'] > 0),
+            # 高警觉指数
+            'HVI1': d['SumT'] == 0,
+            'HVI2': c['Zf'] > 12,
+            'HVI3': d['Zd'] > 3.5,
+            'HVI4': c['S'] > 3,
+            'HVI5': d['HCont'] > 6,
+            'HVI6': c['h'] + c['a'] + c['hd'] + c['ad'] > 3,
+            'HVI7': (c['H'] + c['A']) < 4 * (c['Hd'] + c['Ad']),
+            'HVI8': c['Cg'] > 3,
+            # 强迫指数
+            'OBS1': c['Dd'] > 3,
+            'OBS2': c['Zf'] > 12,
+            'OBS3': d['Zd'] > 3,
+            'OBS4': c['P'] > 7,
+            'OBS5': c['FQplus'] > 1,
+        }
+
+    def __len__(self):
+        return len(self.bitmaps['SCON'])
+
+    def positive(self, index: str, minimum: Optional[int] = None) -> numpy.ndarray:
+        # 默认按综合系统的界限；PTI等没有界限的指数需给出minimum
+        if index in ('HVI', 'OBS') and minimum is None:
+            return getattr(self, index)
+        if minimum is None:
+            minimum = Screening.thresholds[index]
+        return self.totals[index] >= minimum
+
+    def items(self, index: str, i: int) -> list:
+        # 第i个受试者的阳性条目编号，与报告中的写法一致
+        bitmap = int(self.bitmaps[index][i])
+        return [k + 1 for k in range(Screening.indices[index]) if bitmap >> k & 1]
+
+    @staticmethod
+    def fromStatistics(statistics: Iterable[Statistic]) -> 'Screening':
+        statistics = list(statistics)
+        columns = {name: [getattr(s, name) for s in statistics] for name in Screening.inputs if name != 'blends'}
+        columns['blends'] = [len(s.blends) for s in statistics]
+        return Screening(columns, [s.name for s in statistics])
+
+    @staticmethod
+    def fromTable(table) -> 'Screening':
+        # table为table.ReactionTable，计数直接取自逐受试者的列式汇总
+        columns = table.tally()
+        columns['blends'] = table.perSubject(table.isBlend().astype(numpy.int64))
+        return Screening(columns, table.names)
@@ -0,0 +1,276 @@
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import sys
+import time
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Set, Tuple
+
+from main import Statistic
+
+# 本机打分服务：HTTP/1.1，POST /score 提交一个协议，返回export.record格式的结构概要JSON
+#   Content-Type: application/json  {"name": "...", "rows": [{"Card": 1, "Pt": "W", ...}, ...]}
+#   其他Content-Type按上传的xlsx文件处理，?name=指定受试者名
+# 打分在进程池中进行；同时到达的小请求合并成一批交给进程池，减少进程间往返；
+# 等待队列有上限，满了直接返回503，调用方稍后重试
+XLSX_TYPES = ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'application/octet-stream')
+STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+          422: 'Unprocessable Entity', 503: 'Service Unavailable'}
+
+
+def scoreOne(kind: str, name: str, data) -> Tuple[int, dict]:
+    import export
+    import stream
+    import xlsx
+
+    try:
+        if kind == 'xlsx':
+            reactions = [Statistic.makeReaction(row) for row in xlsx.readRows(data)]
+        else:
+            reactions = [Statistic.makeReaction(stream.normalize(dict(row))) for row in data]
+        statistic = Statistic(name, reactions)
+        return 200, export.record(statistic)
+    except Exception as e:
+        return 422, {'error': f'{type(e).__name__}: {e}'}
+
+
+def scoreBatch(requests: List[tuple]) -> List[Tuple[int, dict]]:
+    # 在工作进程中执行，一批请求只往返一次
+    return [scoreOne(*request) for request in requests]
+
+
+class Server:
+    def __init__(self, host='127.0.0.1', port=8750, workers: Optional[int] = None, queue_size=256, batch_size=32,
+                 batch_wait=0.005, max_body=16 * 1024 * 1024):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_body = max_body
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.server: Optional[asyncio.base_events.Server] = None
+        self.batcher: Optional[asyncio.Task] = None
+        # 正在进行的批：事件循环只弱引用任务，需自己持有，关闭时等它们完成
+        self.tasks: Set[asyncio.Task] = set()
+        self.stats = {'requests': 0, 'batches': 0, 'rejected': 0}
+
+    async def start(self):
+        workers = self.workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.queue = asyncio.Queue(self.queue_size)
+        self.batcher = asyncio.create_task(self.batchLoop(workers))
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        # 不再接受连接；已交给进程池的批照常完成，还在队列中的请求一律返回503
+        self.server.close()
+        self.batcher.cancel()
+        try:
+            await self.batcher
+        except asyncio.CancelledError:
+            pass
+        while not self.queue.empty():
+            future, _ = self.queue.get_nowait()
+            Server.reject(future)
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.executor.shutdown()
+        await self.server.wait_closed()
+
+    @staticmethod
+    def reject(future: asyncio.Future):
+        if not future.done():
+            future.set_result((503, {'error': 'server shutting down'}))
+
+    async def serve(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    # ---------------- 批处理 ----------------
+
+    async def submit(self, kind: str, name: str, data) -> Tuple[int, dict]:
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((future, (kind, name, data)))
+        except asyncio.QueueFull:
+            self.stats['rejected'] += 1
+            return 503, {'error': 'server busy, retry later'}
+        return await future
+
+    async def batchLoop(self, workers: int):
+        # 正在进行的批数不超过进程数，其余请求留在队列中，队列满后即拒绝新请求
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(workers)
+        while True:
+            batch = [await self.queue.get()]
+            try:
+                deadline = loop.time() + self.batch_wait
+                while len(batch) < self.batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await slots.acquire()
+            except asyncio.CancelledError:
+                # 关闭时已从队列取出、尚未提交的请求
+                for future, _ in batch:
+                    Server.reject(future)
+                raise
+            self.stats['batches'] += 1
+            task = asyncio.create_task(self.runBatch(loop, batch, slots))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def runBatch(self, loop, batch: list, slots: asyncio.Semaphore):
+        try:
+            results = await loop.run_in_executor(self.executor, scoreBatch, [request for _, request in batch])
+        except asyncio.CancelledError:
+            for future, _ in batch:
+                Server.reject(future)
+            raise
+        except Exception as e:
+            results = [(500, {'error': f'{type(e).__name__}: {e}'})] * len(batch)
+        finally:
+            slots.release()
+        for (future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    # ---------------- HTTP ----------------
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    method, target, version = line.decode('latin-1').split()
+                except ValueError:
+                    await self.respond(writer, 400, {'error': 'malformed request line'}, close=True)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length', 0))
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self.respond(writer, 400, {'error': 'malformed Content-Length'}, close=True)
+                    break
+                if length > self.max_body:
+                    await self.respond(writer, 413, {'error': f'body larger than {self.max_body} bytes'}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                close = headers.get('connection', '').lower() == 'close' or version == 'HTTP/1.0'
+
+                status, payload = await self.route(method, target, headers, body)
+                await self.respond(writer, status, payload, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method: str, target: str, headers: dict, body: bytes) -> Tuple[int, dict]:
+        path, _, query = target.partition('?')
+        params = dict(urllib.parse.parse_qsl(query))
+        if path == '/health':
+            return 200, dict(self.stats, queued=self.queue.qsize())
+        if path != '/score':
+            return 404, {'error': f'no such endpoint: {path}'}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+
+        self.stats['requests'] += 1
+        content_type = headers.get('content-type', '').split(';')[0].strip()
+        if content_type == 'application/json':
+            try:
+                request = json.loads(body)
+                rows = request['rows']
+            except (ValueError, KeyError, TypeError) as e:
+                return 400, {'error': f'expected {{"name": ..., "rows": [...]}}: {e}'}
+            return await self.submit('rows', str(request.get('name') or params.get('name', 'protocol')), rows)
+        if content_type in XLSX_TYPES or not content_type:
+            return await self.submit('xlsx', params.get('name', 'protocol'), body)
+        return 400, {'error': f'unsupported content type: {content_type}'}
+
+    async def respond(self, writer: asyncio.StreamWriter, status: int, payload: dict, close=False):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        writer.write(
+            f'HTTP/1.1 {status} {STATUS.get(status, "Internal Server Error")}\r\n'
+            f'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'{"Connection: close" if close else "Connection: keep-alive"}\r\n'
+            f'{"Retry-After: 1" + chr(13) + chr(10) if status == 503 else ""}'
+            f'\r\n'.encode('latin-1') + body)
+        await writer.drain()
+
+
+class Client:
+    # 同步客户端，保持一个长连接
+    def __init__(self, host='127.0.0.1', port=8750, timeout=60):
+        self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def request(self, method: str, path: str, body: bytes = None, content_type='application/json') -> Tuple[int, dict]:
+        headers = {'Content-Type': content_type} if body is not None else {}
+        self.connection.request(method, path, body, headers)
+        response = self.connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def score(self, rows: List[dict], name='protocol') -> Tuple[int, dict]:
+        return self.request('POST', '/score', json.dumps({'name': name, 'rows': rows}, ensure_ascii=False).encode())
+
+    def scoreFile(self, path: str) -> Tuple[int, dict]:
+        with open(path, 'rb') as f:
+            data = f.read()
+        name = path.split('/')[-1].split('.')[0]
+        return self.request('POST', f'/score?name={urllib.parse.quote(name)}', data, XLSX_TYPES[0])
+
+    def health(self) -> Tuple[int, dict]:
+        return self.request('GET', '/health')
+
+    def close(self):
+        self.connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='本机HTTP打分服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=8750)
+    parser.add_argument('-j', '--workers', type=int, default=None, help='进程数，默认为CPU核数')
+    parser.add_argument('-q', '--queue', type=int, default=256, help='等待队列长度，满了返回503')
+    parser.add_argument('-b', '--batch', type=int, default=32, help='每批最多合并的请求数')
+    parser.add_argument('-w', '--wait', type=float, default=5, help='凑批最多等待的毫秒数')
+    args = parser.parse_args(argv)
+
+    server = Server(args.host, args.port, args.workers, args.queue, args.batch, args.wait / 1000)
+    print(f'{time.strftime("%H:%M:%S")} 监听 http://{args.host}:{args.port}/score')
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,347 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from main import DQ, FQ, Z, Content, Determination, Part, Reaction, Spec, Statistic
+
+# 本地SQLite库：保存协议与逐条反应，按卡片、FQ、代码建索引，供跨协议检索
+#   reactions  每条反应一行；det/cont/spec与缓存相同，以'.'连接原样保存（det含a/p），hr为计算出的GHR/PHR
+#   codes      代码归属表，(code, reaction)，code为code_names中的编号，det只记去掉a/p后的代码；
+#              查询“含Bl的反应”走这张表的主键
+# 反应编号由本程序按顺序分配，批量写入时不必逐行取lastrowid
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS protocols (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    source TEXT,
+    R INTEGER NOT NULL,
+    imported REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reactions (
+    id INTEGER PRIMARY KEY,
+    protocol INTEGER NOT NULL REFERENCES protocols(id),
+    seq INTEGER NOT NULL,
+    card INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    dq TEXT NOT NULL,
+    fq TEXT NOT NULL,
+    p INTEGER NOT NULL,
+    z TEXT,
+    zscore REAL,
+    det TEXT NOT NULL,
+    cont TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    hr TEXT,
+    "desc" TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS code_names (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    code TEXT NOT NULL,
+    UNIQUE (kind, code)
+);
+CREATE TABLE IF NOT EXISTS codes (
+    code INTEGER NOT NULL REFERENCES code_names(id),
+    reaction INTEGER NOT NULL,
+    PRIMARY KEY (code, reaction)
+) WITHOUT ROWID;
+'''
+# 批量导入时先删除、导入后再重建
+INDEXES = {
+    'reactions_protocol': 'CREATE INDEX IF NOT EXISTS reactions_protocol ON reactions(protocol, seq)',
+    'reactions_card': 'CREATE INDEX IF NOT EXISTS reactions_card ON reactions(card, fq)',
+    'reactions_fq': 'CREATE INDEX IF NOT EXISTS reactions_fq ON reactions(fq)',
+    'codes_reaction': 'CREATE INDEX IF NOT EXISTS codes_reaction ON codes(reaction)',
+}
+KINDS = ('det', 'cont', 'spec')
+COLUMNS = ('id', 'protocol', 'seq', 'card', 'category', 'number', 'dq', 'fq', 'p', 'z', 'zscore', 'det', 'cont',
+           'spec', 'hr', 'desc')
+
+
+def reactionRow(id: int, protocol: int, seq: int, r: Reaction) -> tuple:
+    hr = [s.spec for s in r.spec if s.spec in ('GHR', 'PHR')]
+    return (id, protocol, seq, int(r.card), r.pt.category, r.pt.number, r.dq.dq, r.fq.fq, int(r.p),
+            r.z.z if r.z else None, r.z.score if r.z else None, '.'.join([str(d) for d in r.det]),
+            '.'.join([c.cont for c in r.cont]), '.'.join([s.spec for s in r.spec]), hr[0] if hr else None, r.desc)
+
+
+def makeReaction(card, category, number, dq, fq, p, z, det, cont, spec, desc) -> Reaction:
+    return Reaction(card=card, desc=desc, pt=Part(f'{category}{number or ""}'), dq=DQ(dq), fq=FQ(fq),
+                    det=[Determination(d) for d in det.split('.')], cont=[Content(c) for c in cont.split('.')],
+                    p=bool(p), z=Z(z, card) if z else None, spec=[Spec(s) for s in spec.split('.')] if spec else [],
+                    hr=False)
+
+
+class Store:
+    def __init__(self, path='rorschach.db'):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+        for sql in INDEXES.values():
+            self.db.execute(sql)
+        self.db.commit()
+        self.loadCodes()
+
+    def loadCodes(self):
+        # (kind, code) -> 编号
+        self.code_ids = {(kind, code): id for id, kind, code in self.db.execute('SELECT * FROM code_names')}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    # ---------------- 写入 ----------------
+
+    @contextmanager
+    def bulk(self):
+        # 大批导入：去掉二级索引、关闭每次提交的fsync，全部写完后一次建索引
+        self.db.execute('PRAGMA synchronous=OFF')
+        for name in INDEXES:
+            self.db.execute(f'DROP INDEX IF EXISTS {name}')
+        try:
+            yield self
+        finally:
+            self.db.commit()
+            for sql in INDEXES.values():
+                self.db.execute(sql)
+            self.db.execute('ANALYZE')
+            self.db.commit()
+            self.db.execute('PRAGMA synchronous=FULL')
+
+    def nextIds(self) -> Tuple[int, int]:
+        protocol, reaction = self.db.execute(
+            'SELECT (SELECT ifnull(max(id), 0) FROM protocols), (SELECT ifnull(max(id), 0) FROM reactions)').fetchone()
+        return protocol + 1, reaction + 1
+
+    def codeId(self, kind: str, code: str) -> int:
+        id = self.code_ids.get((kind, code))
+        if id is None:
+            id = self.code_ids[kind, code] = len(self.code_ids) + 1
+            self.db.execute('INSERT INTO code_names VALUES (?, ?, ?)', (id, kind, code))
+        return id
+
+    def codeRows(self, id: int, r: Reaction) -> List[tuple]:
+        code_ids = self.code_ids
+        keys = [('det', d.det) for d in r.det] + [('cont', c.cont) for c in r.cont] + \
+               [('spec', s.spec) for s in r.spec]
+        return [(code_ids.get(key) or self.codeId(*key), id) for key in keys]
+
+    def remove(self, name: str) -> bool:
+        row = self.db.execute('SELECT id FROM protocols WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return False
+        self.db.execute('DELETE FROM codes WHERE reaction IN (SELECT id FROM reactions WHERE protocol = ?)', row)
+        self.db.execute('DELETE FROM reactions WHERE protocol = ?', row)
+        self.db.execute('DELETE FROM protocols WHERE id = ?', row)
+        return True
+
+    def addMany(self, protocols: Iterable[Tuple[str, List[Reaction]]], sources: Optional[Iterable[str]] = None,
+                chunk=1000) -> int:
+        # 同名协议替换为新的内容；每chunk个协议一个事务
+        sources = iter(sources) if sources is not None else None
+        count = 0
+        pending = []
+        for name, reactions in protocols:
+            pending.append((name, next(sources) if sources is not None else None, reactions))
+            if len(pending) >= chunk:
+                count += self.write(pending)
+                pending = []
+        if pending:
+            count += self.write(pending)
+        return count
+
+    def add(self, name: str, reactions: List[Reaction], source: Optional[str] = None):
+        self.write([(name, source, reactions)])
+
+    def write(self, protocols: List[Tuple[str, Optional[str], List[Reaction]]]) -> int:
+        try:
+            with self.db:
+                for name, _, _ in protocols:
+                    self.remove(name)
+                protocol_id, reaction_id = self.nextIds()
+                now = time.time()
+                protocol_rows, reaction_rows, code_rows = [], [], []
+                for name, source, reactions in protocols:
+                    protocol_rows.append((protocol_id, name, source, len(reactions), now))
+                    for seq, r in enumerate(reactions):
+                        reaction_rows.append(reactionRow(reaction_id, protocol_id, seq, r))
+                        code_rows.extend(self.codeRows(reaction_id, r))
+                        reaction_id += 1
+                    protocol_id += 1
+                self.db.executemany('INSERT INTO protocols VALUES (?, ?, ?, ?, ?)', protocol_rows)
+                self.db.executemany(f'INSERT INTO reactions VALUES ({", ".join("?" * len(COLUMNS))})', reaction_rows)
+                # 同一反应中重复的代码只记一次
+                self.db.executemany('INSERT OR IGNORE INTO codes VALUES (?, ?)', code_rows)
+        except BaseException:
+            # 事务已回滚，本次新分配的代码编号不在库中，缓存按库重新载入
+            self.loadCodes()
+            raise
+        return len(protocols)
+
+    # ---------------- 读取 ----------------
+
+    def __len__(self):
+        return self.db.execute('SELECT count(*) FROM protocols').fetchone()[0]
+
+    def names(self) -> List[str]:
+        return [name for name, in self.db.execute('SELECT name FROM protocols ORDER BY id')]
+
+    def reactions(self, name: str) -> List[Reaction]:
+        rows = self.db.execute(
+            'SELECT card, category, number, dq, fq, r.p, z, r.det, cont, spec, "desc" FROM reactions r '
+            'JOIN protocols p ON p.id = r.protocol WHERE p.name = ? ORDER BY seq', (name,)).fetchall()
+        if not rows and self.db.execute('SELECT 1 FROM protocols WHERE name = ?', (name,)).fetchone() is None:
+            raise KeyError(name)
+        return [makeReaction(*row) for row in rows]
+
+    def statistic(self, name: str) -> Statistic:
+        return Statistic(name, self.reactions(name))
+
+    def statistics(self) -> Iterator[Statistic]:
+        # 整库按协议顺序一次读出，逐个生成
+        rows = self.db.execute(
+            'SELECT p.name, p.R, card, category, number, dq, fq, r.p, z, det, cont, spec, "desc" '
+            'FROM protocols p LEFT JOIN reactions r ON r.protocol = p.id ORDER BY p.id, seq')
+        name, R, reactions = None, 0, []
+        for row in rows:
+            if row[0] != name:
+                if name is not None:
+                    yield Statistic(name, reactions)
+                name, R, reactions = row[0], row[1], []
+            if R:
+                reactions.append(makeReaction(*row[2:]))
+        if name is not None:
+            yield Statistic(name, reactions)
+
+    # ---------------- 查询 ----------------
+
+    def where(self, card: Optional[int] = None, fq: Optional[str] = None, dq: Optional[str] = None,
+              category: Optional[str] = None, p: Optional[bool] = None, hr: Optional[str] = None,
+              det: Iterable[str] = (), cont: Iterable[str] = (), spec: Iterable[str] = ()) -> Tuple[str, list]:
+        # 条件之间为“且”；det/cont/spec为须同时包含的代码
+        clauses, params = [], []
+        for column, value in (('card', card), ('fq', fq), ('dq', dq), ('category', category), ('hr', hr)):
+            if value is not None:
+                clauses.append(f'r.{column} = ?')
+                params.append(value)
+        if p is not None:
+            clauses.append('r.p = ?')
+            params.append(int(p))
+        for kind, codes in zip(KINDS, (det, cont, spec)):
+            for code in codes:
+                # 库中从未出现过的代码不会匹配任何反应
+                clauses.append('r.id IN (SELECT reaction FROM codes WHERE code = ?)')
+                params.append(self.code_ids.get((kind, code), 0))
+        return ' AND '.join(clauses) or '1', params
+
+    def find(self, limit: Optional[int] = None, **conditions) -> List[Tuple[str, int, Reaction]]:
+        # 返回(协议名, 协议中的序号, 反应)
+        where, params = self.where(**conditions)
+        sql = (f'SELECT p.name, seq, card, category, number, dq, fq, r.p, z, r.det, cont, spec, "desc" '
+               f'FROM reactions r JOIN protocols p ON p.id = r.protocol WHERE {where} ORDER BY r.id')
+        if limit is not None:
+            sql += f' LIMIT {int(limit)}'
+        return [(row[0], row[1], makeReaction(*row[2:])) for row in self.db.execute(sql, params)]
+
+    def count(self, **conditions) -> int:
+        where, params = self.where(**conditions)
+        return self.db.execute(f'SELECT count(*) FROM reactions r WHERE {where}', params).fetchone()[0]
+
+    def countBy(self, column: str, **conditions) -> dict:
+        if column not in ('card', 'category', 'dq', 'fq', 'p', 'z', 'hr', 'protocol'):
+            raise ValueError(f'cannot group by {column}')
+        where, params = self.where(**conditions)
+        if column == 'protocol':
+            sql = (f'SELECT p.name, count(*) FROM reactions r JOIN protocols p ON p.id = r.protocol '
+                   f'WHERE {where} GROUP BY r.protocol')
+        else:
+            sql = f'SELECT r.{column}, count(*) FROM reactions r WHERE {where} GROUP BY r.{column}'
+        return dict(self.db.execute(sql, params).fetchall())
+
+
+def load(paths: List[str], workers: Optional[int] = 1) -> Iterator[Tuple[str, List[Reaction]]]:
+    # 归档文件整个导入，其他文件各为一个协议
+    import archive
+
+    files = []
+    for path in paths:
+        if path.endswith('.rcha'):
+            yield from archive.ProtocolArchive(path)
+        else:
+            files.append(path)
+    names = [path.split('/')[-1].split('.')[0] for path in files]
+    if workers == 1:
+        yield from zip(names, map(Statistic.readReactions, files))
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from zip(names, executor.map(Statistic.readReactions, files, chunksize=16))
+
+
+def main(argv=None):
+    from batch import expandPaths
+
+    parser = argparse.ArgumentParser(description='协议与反应的SQLite库')
+    parser.add_argument('-d', '--database', default='rorschach.db', help='数据库文件')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    importer = commands.add_parser('import', help='导入协议文件或归档文件（.rcha）')
+    importer.add_argument('paths', nargs='+', help='目录或通配符，如 data/*.xlsx')
+    importer.add_argument('-j', '--workers', type=int, default=1, help='解析协议的进程数，0为CPU核数')
+
+    query = commands.add_parser('query', help='检索反应，如 --card 8 --fq - --cont Bl')
+    query.add_argument('--card', type=int)
+    query.add_argument('--fq')
+    query.add_argument('--dq')
+    query.add_argument('--category', help='部位类别，如 W、DdS')
+    query.add_argument('--hr', choices=('GHR', 'PHR'))
+    query.add_argument('--det', nargs='*', default=[])
+    query.add_argument('--cont', nargs='*', default=[])
+    query.add_argument('--spec', nargs='*', default=[])
+    query.add_argument('--count', action='store_true', help='只输出条数')
+    query.add_argument('--limit', type=int, default=None)
+
+    score = commands.add_parser('score', help='由库中的反应计算结构概要')
+    score.add_argument('names', nargs='*', help='协议名，默认为全部')
+    score.add_argument('-o', '--output', default='result', help='结果目录')
+    args = parser.parse_args(argv)
+
+    with Store(args.database) as store:
+        if args.command == 'import':
+            paths = [p for p in args.paths if p.endswith('.rcha')] + expandPaths(
+                [p for p in args.paths if not p.endswith('.rcha')])
+            start = time.perf_counter()
+            with store.bulk():
+                count = store.addMany(load(paths, args.workers or None))
+            print(f'导入 {count} 个协议，用时 {time.perf_counter() - start:.2f}s')
+        elif args.command == 'query':
+            conditions = dict(card=args.card, fq=args.fq, dq=args.dq, category=args.category, hr=args.hr,
+                              det=args.det, cont=args.cont, spec=args.spec)
+            if args.count:
+                print(store.count(**conditions))
+            else:
+                for name, seq, r in store.find(args.limit, **conditions):
+                    print(f'{name} #{seq + 1} ' + repr(r).strip().replace('\n', '  '))
+        else:
+            os.makedirs(args.output, exist_ok=True)
+            statistics = (store.statistic(name) for name in args.names) if args.names else store.statistics()
+            for s in statistics:
+                s.saveResult(args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from main import Reaction, Statistic
+from xlsx import na_values
+
+# 一个大文件里存放多名受试者的反应，每行一条反应，Subject列为受试者编号，其余列与Excel协议相同：
+#   Subject, Card, Desc, Pt, DQ, FQ, Det, Cont, P, Z, Spec
+# 同一受试者的反应必须连续，读完一名受试者即打分并释放，内存占用只取决于最大的单个协议
+# xlsx工作簿可以每个工作表一名受试者（以表名为编号），也可以是带Subject列的长表；整个文件只读取、解压一次
+
+
+def normalize(record: dict) -> dict:
+    # CSV里全是字符串，缺失值字符串与xlsx/pandas一致地视为空；Card统一为整数，供Z分查表
+    for column, value in record.items():
+        if isinstance(value, str) and value in na_values:
+            record[column] = None
+    # JSON中的"P": false或0表示非P反应，makeReaction只把空值当作非P
+    p = record.get('P')
+    if p is not None and not isinstance(p, str) and not p:
+        record['P'] = None
+    card = record.get('Card')
+    if isinstance(card, (str, float)):
+        record['Card'] = int(float(card))
+    return record
+
+
+def csvRecords(path) -> Iterator[dict]:
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for record in csv.DictReader(f):
+            yield normalize(record)
+
+
+def jsonlRecords(path) -> Iterator[dict]:
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield normalize(json.loads(line))
+
+
+def records(path) -> Iterator[dict]:
+    if path.endswith(('.jsonl', '.ndjson')):
+        return jsonlRecords(path)
+    return csvRecords(path)
+
+
+def subjects(records: Iterable[dict], key='Subject') -> Iterator[Tuple[str, List[Reaction]]]:
+    # 按受试者编号切分，遇到新编号时交出上一名受试者的全部反应
+    seen = set()
+    subject = None
+    reactions: List[Reaction] = []
+    for number, record in enumerate(records, 1):
+        current = record.get(key)
+        if current is None:
+            raise ValueError(f'record {number}: missing {key}')
+        current = str(current)
+
+        if current != subject:
+            if subject is not None:
+                yield subject, reactions
+            if current in seen:
+                raise ValueError(f'record {number}: reactions of subject {current} are not contiguous')
+            seen.add(current)
+            subject = current
+            reactions = []
+
+        try:
+            reactions.append(Statistic.makeReaction(record))
+        except Exception as e:
+            raise ValueError(f'record {number} (subject {current}): {type(e).__name__}: {e}') from e
+
+    if subject is not None:
+        yield subject, reactions
+
+
+def workbookSubjects(path, key='Subject', sheets: Optional[List[str]] = None) -> Iterator[Tuple[str, List[Reaction]]]:
+    import xlsx
+
+    seen = set()
+    with xlsx.Workbook(path) as book:
+        for sheet in sheets or ():
+            if sheet not in book.sheets:
+                raise ValueError(f'no sheet {sheet} in {path}')
+        for sheet in sheets or list(book.sheets):
+            rows = book.records(sheet)
+            first = next(rows, None)
+            if first is None:
+                continue
+            rows = itertools.chain([first], rows)
+
+            if key in first:
+                groups = subjects(rows, key)
+            else:
+                try:
+                    groups = [(sheet, [Statistic.makeReaction(row) for row in rows])]
+                except Exception as e:
+                    raise ValueError(f'sheet {sheet}: {type(e).__name__}: {e}') from e
+            for subject, reactions in groups:
+                if subject in seen:
+                    raise ValueError(f'sheet {sheet}: subject {subject} appears more than once in {path}')
+                seen.add(subject)
+                yield subject, reactions
+
+
+def statistics(path, key='Subject', sheets: Optional[List[str]] = None) -> Iterator[Statistic]:
+    if path.endswith(('.xlsx', '.xlsm')):
+        protocols = workbookSubjects(path, key, sheets)
+    else:
+        protocols = subjects(records(path), key)
+    for subject, reactions in protocols:
+        statistic = Statistic(path, reactions)
+        statistic.name = subject
+        yield statistic
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='逐个计算CSV/JSONL大文件或多受试者工作簿中每名受试者的结构概要')
+    parser.add_argument('path', help='CSV或JSONL文件，每行一条反应；或xlsx工作簿，每个工作表一名受试者或带编号列')
+    parser.add_argument('-k', '--key', default='Subject', help='受试者编号列名')
+    parser.add_argument('-s', '--sheet', nargs='*', default=None, help='只读取这些工作表（xlsx）')
+    parser.add_argument('-o', '--output', default='result', help='结果目录')
+    parser.add_argument('--no-save', action='store_true', help='只计算不写结果文件')
+    args = parser.parse_args(argv)
+
+    directory: Optional[str] = None if args.no_save else args.output
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+
+    count = 0
+    try:
+        for statistic in statistics(args.path, args.key, args.sheet):
+            if directory is not None:
+                statistic.saveResult(directory)
+            else:
+                statistic.computeAll()
+            count += 1
+    except ValueError as e:
+        print(f'读取失败：{e}', file=sys.stderr)
+        return 2
+    print(f'共 {count} 名受试者')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
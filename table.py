@@ -0,0 +1,261 @@
+from typing import Dict, Iterable, List, Tuple
+
+import numpy
+
+from main import Content, Determination, Reaction, Spec, Statistic
+
+
+class ReactionTable:
+    # 列名与dtype，多个受试者的反应首尾相接，offsets[i]:offsets[i + 1]为第i个受试者
+    columns = (
+        ('card', numpy.int8),
+        ('part', numpy.int16),
+        ('number', numpy.int32),
+        ('dq', numpy.int8),
+        ('fq', numpy.int8),
+        ('z', numpy.float64),
+        ('p', numpy.bool_),
+        ('det', numpy.int64),
+        ('cont', numpy.int64),
+        ('spec', numpy.int64),
+        ('ncont', numpy.int8),
+        ('ndet', numpy.int8),
+        ('active', numpy.int8),
+        ('passive', numpy.int8),
+        ('Mactive', numpy.int8),
+        ('Mpassive', numpy.int8),
+        ('Sum6', numpy.int16),
+        ('WSum6', numpy.int16),
+        ('Lv2', numpy.int16),
+    )
+
+    # 部位类别、DQ、FQ代码 -> 整数编码，表外的代码依次分配
+    categories = {code: i for i, code in enumerate(('W', 'WS', 'D', 'DS', 'Dd', 'DdS'))}
+    dqs = {code: i for i, code in enumerate(('+', 'o', 'v/+', 'v+', 'v'))}
+    fqs = {code: i for i, code in enumerate(('+', 'o', 'u', '-', 'none'))}
+
+    @staticmethod
+    def codeOf(codes: dict, code: str) -> int:
+        index = codes.get(code)
+        if index is None:
+            index = codes[code] = len(codes)
+        return index
+
+    @staticmethod
+    def row(r: Reaction) -> tuple:
+        if max(r.det_mask, r.cont_mask, r.spec_mask).bit_length() > 63:
+            raise ValueError(f'too many distinct codes for an int64 column: {r}')
+
+        spec6 = [s.spec for s in r.spec if s.spec in Reaction.spec6] if r.spec_mask & Reaction.spec6_mask else []
+        return (
+            r.card,
+            ReactionTable.codeOf(ReactionTable.categories, r.pt.category),
+            r.pt.number,
+            ReactionTable.codeOf(ReactionTable.dqs, r.dq.dq),
+            ReactionTable.codeOf(ReactionTable.fqs, r.fq.fq),
+            r.z.score if r.z else numpy.nan,
+            r.p,
+            r.det_mask,
+            r.cont_mask,
+            r.spec_mask,
+            len(r.cont),
+            r.ndet,
+            r.activeCount(),
+            r.passiveCount(),
+            r.MActiveCount(),
+            r.MPassiveCount(),
+            len(spec6),
+            sum([Reaction.spec6_score[s] for s in spec6]),
+            sum([1 for s in spec6 if s in Reaction.spec2]),
+        )
+
+    def __init__(self, names: List[str], offsets: numpy.ndarray, **columns: numpy.ndarray):
+        self.names = names
+        self.offsets = offsets
+        for name, dtype in ReactionTable.columns:
+            setattr(self, name, columns[name])
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def fromProtocols(protocols: Iterable[Tuple[str, List[Reaction]]]) -> 'ReactionTable':
+        names = []
+        offsets = [0]
+        rows = []
+        for name, reactions in protocols:
+            names.append(name)
+            rows.extend([ReactionTable.row(r) for r in reactions])
+            offsets.append(len(rows))
+
+        values = list(zip(*rows)) if rows else [()] * len(ReactionTable.columns)
+        columns = {name: numpy.array(v, dtype=dtype) for (name, dtype), v in zip(ReactionTable.columns, values)}
+        return ReactionTable(names, numpy.array(offsets, dtype=numpy.int64), **columns)
+
+    @staticmethod
+    def fromReactions(reactions: List[Reaction], name='') -> 'ReactionTable':
+        return ReactionTable.fromProtocols([(name, reactions)])
+
+    @staticmethod
+    def fromStatistics(statistics: Iterable[Statistic]) -> 'ReactionTable':
+        return ReactionTable.fromProtocols((s.name, s.reactions) for s in statistics)
+
+    @staticmethod
+    def fromFiles(paths: Iterable[str], cache=None) -> 'ReactionTable':
+        # cache为cache.ProtocolCache时跳过未改变文件的解析
+        load = cache.load if cache is not None else Statistic.readReactions
+        return ReactionTable.fromProtocols(
+            (path.split('/')[-1].split('.')[0], load(path)) for path in paths)
+
+    @staticmethod
+    def concat(tables: List['ReactionTable']) -> 'ReactionTable':
+        names = [name for t in tables for name in t.names]
+        offsets = [numpy.zeros(1, dtype=numpy.int64)]
+        base = 0
+        for t in tables:
+            offsets.append(t.offsets[1:] + base)
+            base += t.offsets[-1]
+        columns = {name: numpy.concatenate([getattr(t, name) for t in tables]) for name, _ in ReactionTable.columns}
+        return ReactionTable(names, numpy.concatenate(offsets), **columns)
+
+    def subject(self, i: int) -> 'ReactionTable':
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return ReactionTable([self.names[i]], numpy.array([0, end - start], dtype=numpy.int64),
+                             **{name: getattr(self, name)[start:end] for name, _ in ReactionTable.columns})
+
+    # ---------------- GHR/PHR ----------------
+
+    hr_codes = (None, 'GHR', 'PHR')
+
+    def classifyHR(self) -> numpy.ndarray:
+        # 按Reaction.hr_rules对整列求值：0为非人类表征，1为GHR，2为PHR；每条规则只作用于尚未判定的反应
+        n = len(self.card)
+        result = numpy.zeros(n, dtype=numpy.int8)
+        undecided = numpy.ones(n, dtype=numpy.bool_)
+        for hr, rule in Reaction.hr_rules:
+            mask = undecided.copy()
+            for condition, value in rule.items():
+                if condition == 'cont_any':
+                    mask &= self.cont & value != 0
+                elif condition == 'cont_none':
+                    mask &= self.cont & value == 0
+                elif condition == 'spec_any':
+                    mask &= self.spec & value != 0
+                elif condition == 'spec_none':
+                    mask &= self.spec & value == 0
+                elif condition == 'pure_cont':
+                    mask &= (self.ncont == 1) & (self.cont & value != 0)
+                elif condition == 'spec6':
+                    mask &= numpy.isin(self.spec & Reaction.spec6_mask, value)
+                elif condition == 'fq':
+                    mask &= numpy.isin(self.fq, [ReactionTable.fqs[code] for code in value if code in ReactionTable.fqs])
+                elif condition == 'card':
+                    mask &= numpy.isin(self.card, value)
+                elif condition == 'p':
+                    mask &= self.p == value
+                else:
+                    raise ValueError(f'unknown GHR/PHR condition: {condition}')
+            result[mask] = ReactionTable.hr_codes.index(hr)
+            undecided &= ~mask
+            if not undecided.any():
+                break
+        return result
+
+    def addHR(self):
+        # 由未含GHR/PHR的反应建表时（如hr=False构造的反应），把判定结果并入spec列
+        hr = self.classifyHR()
+        bits = numpy.array([0, Spec.bits['GHR'], Spec.bits['PHR']], dtype=numpy.int64)
+        self.spec = self.spec | bits[hr]
+
+    # ---------------- 按受试者汇总 ----------------
+
+    def perSubject(self, values: numpy.ndarray) -> numpy.ndarray:
+        # np.add.reduceat对空区间返回起点处的值，需要单独置零
+        sizes = numpy.diff(self.offsets)
+        if len(values) == 0:
+            return numpy.zeros(len(sizes), dtype=values.dtype)
+        starts = numpy.minimum(self.offsets[:-1], len(values) - 1)
+        sums = numpy.add.reduceat(values, starts)
+        sums[sizes == 0] = 0
+        return sums
+
+    def categoryIn(self, *codes: str) -> numpy.ndarray:
+        lookup = numpy.array([code in codes for code in ReactionTable.categories], dtype=numpy.bool_)
+        return lookup[self.part]
+
+    def categoryContains(self, s: str) -> numpy.ndarray:
+        lookup = numpy.array([s in code for code in ReactionTable.categories], dtype=numpy.bool_)
+        return lookup[self.part]
+
+    def isBlend(self) -> numpy.ndarray:
+        return self.ndet >= 2
+
+    def isColorShadeBlend(self) -> numpy.ndarray:
+        return (self.det & Determination.color != 0) & (self.det & Determination.shade != 0)
+
+    def masks(self) -> Dict[str, numpy.ndarray]:
+        # 每个计数器对应的逐反应取值，与Statistic.tally中的判断一致
+        fq = {code: self.fq == i for code, i in ReactionTable.fqs.items()}
+        dq = {code: self.dq == i for code, i in ReactionTable.dqs.items()}
+        blend = self.isBlend()
+        has_M = self.det & Determination.bits['M'] != 0
+        wd = self.categoryIn('W', 'D')
+
+        masks = {
+            'Zf': ~numpy.isnan(self.z),
+            'ZSum': numpy.nan_to_num(self.z),
+            'W': self.categoryIn('W', 'WS'),
+            'D': self.categoryIn('D', 'DS'),
+            'Dd': self.categoryIn('Dd', 'DdS'),
+            'S': self.categoryContains('S'),
+            'DQplus': dq['+'],
+            'DQo': dq['o'],
+            'DQvplus': dq['v+'],
+            'DQv': dq['v'],
+            'active': self.active,
+            'passive': self.passive,
+            'Mactive': self.Mactive,
+            'Mpassive': self.Mpassive,
+            'ColorShade': self.isColorShadeBlend(),
+            'Sminus': fq['-'] & self.categoryContains('S'),
+            'PureH': (self.ncont == 1) & (self.cont & Content.bits['H'] != 0),
+            'R8_10': (self.card >= 8) & (self.card <= 10),
+            'P': self.p,
+            'Sum6': self.Sum6,
+            'WSum6': self.WSum6,
+            'Lv2': self.Lv2,
+        }
+        for code, name in (('+', 'plus'), ('o', 'o'), ('u', 'u'), ('-', 'minus'), ('none', 'none')):
+            masks[f'FQ{name}'] = fq[code]
+            masks[f'MQual{name}'] = has_M & fq[code]
+            masks[f'W_D{name}'] = wd & fq[code]
+
+        for table, bits, column in ((Statistic.det_slot, Determination.bits, self.det),
+                                    (Statistic.cont_slot, Content.bits, self.cont),
+                                    (Statistic.spec_slot, Spec.bits, self.spec)):
+            for code, slot in table.items():
+                masks[Statistic.counters[slot]] = column & bits[code] != 0
+        for code, slot in Statistic.pure_slot.items():
+            masks[Statistic.counters[slot]] = (self.det & Determination.bits[code] != 0) & ~blend
+        return masks
+
+    def tally(self) -> Dict[str, numpy.ndarray]:
+        # 与Statistic.counters同名的逐受试者计数，另加R
+        masks = self.masks()
+        counts = {}
+        for name in Statistic.counters:
+            values = masks[name]
+            if values.dtype != numpy.float64:
+                values = values.astype(numpy.int64)
+            counts[name] = self.perSubject(values)
+        counts['R'] = numpy.diff(self.offsets)
+        return counts
+
+    def partSeq(self, i: int) -> Dict[int, List[str]]:
+        categories = list(ReactionTable.categories)
+        start, end = self.offsets[i], self.offsets[i + 1]
+        part_seq = {card: [] for card in range(1, 11)}
+        for card, part in zip(self.card[start:end].tolist(), self.part[start:end].tolist()):
+            if card in part_seq:
+                part_seq[card].append(categories[part])
+        return part_seq
@@ -0,0 +1,47 @@
+import glob
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from main import Statistic  # noqa: E402
+
+DATA = sorted(glob.glob(os.path.join(ROOT, 'data', '*.xlsx')))
+
+
+def outcomes(statistic: Statistic) -> dict:
+    # 每个变量的repr，计算时抛出的异常记为异常类名
+    result = {}
+    for name in Statistic.variables:
+        try:
+            result[name] = repr(getattr(statistic, name))
+        except (ZeroDivisionError, KeyError) as e:
+            result[name] = type(e).__name__
+    return result
+
+
+@pytest.fixture(scope='session')
+def baseline() -> dict:
+    # 由重构前的main.py算出的各变量repr：data中的协议与含重复决定因子的随机协议
+    with open(os.path.join(os.path.dirname(__file__), 'baseline.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope='session')
+def protocols(baseline) -> list:
+    # (名字, 反应列表)：data中的协议在前，随机协议在后
+    result = [(os.path.basename(path).split('.')[0], Statistic.readReactions(path)) for path in DATA]
+    result += [(f'random{i}', [Statistic.makeReaction(row) for row in p['rows']])
+               for i, p in enumerate(baseline['protocols'])]
+    return result
+
+
+@pytest.fixture(scope='session')
+def cohort() -> list:
+    from bench.generate import Generator
+
+    return [(f'c{i}', [Statistic.makeReaction(row) for row in rows]) for i, rows in enumerate(Generator(7).cohort(60))]
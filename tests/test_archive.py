@@ -0,0 +1,47 @@
+import numpy
+from conftest import outcomes
+
+from archive import ProtocolArchive, pack
+from main import Statistic
+from table import ReactionTable
+
+
+def test_round_trip(tmp_path, protocols):
+    path = str(tmp_path / 'protocols.rcha')
+    pack(path, protocols)
+    with ProtocolArchive(path) as archive:
+        assert archive.names == [name for name, _ in protocols]
+        for (name, reactions), (stored, loaded) in zip(protocols, archive):
+            assert stored == name
+            assert [str(r) for r in loaded] == [str(r) for r in reactions]
+        name, reactions = protocols[-1]
+        assert outcomes(archive.statistic(name)) == outcomes(Statistic(name, reactions))
+
+
+def test_table_matches_reactions(tmp_path, protocols, cohort):
+    subjects = protocols + cohort
+    path = str(tmp_path / 'protocols.rcha')
+    pack(path, subjects)
+    expected = ReactionTable.fromProtocols(subjects)
+    with ProtocolArchive(path) as archive:
+        table = archive.table()
+        part = archive.table(3, 7)
+    assert table.names == expected.names
+    for name, _ in ReactionTable.columns:
+        assert numpy.array_equal(getattr(table, name), getattr(expected, name), equal_nan=True), name
+        assert numpy.array_equal(getattr(part, name), getattr(expected, name)[expected.offsets[3]:expected.offsets[7]],
+                                 equal_nan=True), name
+
+
+def test_numeric_desc(tmp_path):
+    # Excel中只填了数字的描述读出来是int/float
+    rows = [{'Card': 1, 'Desc': 5, 'Pt': 'W', 'DQ': 'o', 'FQ': 'o', 'Det': 'F', 'Cont': 'A', 'P': 'P', 'Z': 'W',
+             'Spec': None},
+            {'Card': 2, 'Desc': 2.5, 'Pt': 'D', 'DQ': 'o', 'FQ': 'u', 'Det': 'FC', 'Cont': 'Bl', 'P': None, 'Z': None,
+             'Spec': None}]
+    reactions = [Statistic.makeReaction(row) for row in rows]
+    path = str(tmp_path / 'numeric.rcha')
+    pack(path, [('numeric', reactions)])
+    with ProtocolArchive(path) as archive:
+        assert [r.desc for r in archive.reactions('numeric')] == ['5', '2.5']
+        assert [str(r) for r in archive.reactions('numeric')] == [str(r) for r in reactions]
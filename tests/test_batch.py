@@ -0,0 +1,66 @@
+import csv
+import json
+import os
+import shutil
+
+import pytest
+from conftest import DATA
+
+import batch
+import export
+from main import Statistic
+
+
+@pytest.fixture
+def paths(tmp_path) -> list:
+    directory = tmp_path / 'data'
+    directory.mkdir()
+    for path in DATA[:3]:
+        shutil.copy(path, directory)
+    (directory / 'corrupt.xlsx').write_bytes(b'not a zip')
+    (directory / '~$hd.xlsx').write_bytes(b'lock')
+    return batch.expandPaths([str(directory)])
+
+
+def name(path) -> str:
+    return os.path.basename(path).split('.')[0]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_corrupt_file_isolated(paths, tmp_path, workers):
+    assert len(paths) == 4 and not any('~$' in p for p in paths)
+    results = batch.scoreAll(paths, workers, 1, str(tmp_path / 'result'))
+    assert [path for path, *_ in results] == paths
+    errors = {name(path): error for path, error, *_ in results}
+    assert errors.pop('corrupt')
+    assert set(errors.values()) == {None}
+    assert sorted(os.listdir(tmp_path / 'result')) == sorted(f'{n}.txt' for n in errors)
+
+
+@pytest.mark.parametrize('format', batch.formats)
+def test_formats(paths, tmp_path, format):
+    output = tmp_path / 'result'
+    batch.scoreAll(paths, 1, directory=str(output), format=format)
+    good = [Statistic(path) for path in paths if name(path) != 'corrupt']
+    if format in ('txt', 'json'):
+        assert sorted(os.listdir(output)) == sorted(f'{s.name}.{format}' for s in good)
+    else:
+        assert os.listdir(output) == [f'results.{format}']
+
+    if format == 'json':
+        for s in good:
+            with open(output / f'{s.name}.json', encoding='utf-8') as f:
+                assert json.load(f) == json.loads(json.dumps(export.record(s)))
+    elif format == 'csv':
+        with open(output / 'results.csv', newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            assert reader.fieldnames == export.header()
+            assert [r['name'] for r in reader] == [s.name for s in good]
+    elif format == 'jsonl':
+        with open(output / 'results.jsonl', encoding='utf-8') as f:
+            assert [json.loads(line) for line in f] == json.loads(json.dumps([export.record(s) for s in good]))
+
+
+def test_unknown_format(paths):
+    with pytest.raises(ValueError):
+        batch.scoreAll(paths, 1, format='xml')
@@ -0,0 +1,44 @@
+import math
+import os
+
+import numpy
+import pytest
+from conftest import ROOT
+
+import bootstrap
+from main import Ratio, Statistic
+from table import ReactionTable
+
+
+def test_point_values_match_statistic(protocols):
+    names = sorted(bootstrap.vectorizable())
+    result = bootstrap.bootstrap(ReactionTable.fromProtocols(protocols), names, resamples=10)
+    for i, (name, reactions) in enumerate(protocols):
+        statistic = Statistic(name, reactions)
+        for var in names:
+            try:
+                value = getattr(statistic, var)
+            except (ZeroDivisionError, KeyError):
+                continue
+            pairs = [(f'{var}.left', value.left), (f'{var}.right', value.right)] if isinstance(value, Ratio) \
+                else [(var, value)]
+            for key, expected in pairs:
+                assert math.isclose(result[key][i], float(expected), abs_tol=1e-9), (name, key)
+
+
+def test_intervals_are_reproducible(protocols):
+    table = ReactionTable.fromProtocols(protocols)
+    a = bootstrap.bootstrap(table, resamples=200, seed=5, chunk=4)
+    b = bootstrap.bootstrap(table, resamples=200, seed=5, chunk=11, workers=2)
+    for key in a:
+        assert numpy.array_equal(a[key], b[key], equal_nan=True), key
+    finite = numpy.isfinite(a['XA'])
+    assert (a['XA.low'][finite] <= a['XA'][finite]).all() and (a['XA'][finite] <= a['XA.high'][finite]).all()
+
+
+def test_rejects_variables_that_do_not_vectorize(protocols):
+    assert {'M', 'Zf', 'XA', 'EB'} <= bootstrap.vectorizable()
+    assert not {'SCON', 'DEPI', 'Adjes', 'blends', 'ComR'} & bootstrap.vectorizable()
+    with pytest.raises(ValueError):
+        bootstrap.bootstrap(ReactionTable.fromProtocols(protocols), ['SCON'], resamples=10)
+    assert bootstrap.main([os.path.join(ROOT, 'data'), '-v', 'SCON']) == 2
@@ -0,0 +1,66 @@
+import os
+import shutil
+
+import pytest
+from conftest import DATA
+
+from cache import ProtocolCache
+from main import Statistic
+
+
+def text(reactions) -> list:
+    return [str(r) for r in reactions]
+
+
+@pytest.mark.parametrize('mode', ['hash', 'stat'])
+def test_hit_and_miss(tmp_path, mode):
+    cache = ProtocolCache(str(tmp_path / 'cache'), key=mode)
+    for path in DATA:
+        assert text(cache.load(path)) == text(Statistic.readReactions(path))
+    assert (cache.hits, cache.misses) == (0, len(DATA))
+    for path in DATA:
+        assert text(cache.load(path)) == text(Statistic.readReactions(path))
+    assert (cache.hits, cache.misses) == (len(DATA), len(DATA))
+    assert cache.size == cache.usage()
+
+
+@pytest.mark.parametrize('mode', ['hash', 'stat'])
+def test_invalidate_after_modification(tmp_path, mode):
+    path = str(tmp_path / 'p.xlsx')
+    shutil.copy(DATA[0], path)
+    cache = ProtocolCache(str(tmp_path / 'cache'), key=mode)
+    cache.load(path)
+    assert len(cache.entries()) == 1
+
+    shutil.copy(DATA[1], path)
+    os.utime(path, ns=(1, 1))
+    assert cache.invalidate(path)
+    assert cache.entries() == []
+    assert not cache.invalidate(path)
+    assert text(cache.load(path)) == text(Statistic.readReactions(DATA[1]))
+
+
+def test_overwrite_is_not_counted_twice(tmp_path):
+    cache = ProtocolCache(str(tmp_path / 'cache'))
+    reactions = Statistic.readReactions(DATA[0])
+    cache.put(DATA[0], reactions)
+    cache.put(DATA[0], reactions)
+    cache.put(DATA[0], reactions)
+    assert cache.size == cache.usage()
+
+
+def test_eviction(tmp_path):
+    probe = ProtocolCache(str(tmp_path / 'probe'))
+    for path in DATA:
+        probe.load(path)
+    sizes = [e.stat().st_size for e in probe.entries()]
+
+    limit = sum(sizes) // 2
+    cache = ProtocolCache(str(tmp_path / 'cache'), max_bytes=limit)
+    for i, path in enumerate(DATA):
+        cache.load(path)
+        os.utime(cache.entry(cache.key(path)), ns=(i, i))
+    assert cache.usage() <= limit
+    assert cache.size == cache.usage()
+    # 最近写入的条目保留
+    assert cache.get(DATA[-1]) is not None
@@ -0,0 +1,63 @@
+import csv
+import json
+import os
+
+import pytest
+from conftest import DATA
+
+import export
+from main import Ratio, Statistic
+
+
+@pytest.mark.parametrize('path', DATA, ids=os.path.basename)
+def test_row_splits_ratios(path):
+    statistic = Statistic(path)
+    record = export.record(statistic)
+    row = export.row(statistic)
+    json.dumps(record)
+    assert set(row) <= set(export.header())
+    for name in export.ratios:
+        value = export.value(statistic, name)
+        if value is None:
+            assert record[name] is None
+            assert (row[f'{name}.left'], row[f'{name}.right']) == (None, None)
+            continue
+        assert isinstance(value, Ratio)
+        assert record[name] == [export.jsonValue(value.left), export.jsonValue(value.right)]
+        assert [row[f'{name}.left'], row[f'{name}.right']] == record[name]
+    for name in export.indices:
+        assert row[name] == len(record[name])
+
+
+def test_csv_matches_rows(tmp_path):
+    statistics = [Statistic(path) for path in DATA]
+    path = tmp_path / 'result.csv'
+    assert export.saveCsv(statistics, path) == len(statistics)
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        assert reader.fieldnames == export.header()
+        rows = list(reader)
+    assert [r['name'] for r in rows] == [s.name for s in statistics]
+    for statistic, r in zip(statistics, rows):
+        expected = export.row(statistic)
+        assert {k: v for k, v in r.items() if v != ''} == \
+               {k: str(v) for k, v in expected.items() if v is not None and v != ''}
+
+
+def test_jsonl_round_trip(tmp_path):
+    records = [export.record(Statistic(path)) for path in DATA]
+    path = tmp_path / 'result.jsonl'
+    assert export.writeJsonl(records, path) == len(records)
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == json.loads(json.dumps(records))
+
+
+def test_parquet_columns(tmp_path):
+    pandas = pytest.importorskip('pandas')
+    pytest.importorskip('pyarrow')
+    statistics = [Statistic(path) for path in DATA]
+    path = tmp_path / 'result.parquet'
+    export.saveParquet(statistics, path)
+    frame = pandas.read_parquet(path)
+    assert list(frame.columns) == export.header()
+    assert frame['name'].tolist() == [s.name for s in statistics]
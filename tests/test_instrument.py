@@ -0,0 +1,47 @@
+import json
+
+from conftest import DATA, outcomes
+
+import instrument
+from main import Reaction, Statistic
+
+METHODS = ((Statistic, 'readReactions'), (Statistic, 'makeReaction'), (Reaction, 'calcHR'), (Statistic, 'tally'),
+           (Statistic, '__repr__'), (Statistic, 'saveResult'))
+
+
+def snapshot() -> dict:
+    result = {(cls, name): cls.__dict__[name] for cls, name in METHODS}
+    result.update((name, var.func) for name, var in Statistic.variables.items())
+    return result
+
+
+def test_disable_restores_originals():
+    before = snapshot()
+    instrument.enable()
+    assert instrument.enabled()
+    assert all(snapshot()[key] is not func for key, func in before.items() if func is not None)
+    instrument.disable()
+    assert not instrument.enabled()
+    assert snapshot() == before
+    assert instrument.originals == {}
+
+
+def test_sections_record_calls(tmp_path):
+    sink = instrument.MemorySink()
+    path = tmp_path / 'sections.jsonl'
+    with instrument.recording(sink, instrument.JsonSink(path)) as recorder:
+        statistic = Statistic(DATA[0])
+        reactions = len(statistic.reactions)
+        plain = outcomes(statistic)
+        repr(statistic)
+        assert recorder.calls['Excel解析'] == 1
+        assert recorder.calls['构造反应'] == reactions
+        assert recorder.calls['报告输出'] == 1
+        assert recorder.calls['核心部分'] > 0
+        assert all(recorder.self_time[s] <= recorder.total_time[s] for s in recorder.calls)
+
+    assert not instrument.enabled()
+    assert len(sink.reports) == 1 and sink.reports[0]['Excel解析']['calls'] == 1
+    with open(path, encoding='utf-8') as f:
+        assert json.loads(f.readline())['sections'] == sink.reports[0]
+    assert outcomes(Statistic(DATA[0])) == plain
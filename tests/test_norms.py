@@ -0,0 +1,75 @@
+import math
+
+import numpy
+import pytest
+
+from main import Statistic
+from norms import Moments, Norms, QuantileSketch
+
+
+def statistics(protocols) -> list:
+    return [Statistic(name, reactions) for name, reactions in protocols]
+
+
+def test_merge_matches_single_pass(protocols, cohort):
+    samples = statistics(protocols + cohort)
+    whole = Norms().addAll(samples)
+    merged = Norms()
+    for start in range(0, len(samples), 7):
+        part = Norms().addAll(samples[start:start + 7])
+        merged.merge(Norms.fromDict(part.toDict()))
+
+    assert merged.subjects == whole.subjects
+    assert merged.missing == whole.missing
+    assert merged.integral == whole.integral
+    assert set(merged.moments) == set(whole.moments)
+    for name, moments in whole.moments.items():
+        other = merged.moments[name]
+        assert (other.n, other.min, other.max) == (moments.n, moments.min, moments.max)
+        assert other.mean == pytest.approx(moments.mean, abs=1e-12)
+        assert other.m2 == pytest.approx(moments.m2, abs=1e-9)
+        # 桶计数相加，合并后的草图与一次性累加完全相同
+        assert merged.sketches[name].toDict() == whole.sketches[name].toDict()
+
+
+def test_moments_match_numpy():
+    values = numpy.random.default_rng(3).normal(5, 2, 1000)
+    left, right = Moments(), Moments()
+    for x in values[:400]:
+        left.add(x)
+    for x in values[400:]:
+        right.add(x)
+    left.merge(right)
+    assert left.mean == pytest.approx(values.mean())
+    assert left.sd() == pytest.approx(values.std(ddof=1))
+
+
+@pytest.mark.parametrize('alpha', [0.01, 0.05])
+def test_quantile_relative_error(alpha):
+    rng = numpy.random.default_rng(11)
+    values = numpy.concatenate([rng.lognormal(0, 2, 2000), -rng.lognormal(1, 1, 500), numpy.zeros(50)])
+    sketch = QuantileSketch(alpha)
+    for x in values:
+        sketch.add(float(x))
+    ordered = numpy.sort(values)
+    for q in numpy.linspace(0, 1, 41):
+        actual = ordered[math.floor(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - actual) <= alpha * abs(actual) + 1e-12
+
+
+def test_integer_quantiles_exact_below_half_inverse_alpha():
+    # |x| < 1/(2·alpha)时取整得到实际值；更大的整数只保证相对误差
+    alpha = 0.01
+    norms = Norms(alpha=alpha)
+    values = list(range(0, 50)) * 3 + list(range(50, 2000, 37))
+    for x in values:
+        norms.addValue('X', x)
+    ordered = sorted(values)
+    for q in numpy.linspace(0, 1, 101):
+        actual = ordered[math.floor(q * (len(values) - 1))]
+        estimate = norms.quantile('X', q)
+        assert estimate.is_integer()
+        if actual < 1 / (2 * alpha):
+            assert estimate == actual
+        else:
+            assert abs(estimate - actual) <= alpha * actual + 0.5
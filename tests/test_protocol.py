@@ -0,0 +1,29 @@
+import random
+
+from conftest import outcomes
+
+from main import Statistic
+from protocol import Protocol
+
+
+def assertSame(protocol: Protocol):
+    assert outcomes(protocol) == outcomes(Statistic(protocol.name, list(protocol.reactions)))
+
+
+def test_edits_match_fresh_statistic(protocols, cohort):
+    rng = random.Random(3)
+    pool = [r for _, reactions in cohort for r in reactions]
+    for name, reactions in protocols[:12]:
+        protocol = Protocol(name, reactions)
+        for _ in range(6):
+            action = rng.choice(('add', 'remove', 'replace', 'edit'))
+            if action == 'add' or len(protocol.reactions) < 2:
+                protocol.add(rng.choice(pool), rng.randrange(len(protocol.reactions) + 1))
+            elif action == 'remove':
+                protocol.remove(rng.randrange(len(protocol.reactions)))
+            elif action == 'replace':
+                protocol.replace(rng.randrange(len(protocol.reactions)), rng.choice(pool))
+            else:
+                protocol.edit(rng.randrange(len(protocol.reactions)), fq=rng.choice(('o', 'u', '-')),
+                              det=rng.choice(('F', 'F.F', 'Ma.FC', 'CF.(2)')))
+            assertSame(protocol)
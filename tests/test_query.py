@@ -0,0 +1,42 @@
+import numpy
+import pytest
+
+from query import Query
+from table import ReactionTable
+
+CASES = [
+    ("card in (8, 9, 10) and FQ == '-'", lambda r: r.card in (8, 9, 10) and r.fq.fq == '-'),
+    ("det has M and not blend", lambda r: r.detContains('M') and not r.isBlend()),
+    ("cont has '(H)' or cont has H", lambda r: r.contContains('(H)') or r.contContains('H')),
+    ("part has S and dq != o", lambda r: 'S' in r.pt.category and r.dq.dq != 'o'),
+    ("z >= 3.5 and P", lambda r: r.z is not None and r.z.score >= 3.5 and r.p),
+    ("spec has PHR or ncont > 2", lambda r: r.specContains('PHR') or len(r.cont) > 2),
+    ("fq not in (o, u)", lambda r: r.fq.fq not in ('o', 'u')),
+]
+
+
+@pytest.mark.parametrize('text, predicate', CASES)
+def test_counts_match_reactions(protocols, text, predicate):
+    table = ReactionTable.fromProtocols(protocols)
+    expected = [sum(1 for r in reactions if predicate(r)) for _, reactions in protocols]
+    assert Query(text).count(table).tolist() == expected
+
+
+@pytest.mark.parametrize('text', ['card', 'det == M', 'p in (1)', 'blend not in (1)', 'fq < o', 'cont has',
+                                  'nosuchfield == 1', "card == 1 and"])
+def test_rejects(text):
+    with pytest.raises(ValueError):
+        Query(text)
+
+
+@pytest.mark.parametrize('field', ['z', 'card', 'fq', 'cont', 'p', 'part'])
+def test_count_by_matches_group_by(protocols, field):
+    table = ReactionTable.fromProtocols(protocols)
+    query = Query('card > 0')
+    groups = query.groupBy(table, field)
+    counts = query.countBy(table, field)
+    assert list(counts) == list(groups)
+    assert {value: int(n.sum()) for value, n in counts.items()} == groups
+    if field != 'cont':
+        # 每条反应恰好属于一组
+        assert sum(counts.values()).tolist() == numpy.diff(table.offsets).tolist()
@@ -0,0 +1,42 @@
+import csv
+import io
+
+import pytest
+
+import scoring
+
+
+def test_text_round_trip(protocols):
+    for name, reactions in protocols:
+        text = ''.join(str(r) for r in reactions)
+        parsed = scoring.parseText(text)
+        assert [str(r) for r in parsed] == [str(r) for r in reactions], name
+
+
+def test_csv_round_trip(protocols):
+    name, reactions = protocols[0]
+    f = io.StringIO()
+    writer = csv.writer(f)
+    writer.writerow(['Card', 'Desc', 'Scoring'])
+    for r in reactions:
+        writer.writerow([r.card, r.desc, str(r).splitlines()[1]])
+    f.seek(0)
+    assert [str(r) for r in scoring.Parser().parseCsv(f)] == [str(r) for r in reactions]
+
+
+@pytest.mark.parametrize('text, line, column', [
+    ('Card 1: a\n\n\n\n\nWo F- H@ P', 6, 7),
+    ('Card 1: a\nWo Fx A', 2, 5),
+    ('Card 1: a\nXy F- H', 2, 1),
+    ('Card 1: a\nWo  F.M!o A', 2, 7),
+    ('Card 1: a\nWo F- H P ZQ', 2, 11),
+    ('Card 1: a\nWo F- H P ZW DV AB', 2, 17),
+    ('Card 1: a\nWo F-', 2, 6),
+    ('Wo F- H', 1, 1),
+    ('Card 1: a\nWo F- H P ZW(1..0)', 2, 11),
+    ('Card 1: a\nWo F- H P P', 2, 11),
+])
+def test_error_positions(text, line, column):
+    with pytest.raises(scoring.ScoringError) as e:
+        scoring.parseText(text)
+    assert (e.value.line, e.value.column) == (line, column)
@@ -0,0 +1,33 @@
+from main import Statistic
+from screen import Screening
+from table import ReactionTable
+
+
+def test_criteria_match_statistic(protocols, cohort):
+    subjects = protocols + cohort
+    screening = Screening.fromTable(ReactionTable.fromProtocols(subjects))
+    checked = 0
+    for i, (name, reactions) in enumerate(subjects):
+        statistic = Statistic(name, reactions)
+        for index, n in Screening.indices.items():
+            for k in range(1, n + 1):
+                try:
+                    expected = getattr(statistic, f'{index}{k}')
+                except (ZeroDivisionError, KeyError):
+                    continue
+                assert bool(screening.criteria[f'{index}{k}'][i]) == bool(expected), (name, index, k)
+                checked += 1
+        for index in ('HVI', 'OBS'):
+            try:
+                expected = getattr(statistic, index)
+            except (ZeroDivisionError, KeyError):
+                continue
+            assert bool(screening.positive(index)[i]) == bool(expected), (name, index)
+    assert checked > len(subjects) * 30
+
+
+def test_from_statistics_matches_from_table(protocols):
+    a = Screening.fromTable(ReactionTable.fromProtocols(protocols))
+    b = Screening.fromStatistics(Statistic(name, reactions) for name, reactions in protocols)
+    for index in Screening.indices:
+        assert (a.bitmaps[index] == b.bitmaps[index]).all(), index
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from conftest import DATA
+
+import export
+import server
+from main import Statistic
+
+
+class Running:
+    # 在后台线程的事件循环中运行Server
+    def __init__(self, **options):
+        self.server = server.Server(port=0, **options)
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.server.start())
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        ready.wait()
+
+    def call(self, coroutine, timeout=60):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def stop(self):
+        self.call(self.server.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+@pytest.fixture
+def running():
+    running = Running(workers=1)
+    yield running
+    running.stop()
+
+
+def test_health_and_scoring(running):
+    client = server.Client(port=running.server.port)
+    status, health = client.health()
+    assert status == 200 and health['queued'] == 0
+
+    for path in DATA[:3]:
+        status, result = client.scoreFile(path)
+        assert status == 200
+        assert result == json.loads(json.dumps(export.record(Statistic(path)), ensure_ascii=False))
+
+    assert client.request('POST', '/score', b'{bad', 'application/json')[0] == 400
+    assert client.score([{'Card': 1, 'Pt': 'Q'}])[0] == 422
+    assert client.request('GET', '/nope')[0] == 404
+    client.close()
+
+
+def test_full_queue_returns_503():
+    running = Running(workers=1, queue_size=1, batch_size=1)
+    with open(DATA[0], 'rb') as f:
+        data = f.read()
+
+    def post(_):
+        client = server.Client(port=running.server.port)
+        try:
+            return client.request('POST', '/score?name=x', data, server.XLSX_TYPES[0])[0]
+        finally:
+            client.close()
+
+    try:
+        with ThreadPoolExecutor(24) as pool:
+            statuses = list(pool.map(post, range(48)))
+    finally:
+        running.stop()
+    assert set(statuses) <= {200, 503}
+    assert 503 in statuses and 200 in statuses
+
+
+def test_close_resolves_pending_requests():
+    running = Running(workers=1, batch_size=1)
+    rows = [{'Card': 1, 'Desc': '', 'Pt': 'W', 'DQ': 'o', 'FQ': 'o', 'Det': 'F', 'Cont': 'A', 'P': None, 'Z': None,
+             'Spec': None}]
+
+    async def submitAndClose():
+        pending = [asyncio.ensure_future(running.server.submit('rows', f's{i}', rows)) for i in range(20)]
+        await asyncio.sleep(0)
+        await running.server.close()
+        return await asyncio.wait_for(asyncio.gather(*pending), 30)
+
+    results = running.call(submitAndClose())
+    running.loop.call_soon_threadsafe(running.loop.stop)
+    running.thread.join()
+    assert {status for status, _ in results} <= {200, 503}
+    assert any(status == 503 for status, _ in results)
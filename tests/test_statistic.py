@@ -0,0 +1,43 @@
+import os
+
+import pytest
+from conftest import DATA
+
+from main import Statistic
+
+
+def values(statistic: Statistic, names) -> dict:
+    return {name: repr(getattr(statistic, name)) for name in names}
+
+
+@pytest.mark.parametrize('path', DATA, ids=os.path.basename)
+def test_files_match_baseline(baseline, path):
+    expected = baseline['files'][os.path.basename(path)]
+    assert values(Statistic(path), expected) == expected
+
+
+def test_random_protocols_match_baseline(baseline):
+    for p in baseline['protocols']:
+        statistic = Statistic('random', [Statistic.makeReaction(row) for row in p['rows']])
+        assert values(statistic, p['values']) == p['values']
+
+
+def test_compute_matches_full_evaluation(protocols):
+    names = ('XA', 'EB', 'Afr', 'SCON', 'blends')
+    for name, reactions in protocols:
+        full = Statistic(name, reactions)
+        full.computeAll()
+        partial = Statistic(name, reactions)
+        partial.compute(*names)
+        assert values(partial, names) == values(full, names)
+
+
+def test_repeated_determinant_is_a_blend():
+    row = {'Card': 1, 'Desc': '', 'Pt': 'W', 'DQ': 'o', 'FQ': 'o', 'Det': 'F.F', 'Cont': 'A', 'P': None,
+           'Z': None, 'Spec': None}
+    r = Statistic.makeReaction(row)
+    assert r.isBlend()
+    assert not Statistic.makeReaction(dict(row, Det='F.(2)')).isBlend()
+    statistic = Statistic('x', [r])
+    assert statistic.F == 1 and statistic.PureF == 0
+    assert [[str(d) for d in blend] for blend in statistic.blends] == [['F', 'F']]
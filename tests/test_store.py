@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+from conftest import outcomes
+
+from main import Statistic
+from store import Store
+
+
+def text(reactions) -> list:
+    return [str(r) for r in reactions]
+
+
+def test_round_trip(tmp_path, protocols):
+    with Store(str(tmp_path / 'store.db')) as store:
+        store.addMany(protocols)
+        assert store.names() == [name for name, _ in protocols]
+        for name, reactions in protocols:
+            assert text(store.reactions(name)) == text(reactions)
+        for statistic, (name, reactions) in zip(store.statistics(), protocols):
+            assert statistic.name == name
+            assert outcomes(statistic) == outcomes(Statistic(name, reactions))
+
+
+def test_queries_match_reactions(tmp_path, protocols):
+    reactions = [r for _, rs in protocols for r in rs]
+    with Store(str(tmp_path / 'store.db')) as store:
+        store.addMany(protocols)
+        assert store.count(card=8, fq='-') == sum(1 for r in reactions if r.card == 8 and r.fq.fq == '-')
+        assert store.count(det=['M'], cont=['H']) == \
+            sum(1 for r in reactions if r.detContains('M') and r.contContains('H'))
+        assert store.count(hr='PHR') == sum(1 for r in reactions if r.specContains('PHR'))
+        assert store.count(det=['no such code']) == 0
+        assert sum(store.countBy('card').values()) == len(reactions)
+
+        name = protocols[0][0]
+        assert store.remove(name)
+        assert name not in store.names()
+        assert len(store) == len(protocols) - 1
+
+
+def codes(reactions) -> set:
+    return {(kind, getattr(c, kind)) for r in reactions for kind in ('det', 'cont', 'spec') for c in getattr(r, kind)}
+
+
+def test_failed_write_keeps_code_ids(tmp_path, protocols):
+    path = str(tmp_path / 'store.db')
+    (first, reactions), rest = protocols[0], protocols[1:]
+    name, other = next((name, rs) for name, rs in rest if codes(rs) - codes(reactions))
+    new = sorted(codes(other) - codes(reactions))
+    with Store(path) as store:
+        store.add(first, reactions)
+        # 同一批中重名，插入protocols时违反UNIQUE，整个事务回滚
+        with pytest.raises(sqlite3.IntegrityError):
+            store.write([(name, None, other), (name, None, other)])
+        assert store.code_ids == Store(path).code_ids
+        assert all(key not in store.code_ids for key in new)
+
+        store.add(name, other)
+        kind, code = new[0]
+        expected = sum(1 for r in other if any(getattr(c, kind) == code for c in getattr(r, kind)))
+        assert store.count(**{kind: [code]}) == expected > 0
+    with Store(path) as store:
+        assert store.count(**{kind: [code]}) == expected
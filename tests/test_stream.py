@@ -0,0 +1,95 @@
+import csv
+import json
+import os
+
+import pytest
+from conftest import DATA, outcomes
+
+import stream
+import xlsx
+from main import Statistic
+
+COLUMNS = ['Card', 'Desc', 'Pt', 'DQ', 'FQ', 'Det', 'Cont', 'P', 'Z', 'Spec']
+
+
+def name(path) -> str:
+    return os.path.basename(path).split('.')[0]
+
+
+def rows(path) -> list:
+    # xlsx中的nan换成None，便于写入CSV/JSONL
+    return [{c: None if isinstance(v, float) and v != v else v for c, v in row.items()} for row in xlsx.readRows(path)]
+
+
+@pytest.fixture(scope='module')
+def expected() -> dict:
+    return {name(path): outcomes(Statistic(path)) for path in DATA}
+
+
+def writeCsv(path, subjects):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Subject'] + COLUMNS)
+        for subject, records in subjects:
+            for record in records:
+                writer.writerow([subject] + ['' if record.get(c) is None else record[c] for c in COLUMNS])
+
+
+def writeJsonl(path, subjects):
+    with open(path, 'w', encoding='utf-8') as f:
+        for subject, records in subjects:
+            for record in records:
+                f.write(json.dumps(dict(record, Subject=subject), ensure_ascii=False) + '\n')
+
+
+@pytest.mark.parametrize('suffix, write', [('.csv', writeCsv), ('.jsonl', writeJsonl)])
+def test_subjects_match_statistic(tmp_path, expected, suffix, write):
+    path = str(tmp_path / f'all{suffix}')
+    write(path, [(name(p), rows(p)) for p in DATA])
+    got = {s.name: outcomes(s) for s in stream.statistics(path)}
+    assert got == expected
+
+
+@pytest.mark.parametrize('suffix, write', [('.csv', writeCsv), ('.jsonl', writeJsonl)])
+def test_non_contiguous_subject_is_rejected(tmp_path, suffix, write):
+    a, b = rows(DATA[0]), rows(DATA[1])
+    path = str(tmp_path / f'all{suffix}')
+    write(path, [('a', a[:3]), ('b', b), ('a', a[3:])])
+    with pytest.raises(ValueError, match='not contiguous'):
+        list(stream.statistics(path))
+
+
+def test_json_false_p_is_not_popular(tmp_path):
+    record = {'Subject': 's', 'Card': 1, 'Desc': '', 'Pt': 'W', 'DQ': 'o', 'FQ': 'o', 'Det': 'F', 'Cont': 'A',
+              'Z': None, 'Spec': None}
+    path = str(tmp_path / 'p.jsonl')
+    with open(path, 'w', encoding='utf-8') as f:
+        for p in (False, 0, True, 'P', None):
+            f.write(json.dumps(dict(record, P=p)) + '\n')
+    [(_, reactions)] = stream.subjects(stream.records(path))
+    assert [r.p for r in reactions] == [False, False, True, True, False]
+
+
+def test_workbook_is_opened_once(tmp_path, expected, monkeypatch):
+    per_sheet = str(tmp_path / 'sheets.xlsx')
+    xlsx.writeWorkbook(per_sheet, {name(p): xlsx.table(rows(p), COLUMNS) for p in DATA})
+    long = str(tmp_path / 'long.xlsx')
+    table = [['Subject'] + COLUMNS] + [[name(p)] + [r.get(c) for c in COLUMNS] for p in DATA for r in rows(p)]
+    xlsx.writeWorkbook(long, {'all': table, 'empty': []})
+
+    opened = []
+    init = xlsx.Archive.__init__
+
+    def spy(self, path):
+        opened.append(path)
+        init(self, path)
+
+    monkeypatch.setattr(xlsx.Archive, '__init__', spy)
+    for path in (per_sheet, long):
+        assert {s.name: outcomes(s) for s in stream.statistics(path)} == expected
+    assert opened == [per_sheet, long]
+
+    chosen = [name(DATA[1]), name(DATA[0])]
+    assert [s.name for s in stream.statistics(per_sheet, sheets=chosen)] == chosen
+    with pytest.raises(ValueError, match='no sheet nosuch'):
+        list(stream.statistics(per_sheet, sheets=['nosuch']))
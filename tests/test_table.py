@@ -0,0 +1,34 @@
+import numpy
+
+from main import Statistic
+from table import ReactionTable
+
+
+def test_tally_matches_statistic(protocols, cohort):
+    subjects = protocols + cohort
+    table = ReactionTable.fromProtocols(subjects)
+    tally = table.tally()
+    blends = table.perSubject(table.isBlend().astype(numpy.int64))
+    for i, (name, reactions) in enumerate(subjects):
+        statistic = Statistic(name, reactions)
+        for counter in Statistic.counters:
+            assert tally[counter][i] == getattr(statistic, counter), (name, counter)
+        assert tally['R'][i] == statistic.R
+        assert blends[i] == len(statistic.blends)
+
+
+def test_subject_and_concat(protocols):
+    table = ReactionTable.fromProtocols(protocols)
+    parts = [table.subject(i) for i in range(len(table))]
+    joined = ReactionTable.concat(parts)
+    assert joined.names == table.names
+    assert numpy.array_equal(joined.offsets, table.offsets)
+    for name, _ in ReactionTable.columns:
+        assert numpy.array_equal(getattr(joined, name), getattr(table, name), equal_nan=True), name
+
+
+def test_vectorized_hr_matches_reactions(protocols, cohort):
+    reactions = [r for _, rs in protocols + cohort for r in rs]
+    table = ReactionTable.fromReactions(reactions)
+    expected = ['GHR' if r.specContains('GHR') else 'PHR' if r.specContains('PHR') else None for r in reactions]
+    assert [ReactionTable.hr_codes[code] for code in table.classifyHR().tolist()] == expected
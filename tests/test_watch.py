@@ -0,0 +1,100 @@
+import os
+import shutil
+import time
+
+import pytest
+from conftest import DATA
+
+import watch
+import xlsx
+
+COLUMNS = ['Card', 'Desc', 'Pt', 'DQ', 'FQ', 'Det', 'Cont', 'P', 'Z', 'Spec']
+
+
+def settle(path, offset=0):
+    # 把修改时间调到settle之前，不必等待
+    old = time.time() - 10 + offset
+    os.utime(path, (old, old))
+
+
+def counts(changes: dict) -> dict:
+    return {kind: len(paths) for kind, paths in changes.items()}
+
+
+@pytest.fixture
+def folders(tmp_path):
+    directory, output = tmp_path / 'data', tmp_path / 'result'
+    directory.mkdir()
+    for path in DATA[:3]:
+        shutil.copy(path, directory)
+        settle(directory / os.path.basename(path))
+    return str(directory), str(output)
+
+
+def name(path) -> str:
+    return os.path.basename(path).split('.')[0]
+
+
+def test_added_and_unchanged(folders):
+    directory, output = folders
+    watcher = watch.Watcher(directory, output)
+    assert counts(watcher.poll()) == {'added': 3, 'modified': 0, 'deleted': 0, 'failed': 0}
+    assert sorted(os.listdir(output)) == sorted(['.index.json'] + [f'{name(p)}.txt' for p in DATA[:3]])
+    assert counts(watcher.poll()) == {'added': 0, 'modified': 0, 'deleted': 0, 'failed': 0}
+
+
+def test_touch_only_is_not_modified(folders):
+    directory, output = folders
+    watcher = watch.Watcher(directory, output)
+    watcher.poll()
+    path = os.path.join(directory, os.path.basename(DATA[0]))
+    settle(path, 1)
+    assert counts(watcher.poll())['modified'] == 0
+    assert watcher.index[path]['mtime'] == os.stat(path).st_mtime_ns
+
+
+def test_modified_and_settling(folders):
+    directory, output = folders
+    watcher = watch.Watcher(directory, output)
+    watcher.poll()
+    path = os.path.join(directory, os.path.basename(DATA[0]))
+    result = os.path.join(output, f'{name(path)}.txt')
+    before = open(result, encoding='utf-8').read()
+
+    xlsx.writeRows(path, list(xlsx.readRows(path))[:-1], COLUMNS)
+    # 刚写完的文件留到下次扫描
+    assert counts(watcher.poll())['modified'] == 0
+    settle(path, 2)
+    assert watcher.poll()['modified'] == [path]
+    assert open(result, encoding='utf-8').read() != before
+
+
+def test_deleted_and_stale_results(folders):
+    directory, output = folders
+    watcher = watch.Watcher(directory, output)
+    watcher.poll()
+    first, second = (os.path.join(directory, os.path.basename(p)) for p in DATA[:2])
+
+    os.remove(first)
+    assert watcher.poll()['deleted'] == [first]
+    assert f'{name(first)}.txt' not in os.listdir(output)
+
+    # 修改后无法读取：旧结果不再对应当前内容，一并删除
+    with open(second, 'w') as f:
+        f.write('broken')
+    settle(second, 3)
+    changes = watcher.poll()
+    assert [path for path, _ in changes['failed']] == [second]
+    assert f'{name(second)}.txt' not in os.listdir(output)
+
+
+def test_index_persists(folders):
+    directory, output = folders
+    watch.Watcher(directory, output).poll()
+    restarted = watch.Watcher(directory, output)
+    assert counts(restarted.poll()) == {'added': 0, 'modified': 0, 'deleted': 0, 'failed': 0}
+
+    shutil.copy(DATA[3], directory)
+    path = os.path.join(directory, os.path.basename(DATA[3]))
+    settle(path)
+    assert watch.Watcher(directory, output).poll()['added'] == [path]
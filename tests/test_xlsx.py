@@ -0,0 +1,73 @@
+import math
+import os
+
+import pytest
+from conftest import DATA
+
+import xlsx
+
+pandas = pytest.importorskip('pandas')
+
+COLUMNS = ['Card', 'Desc', 'Pt', 'DQ', 'FQ', 'Det', 'Cont', 'P', 'Z', 'Spec']
+ROWS = [
+    [1, 'a bat', 'W', 'o', 'o', 'F', 'A', 'P', 1.0, None],
+    [1, None, 'D', '+', 'u', 'FC.M', 'H,Cg', None, 'ZA(4.0)', 'GHR'],
+    [None] * 10,
+    [2, 'NA', 'Dd', 'v', '-', 'CF', 'Bl', None, None, 'MOR,DR1'],
+    [3, '<tag> & "quote"', 'W', 'o', 'o', 'M', '(H)', 'P', 5.5, None],
+]
+
+
+def normalize(value):
+    # pandas把缺失值读成NaN，含缺失值的整数列读成float
+    if value is None or isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def expected(path) -> list:
+    # 全空的行pandas保留为全NaN行，records()跳过
+    frame = pandas.read_excel(path).dropna(how='all')
+    return [{k: normalize(v) for k, v in row.items()} for _, row in frame.iterrows()]
+
+
+def records(path) -> list:
+    with xlsx.Workbook(path) as book:
+        return [{k: normalize(v) for k, v in row.items()} for row in book.records()]
+
+
+@pytest.mark.parametrize('path', DATA, ids=os.path.basename)
+def test_data_matches_pandas(path):
+    # data中的文件由Excel保存，字符串在共享字符串表中
+    assert records(path) == expected(path)
+
+
+def test_inline_strings_match_pandas(tmp_path):
+    path = str(tmp_path / 'inline.xlsx')
+    xlsx.writeWorkbook(path, {'Sheet1': [COLUMNS] + ROWS})
+    assert records(path) == expected(path)
+    assert len(records(path)) == len(ROWS) - 1
+    assert records(path)[1]['Desc'] is None
+
+
+def test_shared_strings_match_pandas(tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    path = str(tmp_path / 'shared.xlsx')
+    book = openpyxl.Workbook()
+    sheet = book.active
+    sheet.append(COLUMNS)
+    for row in ROWS:
+        sheet.append(row)
+    book.save(path)
+    assert records(path) == expected(path)
+
+
+def test_sheets(tmp_path):
+    path = str(tmp_path / 'sheets.xlsx')
+    xlsx.writeWorkbook(path, {'a': [['x'], [1]], 'b': [['y'], ['two'], [None], [3]]})
+    with xlsx.Workbook(path) as book:
+        assert list(book.sheets) == ['a', 'b']
+        assert list(book.records('b')) == [{'y': 'two'}, {'y': 3}]
+        assert list(book.records(0)) == [{'x': 1}]
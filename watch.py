@@ -0,0 +1,197 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from main import Statistic
+
+# 监视目录：定期扫描协议文件的修改时间与大小，内容确实改变（摘要不同）时才重新打分
+# 结果先写临时文件再改名，读结果的程序不会看到写了一半的文件；源文件删除后对应结果一并删除
+# 索引保存在结果目录中，重启后只处理期间发生变化的文件
+
+
+def digest(path) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def writeAtomic(path, text: str):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+class Watcher:
+    def __init__(self, directory='data', output='result', format='txt', settle=1.0,
+                 extensions=('.xlsx', '.xlsm')):
+        # settle：修改时间距今不足settle秒的文件可能还在写入，留到下次扫描
+        if format not in ('txt', 'json'):
+            raise ValueError(f'unknown result format: {format}')
+        self.directory = directory
+        self.output = output
+        self.format = format
+        self.settle = settle
+        self.extensions = extensions
+        self.index_path = os.path.join(output, '.index.json')
+        # 源文件路径 -> {mtime, size, hash, result, error}
+        self.index: Dict[str, dict] = {}
+        os.makedirs(output, exist_ok=True)
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                self.index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.index = {}
+
+    def save(self):
+        writeAtomic(self.index_path, json.dumps(self.index, ensure_ascii=False))
+
+    def files(self) -> Dict[str, Tuple[int, int]]:
+        result = {}
+        with os.scandir(self.directory) as it:
+            for e in it:
+                # 去掉Excel打开文件时留下的锁文件
+                if e.name.endswith(self.extensions) and not e.name.startswith('~$') and e.is_file():
+                    try:
+                        st = e.stat()
+                    except FileNotFoundError:
+                        continue
+                    result[e.path] = (st.st_mtime_ns, st.st_size)
+        return result
+
+    def scan(self) -> Tuple[List[str], List[str], List[str]]:
+        # 返回(新增, 修改, 删除)；只改了修改时间、内容未变的文件只更新索引
+        now = time.time_ns()
+        files = self.files()
+        added, modified = [], []
+        for path, (mtime, size) in files.items():
+            entry = self.index.get(path)
+            if entry is not None and entry['mtime'] == mtime and entry['size'] == size:
+                continue
+            if now - mtime < self.settle * 1e9:
+                continue
+            try:
+                h = digest(path)
+            except OSError:
+                # 扫描后被删除、被占用或正在写入，索引不变，下次扫描再处理
+                continue
+            if entry is None:
+                added.append(path)
+            elif entry['hash'] != h or entry.get('error'):
+                modified.append(path)
+            self.index[path] = dict(entry or {}, mtime=mtime, size=size, hash=h)
+        deleted = [path for path in self.index if path not in files]
+        return added, modified, deleted
+
+    def resultPath(self, statistic: Statistic) -> str:
+        return os.path.join(self.output, f'{statistic.name}.{self.format}')
+
+    def score(self, path) -> Optional[str]:
+        entry = self.index[path]
+        try:
+            statistic = Statistic(path)
+            if self.format == 'json':
+                import export
+                text = json.dumps(export.record(statistic), ensure_ascii=False)
+            else:
+                text = repr(statistic)
+            result = self.resultPath(statistic)
+            writeAtomic(result, text)
+        except Exception as e:
+            # 源文件已改变，旧结果不再对应当前内容，删除以免被当成最新结果
+            entry['error'] = f'{type(e).__name__}: {e}'
+            old = entry.pop('result', None)
+            if old:
+                self.removeResult(old)
+            return entry['error']
+
+        # 换了结果格式重新运行时，旧格式的结果也是过期结果
+        old = entry.get('result')
+        entry['result'] = result
+        entry.pop('error', None)
+        if old and old != result:
+            self.removeResult(old)
+        return None
+
+    def removeResult(self, result: str):
+        # 只删除由本程序写出、且没有其他源文件使用的结果
+        if any(e.get('result') == result for e in self.index.values()):
+            return
+        try:
+            os.remove(result)
+        except FileNotFoundError:
+            pass
+
+    def poll(self) -> Dict[str, list]:
+        added, modified, deleted = self.scan()
+        changes = {'added': added, 'modified': modified, 'deleted': deleted, 'failed': []}
+        for path in added + modified:
+            error = self.score(path)
+            if error:
+                changes['failed'].append((path, error))
+        for path in deleted:
+            entry = self.index.pop(path)
+            if entry.get('result'):
+                self.removeResult(entry['result'])
+        if added or modified or deleted or changes['failed']:
+            self.save()
+        return changes
+
+    def run(self, interval=2.0, log=print):
+        while True:
+            start = time.perf_counter()
+            try:
+                changes = self.poll()
+            except OSError as e:
+                # 目录暂时不可读、结果目录写满等，不退出，下次扫描重试
+                log(f'扫描失败: {type(e).__name__}: {e}')
+                time.sleep(interval)
+                continue
+            for kind, label in (('added', '新增'), ('modified', '修改'), ('deleted', '删除')):
+                for path in changes[kind]:
+                    log(f'{label} {path}')
+            for path, error in changes['failed']:
+                log(f'失败 {path}: {error}')
+            time.sleep(max(0.0, interval - (time.perf_counter() - start)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='监视协议目录，只重新计算新增或修改的协议')
+    parser.add_argument('directory', nargs='?', default='data', help='协议目录')
+    parser.add_argument('-o', '--output', default='result', help='结果目录')
+    parser.add_argument('-f', '--format', choices=('txt', 'json'), default='txt', help='结果格式')
+    parser.add_argument('-i', '--interval', type=float, default=2.0, help='扫描间隔（秒）')
+    parser.add_argument('--settle', type=float, default=1.0, help='修改后等待多久再读取（秒），避免读到写了一半的文件')
+    parser.add_argument('--once', action='store_true', help='只扫描一次')
+    args = parser.parse_args(argv)
+
+    watcher = Watcher(args.directory, args.output, args.format, args.settle)
+    if args.once:
+        changes = watcher.poll()
+        print(f'新增 {len(changes["added"])}，修改 {len(changes["modified"])}，删除 {len(changes["deleted"])}，'
+              f'失败 {len(changes["failed"])}')
+        return 1 if changes['failed'] else 0
+
+    try:
+        watcher.run(args.interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
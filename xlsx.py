@@ -0,0 +1,284 @@
+import io
+import posixpath
+import struct
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+from xml.etree.ElementTree import iterparse
+
+MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PKG_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# 与pandas.read_excel默认的缺失值字符串保持一致
+na_values = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A',
+    'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+
+
+def columnIndex(ref: str) -> int:
+    # 'B12' -> 1
+    index = 0
+    for c in ref:
+        if not c.isalpha():
+            break
+        index = index * 26 + ord(c.upper()) - ord('A') + 1
+    return index - 1
+
+
+def number(text: str):
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+class Archive:
+    # 只读的zip。xlsx中只有stored与deflate两种压缩方式，不必导入zipfile（连带导入pathlib、shutil等，启动慢约20ms）
+    def __init__(self, path):
+        # path也可以直接是文件内容（如上传的文件）
+        if isinstance(path, (bytes, bytearray)):
+            self.data = bytes(path)
+            path = '<bytes>'
+        else:
+            with open(path, 'rb') as f:
+                self.data = f.read()
+
+        data = self.data
+        end = data.rfind(b'PK\x05\x06')
+        if end < 0:
+            raise ValueError(f'not a zip file: {path}')
+        count, _, offset = struct.unpack_from('<HII', data, end + 10)
+        if count == 0xFFFF or offset == 0xFFFFFFFF:
+            raise ValueError(f'zip64 is not supported: {path}')
+
+        self.entries = {}
+        pos = offset
+        for _ in range(count):
+            if data[pos:pos + 4] != b'PK\x01\x02':
+                raise ValueError(f'corrupt zip central directory: {path}')
+            flags, method = struct.unpack_from('<HH', data, pos + 8)
+            size, _, name_length, extra_length, comment_length = struct.unpack_from('<IIHHH', data, pos + 20)
+            local, = struct.unpack_from('<I', data, pos + 42)
+            name = data[pos + 46:pos + 46 + name_length].decode('utf-8' if flags & 0x800 else 'cp437')
+            self.entries[name] = (method, local, size)
+            pos += 46 + name_length + extra_length + comment_length
+
+    def namelist(self) -> List[str]:
+        return list(self.entries)
+
+    def read(self, name: str) -> bytes:
+        method, local, size = self.entries[name]
+        name_length, extra_length = struct.unpack_from('<HH', self.data, local + 26)
+        start = local + 30 + name_length + extra_length
+        raw = self.data[start:start + size]
+        if method == 0:
+            return raw
+        if method == 8:
+            return zlib.decompress(raw, -15)
+        raise ValueError(f'unsupported zip compression method {method}: {name}')
+
+    def open(self, name: str) -> io.BytesIO:
+        return io.BytesIO(self.read(name))
+
+    def close(self):
+        self.data = b''
+
+
+class Workbook:
+    def __init__(self, path):
+        self.path = path
+        self.zip = Archive(path)
+        self.strings: Optional[List[str]] = None
+
+        rels = {}
+        with self.zip.open('xl/_rels/workbook.xml.rels') as f:
+            for _, elem in iterparse(f):
+                if elem.tag == PKG_REL + 'Relationship':
+                    target = elem.get('Target')
+                    if target.startswith('/'):
+                        target = target[1:]
+                    else:
+                        target = posixpath.normpath(posixpath.join('xl', target))
+                    rels[elem.get('Id')] = target
+
+        self.sheets = {}
+        with self.zip.open('xl/workbook.xml') as f:
+            for _, elem in iterparse(f):
+                if elem.tag == MAIN + 'sheet':
+                    self.sheets[elem.get('name')] = rels[elem.get(REL + 'id')]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.zip.close()
+
+    def sharedStrings(self) -> List[str]:
+        if self.strings is not None:
+            return self.strings
+
+        self.strings = []
+        if 'xl/sharedStrings.xml' not in self.zip.namelist():
+            return self.strings
+
+        with self.zip.open('xl/sharedStrings.xml') as f:
+            for _, elem in iterparse(f):
+                if elem.tag == MAIN + 'si':
+                    # 富文本由多个<r><t>组成，<rPh>中的注音不计入
+                    text = elem.find(MAIN + 't')
+                    if text is not None:
+                        self.strings.append(text.text or '')
+                    else:
+                        self.strings.append(''.join([t.text or '' for t in elem.iterfind(f'{MAIN}r/{MAIN}t')]))
+                    elem.clear()
+        return self.strings
+
+    def rows(self, sheet=0) -> Iterator[list]:
+        if isinstance(sheet, int):
+            sheet = list(self.sheets)[sheet]
+        strings = self.sharedStrings()
+
+        with self.zip.open(self.sheets[sheet]) as f:
+            row = []
+            for _, elem in iterparse(f):
+                tag = elem.tag
+                if tag == MAIN + 'c':
+                    ref = elem.get('r')
+                    if ref is not None:
+                        index = columnIndex(ref)
+                        if index > len(row):
+                            row.extend([None] * (index - len(row)))
+
+                    kind = elem.get('t', 'n')
+                    if kind == 'inlineStr':
+                        value = ''.join([t.text or '' for t in elem.iter(MAIN + 't')])
+                    else:
+                        v = elem.find(MAIN + 'v')
+                        text = v.text if v is not None else None
+                        if text is None:
+                            value = None
+                        elif kind == 's':
+                            value = strings[int(text)]
+                        elif kind == 'n':
+                            value = number(text)
+                        elif kind == 'b':
+                            value = text == '1'
+                        elif kind == 'e':
+                            value = None
+                        else:
+                            value = text
+
+                    if isinstance(value, str) and value in na_values:
+                        value = None
+                    row.append(value)
+                    elem.clear()
+                elif tag == MAIN + 'row':
+                    yield row
+                    row = []
+                    elem.clear()
+
+    def records(self, sheet=0) -> Iterator[dict]:
+        rows = self.rows(sheet)
+        header = next(rows, None)
+        if header is None:
+            return
+
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            if len(row) < len(header):
+                row.extend([None] * (len(header) - len(row)))
+            yield dict(zip(header, row))
+
+
+def readRows(path, sheet=0) -> Iterator[dict]:
+    with Workbook(path) as book:
+        yield from book.records(sheet)
+
+
+def escape(text: str) -> str:
+    # 不用xml.sax.saxutils：它会连带导入urllib、http、email等，使导入变慢
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+
+def columnName(index: int) -> str:
+    # 1 -> 'B'
+    name = ''
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        name = chr(ord('A') + rest) + name
+    return name
+
+
+def sheetXml(rows: Iterable[Sequence]) -> Iterator[str]:
+    # 字符串一律写成内联字符串，省去共享字符串表；None不写单元格
+    yield f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<worksheet xmlns="{MAIN[1:-1]}"><sheetData>'
+    for r, row in enumerate(rows, 1):
+        cells = []
+        for c, value in enumerate(row):
+            if value is None:
+                continue
+            ref = f'{columnName(c)}{r}'
+            if isinstance(value, bool):
+                cells.append(f'<c r="{ref}" t="b"><v>{int(value)}</v></c>')
+            elif isinstance(value, (int, float)):
+                cells.append(f'<c r="{ref}"><v>{value!r}</v></c>')
+            else:
+                cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>')
+        yield f'<row r="{r}">{"".join(cells)}</row>'
+    yield '</sheetData></worksheet>'
+
+
+def writeWorkbook(path, sheets: Dict[str, Iterable[Sequence]]):
+    # 最小的xlsx：每个工作表为若干行，第一行一般为表头
+    import zipfile
+
+    names = list(sheets)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('[Content_Types].xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            + ''.join(f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+                      'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                      for i in range(1, len(names) + 1))
+            + '</Types>'))
+        z.writestr('_rels/.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<Relationships xmlns="{PKG_REL[1:-1]}">'
+            '<Relationship Id="rId1" Target="xl/workbook.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+            '</Relationships>'))
+        z.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<workbook xmlns="{MAIN[1:-1]}" xmlns:r="{REL[1:-1]}"><sheets>'
+            + ''.join(f'<sheet name="{escape(name)}" sheetId="{i}" r:id="rId{i}"/>'
+                      for i, name in enumerate(names, 1))
+            + '</sheets></workbook>'))
+        z.writestr('xl/_rels/workbook.xml.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<Relationships xmlns="{PKG_REL[1:-1]}">'
+            + ''.join(f'<Relationship Id="rId{i}" Target="worksheets/sheet{i}.xml" '
+                      'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+                      for i in range(1, len(names) + 1))
+            + '</Relationships>'))
+        for i, name in enumerate(names, 1):
+            with z.open(f'xl/worksheets/sheet{i}.xml', 'w') as f:
+                for chunk in sheetXml(sheets[name]):
+                    f.write(chunk.encode('utf-8'))
+
+
+def table(records: Iterable[dict], columns: Sequence[str]) -> Iterator[list]:
+    yield list(columns)
+    for record in records:
+        yield [record.get(column) for column in columns]
+
+
+def writeRows(path, records: Iterable[dict], columns: Sequence[str], sheet='Sheet1'):
+    writeWorkbook(path, {sheet: table(records, columns)})